@@ -1,4 +1,26 @@
 source = "main.py"
 entrypoint = "main"
 env = ".env"
-port = 8080
\ No newline at end of file
+terraform_function = None
+port = 8080
+startup_timeout = 10
+workers = 1
+servers = 1
+engine = "server"
+baseline = None
+baseline_tolerance = 20
+latency_samples = 5
+update_baseline = False
+watch = False
+no_cache = False
+cache_file = None
+cache_max_age = 7
+cache_max_entries = 1000
+report = None
+profile_memory = False
+profile = False
+profile_dir = ".cloud_functions_test_profiles"
+profile_top = 5
+timeout = None
+suite_timeout = None
+emulate_limits = False
@@ -0,0 +1,247 @@
+import heapq
+import json
+import random
+from collections import deque
+from typing import Dict, List, Optional
+
+from .bench import PERCENTILES
+from .bench import percentile
+from .logger import custom_logger
+
+
+PROFILES = ["constant", "ramp", "spike"]
+# number of fresh starts of the server whose median is the cold start of the modeled instances, when it's measured
+COLD_START_MEASURES = 3
+# start and length of the spike of the spike profile, as shares of the duration of the profile
+SPIKE_START = 0.4
+SPIKE_LENGTH = 0.1
+# peak rate of the ramp and spike profiles as a multiple of their base rate when it's not given
+PEAK_RATE_FACTOR = 10
+# order in which the events happening at the same time are handled: the requests completed and the instances
+# started free capacity before new requests arrive, idle instances are only shut down if nothing else happened
+EVENT_PRIORITIES = {"completion": 0, "ready": 1, "arrival": 2, "idle": 3}
+
+
+def arrival_rate(profile: str, rate: float, peak_rate: float, duration: float, time: float) -> float:
+    """
+    Return the number of requests per second arriving at time with the profile:
+    constant at rate, ramp growing linearly from rate to peak_rate over the duration,
+    or spike at rate with peak_rate from SPIKE_START for SPIKE_LENGTH of the duration
+    """
+    if profile == "ramp":
+        return rate + (peak_rate - rate) * time / duration
+    if profile == "spike" and SPIKE_START * duration <= time < (SPIKE_START + SPIKE_LENGTH) * duration:
+        return peak_rate
+    return rate
+
+
+def generate_arrivals(profile: str, rate: float, peak_rate: float, duration: float, rng: random.Random) -> List[float]:
+    """
+    Return the arrival times of the requests of the profile over the duration as a Poisson process,
+    whose rate varying over time is followed by keeping each arrival at the highest rate with the share of it reached
+    """
+    highest_rate = max(rate, peak_rate)
+    arrivals = []
+    if highest_rate <= 0:
+        return arrivals
+    time = 0.0
+    while True:
+        time += rng.expovariate(highest_rate)
+        if time >= duration:
+            return arrivals
+        if rng.random() * highest_rate < arrival_rate(profile, rate, peak_rate, duration, time):
+            arrivals.append(time)
+
+
+class Instance:
+    """Instance of the function in the modeled pool, busy with up to concurrency requests once started"""
+
+    def __init__(self, started_at: float, ready_at: float) -> None:
+        self.started_at = started_at
+        self.ready_at = ready_at
+        self.stopped_at = None
+        self.busy = 0
+        # time since which the instance has no request, None while it is busy or starting
+        self.idle_since = None
+
+
+def simulate_autoscaling(
+    arrivals: List[float],
+    latencies: List[float],
+    cold_start: float,
+    min_instances: int,
+    max_instances: Optional[int],
+    concurrency: int,
+    idle_timeout: float,
+    window: float,
+    rng: random.Random
+) -> dict:
+    """
+    Serve the requests arriving at the arrival times with a pool of instances handling up to concurrency requests each
+    Each request takes a latency drawn from the latencies measured. The requests no instance can take wait in a queue,
+    new instances are started for them, up to max_instances, and take cold_start seconds to be ready.
+    The min_instances are ready from the start and the others are shut down after idle_timeout seconds without requests
+    Return the statistics of the simulation and those of the requests arriving in each window of seconds
+    """
+    events = [(time, EVENT_PRIORITIES["arrival"], index, "arrival", None) for index, time in enumerate(arrivals)]
+    heapq.heapify(events)
+    sequence = len(events)
+    instances = [Instance(0.0, 0.0) for _ in range(min_instances)]
+    for instance in instances:
+        instance.idle_since = 0.0
+    queue = deque()
+    queueing_delays = [0.0] * len(arrivals)
+    response_times = [0.0] * len(arrivals)
+    # how many instances are running, and when it changed
+    instance_counts = [(0.0, min_instances)]
+    cold_starts: List[float] = []
+    busy_seconds = 0.0
+    completed = 0
+    end_time = arrivals[-1] if arrivals else 0.0
+
+    def schedule(time: float, kind: str, payload: object) -> None:
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(events, (time, EVENT_PRIORITIES[kind], sequence, kind, payload))
+
+    def running() -> List[Instance]:
+        return [instance for instance in instances if instance.stopped_at is None]
+
+    def dispatch(time: float) -> None:
+        nonlocal busy_seconds
+        ready = [instance for instance in running() if instance.ready_at <= time]
+        while queue:
+            instance = next((instance for instance in ready if instance.busy < concurrency), None)
+            if instance is None:
+                break
+            index = queue.popleft()
+            latency = rng.choice(latencies)
+            instance.busy += 1
+            instance.idle_since = None
+            busy_seconds += latency
+            queueing_delays[index] = time - arrivals[index]
+            response_times[index] = queueing_delays[index] + latency
+            schedule(time + latency, "completion", instance)
+        # instances are started for the requests left that the instances already starting cannot take
+        starting_capacity = sum(concurrency for instance in running() if instance.ready_at > time)
+        while len(queue) > starting_capacity and (max_instances is None or len(running()) < max_instances):
+            instance = Instance(time, time + cold_start)
+            instances.append(instance)
+            cold_starts.append(time)
+            instance_counts.append((time, len(running())))
+            starting_capacity += concurrency
+            schedule(instance.ready_at, "ready", instance)
+
+    while events and completed < len(arrivals):
+        time, _, index, kind, instance = heapq.heappop(events)
+        if kind == "arrival":
+            queue.append(index)
+        elif kind == "completion":
+            instance.busy -= 1
+            completed += 1
+            end_time = max(end_time, time)
+            if instance.busy == 0:
+                instance.idle_since = time
+                schedule(time + idle_timeout, "idle", instance)
+        elif kind == "ready":
+            instance.idle_since = time
+            schedule(time + idle_timeout, "idle", instance)
+        elif kind == "idle":
+            if (
+                instance.idle_since is not None
+                and time - instance.idle_since >= idle_timeout
+                and instance.stopped_at is None
+                and len(running()) > min_instances
+            ):
+                instance.stopped_at = time
+                instance_counts.append((time, len(running())))
+            continue
+        dispatch(time)
+
+    instance_seconds = sum(
+        (instance.stopped_at if instance.stopped_at is not None else end_time) - instance.started_at for instance in instances
+    )
+    return {
+        "requests": len(arrivals),
+        "cold_starts": len(cold_starts),
+        "max_running_instances": max(count for _, count in instance_counts),
+        "instance_seconds": instance_seconds,
+        "utilization": busy_seconds / (instance_seconds * concurrency) if instance_seconds else 0.0,
+        "queueing_delay": summarize_delays(queueing_delays),
+        "response_time": summarize_delays(response_times),
+        "windows": compute_autoscaling_windows(arrivals, queueing_delays, cold_starts, instance_counts, end_time, window),
+    }
+
+
+def summarize_delays(delays: List[float]) -> dict:
+    """Return the percentiles and the maximum of the delays"""
+    sorted_delays = sorted(delays) or [0.0]
+    return {**{f"p{q}": percentile(sorted_delays, q) for q in PERCENTILES}, "max": sorted_delays[-1]}
+
+
+def compute_autoscaling_windows(
+    arrivals: List[float],
+    queueing_delays: List[float],
+    cold_starts: List[float],
+    instance_counts: List[tuple],
+    end_time: float,
+    window: float
+) -> List[dict]:
+    """Return the requests arriving, the cold starts, the most instances running and the queueing delay of each window"""
+    windows: Dict[int, dict] = {
+        key: {"start": key * window, "requests": 0, "cold_starts": 0, "instances": 0, "delays": []}
+        for key in range(int(end_time // window) + 1)
+    }
+    for arrival, delay in zip(arrivals, queueing_delays):
+        windows[int(arrival // window)]["requests"] += 1
+        windows[int(arrival // window)]["delays"].append(delay)
+    for time in cold_starts:
+        windows[int(time // window)]["cold_starts"] += 1
+    # the instances running at the start of each window are those of the last change before it
+    count = 0
+    changes = iter(instance_counts)
+    change = next(changes, None)
+    for key in sorted(windows):
+        windows[key]["instances"] = count
+        while change is not None and change[0] < (key + 1) * window:
+            count = change[1]
+            windows[key]["instances"] = max(windows[key]["instances"], count)
+            change = next(changes, None)
+    results = []
+    for key in sorted(windows):
+        delays = sorted(windows[key].pop("delays")) or [0.0]
+        results.append({**windows[key], "queueing_p95": percentile(delays, 95), "queueing_max": delays[-1]})
+    return results
+
+
+def display_autoscaling_results(results: dict, scaling: dict) -> None:
+    """Log the queueing delay and the instances of each window as a table, delays in milliseconds, then the totals"""
+    max_instances = scaling["max_instances"] if scaling["max_instances"] is not None else "unlimited"
+    custom_logger.log_centered(
+        f"AUTOSCALING (min {scaling['min_instances']}, max {max_instances} instances, concurrency {scaling['max_concurrency']})"
+    )
+    custom_logger.log_colored((
+        f"{'time (s)':>8}  {'requests':>8}  {'instances':>9}  {'cold starts':>11}  {'queue p95':>9}  {'queue max':>9}",
+        "CYAN"
+    ))
+    for window in results["windows"]:
+        line = (
+            f"{window['start']:>8.1f}  {window['requests']:>8}  {window['instances']:>9}  {window['cold_starts']:>11}  "
+            f"{window['queueing_p95'] * 1000:>9.1f}  {window['queueing_max'] * 1000:>9.1f}"
+        )
+        custom_logger.log_colored((line, "YELLOW" if window["cold_starts"] else "DEFAULT"))
+    custom_logger.log_colored(
+        f"*** {results['requests']} requests, {results['cold_starts']} cold starts, "
+        f"up to {results['max_running_instances']} instances, {results['instance_seconds']:.1f} instance-seconds "
+        f"({results['utilization']:.0%} busy) ***"
+    )
+    for name in ("queueing_delay", "response_time"):
+        custom_logger.log_colored(
+            f"{name.replace('_', ' ')} (ms): " + ", ".join(f"{key} {value * 1000:.1f}" for key, value in results[name].items())
+        )
+
+
+def write_autoscaling_report(results: dict, path: str) -> None:
+    """Write the results of the simulation as json in the file provided, delays in seconds"""
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
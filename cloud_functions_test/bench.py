@@ -0,0 +1,106 @@
+import copy
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from requests import RequestException
+from requests import Session
+
+from .logger import custom_logger
+from .test_classes.base_test import BaseFunctionTest
+from .test_classes.event_test import EventFunctionTest
+
+
+PERCENTILES = (50, 95, 99)
+
+
+def run_benchmark(
+    local_url: str,
+    tests: List[BaseFunctionTest],
+    session: Session,
+    iterations: int,
+    warmup: int,
+    concurrency: int
+) -> List[dict]:
+    """
+    Make the request of each test warmup + iterations times with up to concurrency requests at the same time
+    Only the iterations after the warmup are measured, return the statistics of each test
+    """
+    results = []
+    for test in tests:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda _: invoke_test(test, local_url, session), range(warmup)))
+            start_time = time.perf_counter()
+            invocations = list(executor.map(lambda _: invoke_test(test, local_url, session), range(iterations)))
+            duration = time.perf_counter() - start_time
+        results.append(compute_benchmark_statistics(test.name, invocations, duration))
+    return results
+
+
+def invoke_test(test: BaseFunctionTest, local_url: str, session: Session) -> Tuple[float, bool]:
+    """
+    Make the request of a copy of the test, so that concurrent invocations do not share their response
+    Return the latency in seconds and whether the invocation failed, an event function having failed
+    when its wrapper reports that it crashed
+    """
+    invocation = copy.copy(test)
+    start_time = time.perf_counter()
+    try:
+        invocation.make_post_request(local_url, session)
+    except RequestException:
+        return time.perf_counter() - start_time, True
+    latency = time.perf_counter() - start_time
+    error = invocation.response.status_code >= 500
+    if isinstance(invocation, EventFunctionTest):
+        error = error or not invocation.extract_event_result(invocation.response)["success"]
+    return latency, error
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Return the q-th percentile of the sorted values, interpolating linearly between the two closest ranks"""
+    position = (len(sorted_values) - 1) * q / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def compute_benchmark_statistics(name: str, invocations: List[Tuple[float, bool]], duration: float) -> dict:
+    """Given the (latency, error) of each invocation of a test and the total duration, return its statistics"""
+    latencies = sorted(latency for latency, _ in invocations)
+    errors = sum(1 for _, error in invocations if error)
+    return {
+        "test": name,
+        "requests": len(invocations),
+        "min": latencies[0],
+        **{f"p{q}": percentile(latencies, q) for q in PERCENTILES},
+        "max": latencies[-1],
+        "requests_per_second": len(invocations) / duration if duration else 0.0,
+        "error_rate": errors / len(invocations),
+    }
+
+
+def display_benchmark_results(results: List[dict]) -> None:
+    """Log the statistics of each test as a table, latencies are in milliseconds"""
+    latency_columns = ["min", *[f"p{q}" for q in PERCENTILES], "max"]
+    name_width = max([len("test")] + [len(result["test"]) for result in results])
+    header = (
+        f"{'test':<{name_width}}  {'requests':>8}  "
+        + "  ".join(f"{column:>9}" for column in latency_columns)
+        + f"  {'req/s':>9}  {'errors':>7}"
+    )
+    custom_logger.log_centered("BENCHMARK (latencies in ms)")
+    custom_logger.log_colored((header, "CYAN"))
+    for result in results:
+        line = (
+            f"{result['test']:<{name_width}}  {result['requests']:>8}  "
+            + "  ".join(f"{result[column] * 1000:>9.3f}" for column in latency_columns)
+            + f"  {result['requests_per_second']:>9.1f}  {result['error_rate']:>7.1%}"
+        )
+        custom_logger.log_colored((line, "RED" if result["error_rate"] else "DEFAULT"))
+
+
+def write_benchmark_report(results: List[dict], path: str) -> None:
+    """Write the statistics of each test as json in the file provided, latencies are in seconds"""
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
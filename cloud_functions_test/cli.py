@@ -1,7 +1,45 @@
 import argparse
+import os
 import sys
 
+from .autoscaling import PROFILES
+from .main import autoscale as entrypoint_autoscale
+from .main import bench as entrypoint_bench
+from .main import cold_start as entrypoint_cold_start
+from .main import concurrency_scaling as entrypoint_concurrency_scaling
 from .main import main as entrypoint_main
+from .main import replay as entrypoint_replay
+from .main import run_all as entrypoint_run_all
+
+
+# settings passed on to the run of each function by the all command
+SUITE_OPTIONS = [
+    'module', 'source', 'entrypoint', 'env', 'startup_timeout', 'workers', 'servers',
+    'engine', 'baseline', 'baseline_tolerance', 'latency_samples', 'profile_dir', 'profile_top',
+    'timeout', 'suite_timeout',
+]
+SUITE_FLAGS = ['update_baseline', 'no_cache', 'profile_memory', 'profile', 'emulate_limits']
+
+
+def positive_int(value: str) -> int:
+    """argparse type for the arguments that must be a strictly positive integer"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not a strictly positive integer")
+    return number
+
+
+def suite_arguments(args: argparse.Namespace) -> list:
+    """Return the cli arguments with which each function is run by the all command"""
+    arguments = []
+    for name in SUITE_OPTIONS:
+        value = getattr(args, name)
+        if value is not None:
+            arguments.append(f"--{name.replace('_', '-')}={value}")
+    for name in SUITE_FLAGS:
+        if getattr(args, name):
+            arguments.append(f"--{name.replace('_', '-')}")
+    return arguments
 
 
 def main():
@@ -11,7 +49,71 @@ def main():
     parser.add_argument('--source', '-s', type=str, help='Path to the file in which your Cloud Function is defined')
     parser.add_argument('--entrypoint', '-e', type=str, help='Name of the entrypoint function of the Cloud Function')
     parser.add_argument('--env', '-v', type=str, help='Path to the file in which are defined environment variables')
+    parser.add_argument('--terraform-function', type=str, help='Name of the function whose env variables and limits are read when the env is a Terraform file or directory')
     parser.add_argument('--port', '-p', type=int, help='Number of the port on which functions-framework should run the local server')
+    parser.add_argument('--startup-timeout', type=float, help='Maximum number of seconds to wait for the local server to be ready')
+    parser.add_argument('--workers', '-w', type=positive_int, help='Number of tests whose requests are sent concurrently')
+    parser.add_argument('--servers', type=positive_int, help='Number of local servers between which the tests are spread')
+    parser.add_argument('--engine', type=str, choices=['server', 'inprocess'], help='Whether the function is called through a local server or in-process')
+    parser.add_argument('--baseline', type=str, help='Path to the json file in which the latencies of the tests are recorded')
+    parser.add_argument('--baseline-tolerance', type=float, help='Percentage by which a test can be slower than its baseline')
+    parser.add_argument('--latency-samples', type=positive_int, help='Number of requests over which the latency of a test is measured')
+    parser.add_argument('--update-baseline', action='store_true', help='Record the latencies of the tests in the baseline file instead of comparing them')
+    parser.add_argument('--watch', action='store_true', help='Keep the function running and re-run the tests whenever the source, the test module or the env file changes')
+    parser.add_argument('--no-cache', action='store_true', help='Run every test instead of reporting the unchanged passing tests from the result cache')
+    parser.add_argument('--report', type=str, help='Path of a file in which the results of the tests are written as json')
+    parser.add_argument('--profile-memory', action='store_true', help='Report the memory used by each invocation and compare it to the memory defined in the Terraform file')
+    parser.add_argument('--profile', action='store_true', help='Profile each invocation with cProfile and log the hot functions of each test')
+    parser.add_argument('--profile-dir', type=str, help='Directory in which the pstats and collapsed stacks files of each test are written')
+    parser.add_argument('--profile-top', type=positive_int, help='Number of hot functions logged for each test when profiling')
+    parser.add_argument('--timeout', type=float, help='Number of seconds after which a test without a timeout of its own times out')
+    parser.add_argument('--suite-timeout', type=float, help='Number of seconds after which the tests not run yet time out')
+    parser.add_argument('--emulate-limits', action='store_true', help='Enforce the memory and the concurrency defined in the Terraform file on the local server and report how close each test came to the limits')
+
+    subparsers = parser.add_subparsers(dest='command')
+
+    bench_parser = subparsers.add_parser('bench', help='Invoke each test repeatedly and report its latency percentiles and throughput')
+    bench_parser.add_argument('--iterations', '-n', type=positive_int, default=100, help='Number of measured invocations of each test')
+    bench_parser.add_argument('--warmup', type=int, default=10, help='Number of invocations of each test before the measured ones')
+    bench_parser.add_argument('--concurrency', '-c', type=positive_int, default=1, help='Maximum number of requests sent at the same time')
+    bench_parser.add_argument('--json', type=str, help='Path of a file in which the results are written as json')
+
+    replay_parser = subparsers.add_parser('replay', help='Stream a capture of recorded requests into the function and report the latency and the errors over time')
+    replay_parser.add_argument('capture', type=str, help='JSONL file with the timestamp, headers and body of each recorded request')
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='Factor by which the recorded inter-arrival times are sped up')
+    replay_parser.add_argument('--max-rate', action='store_true', help='Send the requests as fast as possible instead of at their recorded times')
+    replay_parser.add_argument('--concurrency', '-c', type=positive_int, default=10, help='Maximum number of requests sent at the same time')
+    replay_parser.add_argument('--window', type=float, default=1.0, help='Duration in seconds of the windows over which the latency is reported')
+    replay_parser.add_argument('--json', type=str, help='Path of a file in which the results are written as json')
+
+    concurrency_parser = subparsers.add_parser('concurrency', help='Serve the function with more and more threads and report the throughput scaling and the results differing from a serial run')
+    concurrency_parser.add_argument('--max-threads', '-t', type=positive_int, default=8, help='Maximum number of requests handled at the same time by each worker of the server')
+    concurrency_parser.add_argument('--server-workers', type=positive_int, default=1, help='Number of worker processes of the server')
+    concurrency_parser.add_argument('--iterations', '-n', type=positive_int, default=50, help='Number of concurrent invocations of each test for each number of threads')
+    concurrency_parser.add_argument('--json', type=str, help='Path of a file in which the results are written as json')
+
+    autoscale_parser = subparsers.add_parser('autoscale', help='Simulate an arrival rate profile against a pool of instances scaled as defined in the Terraform file, with the latency measured locally')
+    autoscale_parser.add_argument('--arrival-profile', type=str, choices=PROFILES, default='constant', help='Shape of the arrival rate over time')
+    autoscale_parser.add_argument('--rate', type=float, default=10.0, help='Number of requests per second arriving, at the start of a ramp and outside of a spike')
+    autoscale_parser.add_argument('--peak-rate', type=float, help='Number of requests per second arriving at the end of a ramp and during a spike, 10 times the rate by default')
+    autoscale_parser.add_argument('--duration', type=float, default=300.0, help='Number of seconds over which requests arrive')
+    autoscale_parser.add_argument('--samples', type=positive_int, default=20, help='Number of invocations of each test whose latency is measured')
+    autoscale_parser.add_argument('--cold-start', type=float, help='Number of seconds an instance takes to start, measured on the local server by default')
+    autoscale_parser.add_argument('--idle-timeout', type=float, default=900.0, help='Number of seconds after which an instance without requests is shut down')
+    autoscale_parser.add_argument('--min-instances', type=int, help='Minimum number of instances, overriding the Terraform file')
+    autoscale_parser.add_argument('--max-instances', type=positive_int, help='Maximum number of instances, overriding the Terraform file')
+    autoscale_parser.add_argument('--window', type=float, default=10.0, help='Duration in seconds of the windows over which the simulation is reported')
+    autoscale_parser.add_argument('--seed', type=int, default=0, help='Seed of the random arrivals and latencies of the simulation')
+    autoscale_parser.add_argument('--json', type=str, help='Path of a file in which the results are written as json')
+
+    cold_start_parser = subparsers.add_parser('coldstart', help='Report the time from the spawn of a new server to its first response and the import time of each module')
+    cold_start_parser.add_argument('--starts', type=positive_int, default=5, help='Number of fresh starts of the server measured')
+    cold_start_parser.add_argument('--top', type=positive_int, default=10, help='Number of imports and packages listed by import time')
+    cold_start_parser.add_argument('--budget', type=float, help='Maximum median cold start in seconds, the command fails above it')
+
+    all_parser = subparsers.add_parser('all', help='Run the tests of every function found under a directory concurrently')
+    all_parser.add_argument('root', type=str, nargs='?', default='.', help='Directory under which the directories containing the test module are run')
+    all_parser.add_argument('--jobs', '-j', type=positive_int, default=os.cpu_count(), help='Maximum number of functions tested at the same time')
 
     args = parser.parse_args()
 
@@ -19,9 +121,57 @@ def main():
     source = args.source
     entrypoint = args.entrypoint
     env = args.env
+    terraform_function = args.terraform_function
     port = args.port
+    startup_timeout = args.startup_timeout
+    workers = args.workers
+    servers = args.servers
+    engine = args.engine
+    baseline = args.baseline
+    baseline_tolerance = args.baseline_tolerance
+    latency_samples = args.latency_samples
+    update_baseline = args.update_baseline
+    watch = args.watch
+    no_cache = args.no_cache
+    report = args.report
+    profile_memory = args.profile_memory
+    profile = args.profile
+    profile_dir = args.profile_dir
+    profile_top = args.profile_top
+    timeout = args.timeout
+    suite_timeout = args.suite_timeout
+    emulate_limits = args.emulate_limits
 
-    entrypoint_main(module, source, entrypoint, env, port)
+    if args.command == 'bench':
+        entrypoint_bench(module, source, entrypoint, env, port, startup_timeout, args.iterations, args.warmup, args.concurrency, args.json, terraform_function)
+    elif args.command == 'replay':
+        speed = None if args.max_rate else args.speed
+        entrypoint_replay(module, source, entrypoint, env, port, startup_timeout, args.capture, speed, args.concurrency, args.window, args.json, terraform_function)
+    elif args.command == 'concurrency':
+        entrypoint_concurrency_scaling(
+            module, source, entrypoint, env, port, startup_timeout, args.max_threads, args.server_workers, args.iterations, args.json,
+            terraform_function
+        )
+    elif args.command == 'autoscale':
+        entrypoint_autoscale(
+            module, source, entrypoint, env, port, startup_timeout, args.arrival_profile, args.rate, args.peak_rate, args.duration,
+            args.samples, args.cold_start, args.idle_timeout, args.min_instances, args.max_instances, args.window, args.seed, args.json,
+            terraform_function
+        )
+    elif args.command == 'coldstart':
+        if not entrypoint_cold_start(module, source, entrypoint, env, port, startup_timeout, args.starts, args.top, args.budget, terraform_function):
+            sys.exit(1)
+    elif args.command == 'all':
+        if not entrypoint_run_all(module, port, servers, args.root, args.jobs, suite_arguments(args)):
+            sys.exit(1)
+    else:
+        passed = entrypoint_main(
+            module, source, entrypoint, env, port, startup_timeout, workers, servers, engine,
+            baseline, baseline_tolerance, latency_samples, update_baseline, watch, no_cache, report, profile_memory,
+            profile, profile_dir, profile_top, timeout, suite_timeout, emulate_limits, terraform_function
+        )
+        if not passed:
+            sys.exit(1)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,149 @@
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+from requests import ConnectionError
+from requests import Session
+
+from .exceptions import ServerStartupError
+from .functions import check_port_availability
+from .logger import custom_logger
+from .test_classes.base_test import BaseFunctionTest
+from .utils import discard_logs
+
+
+# number of seconds between two attempts to send the first request to a server being started
+FIRST_REQUEST_INTERVAL = 0.005
+# written to stderr just before the source is loaded to ignore the imports made by the interpreter start-up
+IMPORT_TIME_MARKER = "cloud-functions-test: loading source"
+
+
+def measure_cold_start(
+    port: int,
+    entrypoint: str,
+    temp_file_path: str,
+    startup_timeout: float,
+    test: BaseFunctionTest,
+    local_url: str
+) -> float:
+    """
+    Spawn a new server and send it the request of the test until it responds
+    Return the time from the spawn of the process to the first response
+    """
+    check_port_availability(port)
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        ['functions_framework', f'--target={entrypoint}', f'--port={port}', f'--source={temp_file_path}'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        with Session() as session:
+            while True:
+                try:
+                    test.make_post_request(local_url, session)
+                    return time.perf_counter() - start_time
+                except ConnectionError:
+                    pass
+                if process.poll() is not None:
+                    _, stderr = process.communicate()
+                    raise ServerStartupError(f"Could not start the local server.\n{stderr.decode('utf-8').strip()}")
+                if time.perf_counter() - start_time > startup_timeout:
+                    raise ServerStartupError(f"The local server did not respond after {startup_timeout}s")
+                time.sleep(FIRST_REQUEST_INTERVAL)
+    finally:
+        if process.poll() is None:
+            discard_logs(process)
+            process.send_signal(signal.SIGINT)
+            process.wait()
+
+
+def measure_import_times(source: str) -> Tuple[float, List[Tuple[str, int, int, int]]]:
+    """
+    Load the source in a new interpreter with -X importtime, the way functions-framework loads it
+    Return the time the load took and the (module, depth, self, cumulative) of each import made, in microseconds
+    """
+    directory, filename = os.path.split(os.path.realpath(source))
+    loader = (
+        "import importlib.util, sys, time\n"
+        f"sys.path.append({directory!r})\n"
+        f"spec = importlib.util.spec_from_file_location({os.path.splitext(filename)[0]!r}, {os.path.join(directory, filename)!r})\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "sys.modules[spec.name] = module\n"
+        f"sys.stderr.write({IMPORT_TIME_MARKER!r} + '\\n')\n"
+        "start_time = time.perf_counter()\n"
+        "spec.loader.exec_module(module)\n"
+        "print(time.perf_counter() - start_time)\n"
+    )
+    completed_process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', loader],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stderr = completed_process.stderr.decode('utf-8', errors='replace')
+    if completed_process.returncode != 0:
+        raise ServerStartupError(f"Could not load the source {source}\n{stderr.strip()}")
+    return float(completed_process.stdout.decode('utf-8').strip().splitlines()[-1]), parse_import_times(stderr)
+
+
+def parse_import_times(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """Return the (module, depth, self, cumulative) of the imports reported by -X importtime after the marker"""
+    imports = []
+    lines = stderr.splitlines()
+    if IMPORT_TIME_MARKER in lines:
+        lines = lines[lines.index(IMPORT_TIME_MARKER) + 1:]
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_time, cumulative_time, name = line[len("import time:"):].split("|")
+            # the nested imports are indented by two spaces per level
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            imports.append((name.strip(), depth, int(self_time), int(cumulative_time)))
+        except ValueError:
+            # header line
+            continue
+    return imports
+
+
+def aggregate_import_times(imports: List[Tuple[str, int, int, int]]) -> List[Tuple[str, int]]:
+    """Return the (top-level package, sum of the self times of its modules) sorted from the most expensive"""
+    packages = {}
+    for name, _, self_time, _ in imports:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_time
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)
+
+
+def display_cold_start_results(
+    cold_starts: List[float],
+    load_time: float,
+    imports: List[Tuple[str, int, int, int]],
+    top: int,
+    budget: float = None
+) -> bool:
+    """
+    Log the cold start times, the most expensive imports of the source and the import time of each package
+    Return whether the median cold start is within the budget, if any
+    """
+    median = statistics.median(cold_starts)
+    within_budget = budget is None or median <= budget
+    custom_logger.log_centered(f"COLD START ({len(cold_starts)} starts)")
+    custom_logger.log_colored((
+        f"spawn to first response: min {min(cold_starts):.3f}s  median {median:.3f}s  max {max(cold_starts):.3f}s",
+        "DEFAULT" if within_budget else "RED"
+    ))
+    if budget is not None:
+        custom_logger.log_colored([(f"budget of {budget}s: ", "DEFAULT"), ("PASSED", "GREEN") if within_budget else ("FAILED", "RED")])
+    custom_logger.log_colored(f"load of the source: {load_time:.3f}s")
+    custom_logger.log_centered("MOST EXPENSIVE IMPORTS (cumulative ms)", padding_char='-')
+    for name, depth, _, cumulative_time in sorted(imports, key=lambda item: item[3], reverse=True)[:top]:
+        custom_logger.log_colored(f"{cumulative_time / 1000:>10.1f}  {name}" + (f"  (depth {depth})" if depth else ""))
+    custom_logger.log_centered("IMPORT TIME BY PACKAGE (self ms)", padding_char='-')
+    for package, self_time in aggregate_import_times(imports)[:top]:
+        custom_logger.log_colored(f"{self_time / 1000:>10.1f}  {package}")
+    return within_budget
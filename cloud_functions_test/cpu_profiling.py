@@ -0,0 +1,112 @@
+import glob
+import os
+import pstats
+from typing import Dict, List, Tuple
+
+from .logger import custom_logger
+from .test_classes.base_test import BaseFunctionTest
+from .test_classes.base_test import EXECUTION_ID_HEADER
+
+
+# maximum depth of the stacks rebuilt from the call graph of a profile
+MAX_STACK_DEPTH = 64
+
+
+def add_cpu_profiling(shim_path: str, entrypoint: str, profile_func_entrypoint: str, profile_dir: str) -> str:
+    """
+    Add to the shim of the function a profile_func_entrypoint function calling the entrypoint with cProfile
+    The profile of each invocation is written in profile_dir in a file named after the execution id of the request
+    Return the profile_func_entrypoint
+    """
+    with open(shim_path, 'a') as shim_file:
+        shim_file.write(
+            "\n\n"
+            f"def {profile_func_entrypoint}(request):\n"
+            "    import cProfile\n"
+            "    import os\n"
+            "    import uuid\n"
+            "    profiler = cProfile.Profile()\n"
+            "    profiler.enable()\n"
+            "    try:\n"
+            f"        return {entrypoint}(request)\n"
+            "    finally:\n"
+            "        profiler.disable()\n"
+            f"        execution_id = request.headers.get('{EXECUTION_ID_HEADER}', 'unknown')\n"
+            f"        profiler.dump_stats(os.path.join({os.path.abspath(profile_dir)!r}, f'{{execution_id}}-{{uuid.uuid4().hex}}.pstats'))\n"
+        )
+    return profile_func_entrypoint
+
+
+def collect_profile(test: BaseFunctionTest, profile_dir: str) -> pstats.Stats:
+    """
+    Merge the profiles of the invocations of the test into a pstats file named after the test
+    and write the stacks of the profile as collapsed stacks that flamegraph tools read
+    Return the merged profile, None if no invocation of the test was profiled
+    """
+    paths = sorted(glob.glob(os.path.join(profile_dir, f"{test.execution_id}-*.pstats")))
+    if not paths:
+        return None
+    stats = pstats.Stats(*paths)
+    stats.dump_stats(os.path.join(profile_dir, f"{test.name}.pstats"))
+    with open(os.path.join(profile_dir, f"{test.name}.collapsed"), 'w') as file:
+        file.writelines(f"{stack} {value}\n" for stack, value in collapse_stacks(stats))
+    for path in paths:
+        os.remove(path)
+    return stats
+
+
+def format_function(function: Tuple[str, int, str]) -> str:
+    """Return the name of a function of a profile as file:line(name), without the directories of the file"""
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def collapse_stacks(stats: pstats.Stats) -> List[Tuple[str, int]]:
+    """
+    Rebuild the stacks of a profile as (stack, microseconds spent in the last function of the stack)
+    cProfile only records the caller of each function, the time of a function is therefore split between
+    the stacks leading to it in proportion of the time it spent being called by each caller
+    """
+    functions = {
+        function: values for function, values in stats.stats.items()
+        # the call disabling the profiler is not part of the function
+        if "_lsprof.Profiler" not in function[2]
+    }
+    callees: Dict[tuple, list] = {function: [] for function in functions}
+    for function, (_, _, _, _, callers) in functions.items():
+        for caller in callers:
+            if caller in callees:
+                callees[caller].append(function)
+    stacks = {}
+
+    def walk(function: tuple, stack: List[str], share: float) -> None:
+        _, _, self_time, cumulative_time, _ = functions[function]
+        stack = stack + [format_function(function)]
+        key = ";".join(stack)
+        stacks[key] = stacks.get(key, 0) + self_time * share
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for callee in callees[function]:
+            if format_function(callee) in stack:
+                continue
+            callee_cumulative_time = functions[callee][3]
+            time_from_caller = functions[callee][4][function][3]
+            if callee_cumulative_time > 0:
+                walk(callee, stack, share * time_from_caller / callee_cumulative_time)
+
+    for function, values in functions.items():
+        if not any(caller in functions for caller in values[4]):
+            walk(function, [], 1.0)
+    return [(stack, round(value * 1e6)) for stack, value in sorted(stacks.items()) if round(value * 1e6) > 0]
+
+
+def display_hot_functions(stats: pstats.Stats, top: int) -> None:
+    """Log the top functions of a profile by the time spent in them, excluding the functions they call"""
+    total_time = sum(values[2] for values in stats.stats.values()) or 1.0
+    hot_functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    for function, (_, calls, self_time, _, _) in hot_functions:
+        custom_logger.log_colored(
+            f"    {self_time * 1000:>9.3f}ms {self_time / total_time:>6.1%} {calls:>6} calls  {format_function(function)}"
+        )
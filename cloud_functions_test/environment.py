@@ -1,47 +1,93 @@
 import os
-import re
+from typing import List, Optional
+
 from dotenv import load_dotenv
 
 from .exceptions import InvalidTerraformFileError
+from .hcl import parse_hcl_expression
+from .terraform_index import TERRAFORM_VARIABLES
+from .terraform_index import find_terraform_files
+from .terraform_index import format_env_value
+from .terraform_index import select_terraform_function
+
+
+def is_terraform_location(location: str) -> bool:
+    """Return whether the env location is a Terraform file or a directory of Terraform files"""
+    return location.endswith('.tf') or os.path.isdir(location)
+
 
+def environment_files(location: str) -> List[str]:
+    """Return the files read for the env location: the file itself or the Terraform files under the directory"""
+    return find_terraform_files(location) if os.path.isdir(location) else [location]
 
-def setup_environment(location: str) -> None:
-    """Load environment variables from the file specified (.env by default)"""
-    if location.split(".")[-1] == 'tf':
-        load_terraform_env(location)
+
+def setup_environment(location: str, override: bool = False, terraform_function: str = None, source: str = None) -> None:
+    """
+    Load environment variables from the file specified (.env by default)
+    With override, the variables of a .env file replace those already defined in the environment
+    The variables of a Terraform file or directory are those of the function selected by terraform_function or source
+    """
+    if is_terraform_location(location):
+        load_terraform_env(location, terraform_function, source)
     else:
-        load_dotenv(location)
-
-
-def load_terraform_env(location: str) -> None:
-    """Load the environment variables defined in the Terraform file provided"""
-    env_vars_str = ""
-    with open(location, 'r') as file:
-        lines = file.readlines()
-        reached_env_var = False
-        open_braces_count = 0
-        for line in lines:
-            pattern = re.compile(r"environment_variables\s*=\s*(.*)")
-            match = pattern.search(line)
-            # if we've just encountered the beginning of the environment_variables, add everything after the match
-            if match:
-                reached_env_var = True
-                open_braces_count += line.count('{')
-                open_braces_count -= line.count('}')
-                env_vars_str += match.group(1).strip()
-            # if it's within the environment_variables, add the whole line
-            elif reached_env_var:
-                open_braces_count += line.count('{')
-                open_braces_count -= line.count('}')
-                env_vars_str += line.strip()
-                # if we've reached the end of the def of the environment_variables
-                if open_braces_count == 0:
-                    break
-    if env_vars_str:
-        env_vars = parse_terraform_env_str(env_vars_str)
-        # load the variables in the environment from the dict
-        for key, value in env_vars.items():
-            os.environ[key] = value
+        load_dotenv(location, override=override)
+
+
+def load_terraform_env(location: str, name: str = None, source: str = None) -> None:
+    """Load the environment variables of the function selected in the Terraform file or directory provided"""
+    function = select_terraform_function(location, name, source)
+    if function is None or function["environment_variables"] is None:
+        return
+    if not isinstance(function["environment_variables"], dict):
+        raise InvalidTerraformFileError(
+            f"The environment_variables of the function defined at {function['file']}:{function['line']} "
+            "is not a map the package can read"
+        )
+    for key, value in function["environment_variables"].items():
+        os.environ[key] = value
+
+
+def load_terraform_memory(location: str, name: str = None, source: str = None) -> Optional[int]:
+    """
+    Return the memory in MB available to the function in the Terraform file provided, None if it's not defined
+    It's read from available_memory_mb or memory_mb, or from available_memory and its unit for 2nd gen functions
+    """
+    return load_terraform_limits(location, name, source)["memory_mb"]
+
+
+def load_terraform_timeout(location: str, name: str = None, source: str = None) -> Optional[float]:
+    """Return the timeout in seconds of the function in the Terraform file provided, None if it's not defined"""
+    return load_terraform_limits(location, name, source)["timeout"]
+
+
+def load_terraform_concurrency(location: str, name: str = None, source: str = None) -> Optional[int]:
+    """
+    Return the maximum number of requests handled at the same time by an instance of the function
+    in the Terraform file provided, None if it's not defined
+    """
+    return load_terraform_limits(location, name, source)["max_concurrency"]
+
+
+def load_terraform_limits(location: str, name: str = None, source: str = None) -> dict:
+    """
+    Return the limits of the function in the Terraform file provided: the memory available in MB,
+    the timeout in seconds and the maximum number of concurrent requests per instance, None when not defined
+    """
+    function = select_terraform_function(location, name, source) or {}
+    return {key: function.get(key) for key in ("memory_mb", "timeout", "max_concurrency")}
+
+
+def load_terraform_scaling(location: str, name: str = None, source: str = None) -> dict:
+    """
+    Return the scaling settings of the function in the Terraform file provided: the minimum and maximum number
+    of instances and the maximum number of concurrent requests per instance, None when not defined
+    They are read from min/max_instances, or from min/max_instance_count for 2nd gen functions
+    A maximum of 0 instances means that the number of instances is not limited, as when it's not defined
+    """
+    function = select_terraform_function(location, name, source) or {}
+    scaling = {key: function.get(key) for key in ("min_instances", "max_instances", "max_concurrency")}
+    scaling["max_instances"] = scaling["max_instances"] or None
+    return scaling
 
 
 def parse_terraform_env_str(env_vars_str: str) -> dict:
@@ -49,23 +95,9 @@ def parse_terraform_env_str(env_vars_str: str) -> dict:
     Given a string containing the content of a Terraform environment_variables variable,
     return the content as a dict ENV_VAR:value
     """
-    env_vars_str = env_vars_str.strip()[1:-1] # remove the brackets at the beginning and at the end
-    env_vars = {}
-    for line in env_vars_str.split(","):
-        if not line.strip():
-            continue
-        try:
-            var, val = line.strip().split('=')
-            var = var.strip()
-            val = val.strip().strip('"')
-            # Replace any `${var.env}` with 'dev'
-            val = re.sub(r'\${var.env}', 'dev', val)
-            # Replace 'var.env' with 'dev'
-            val = 'dev' if val == 'var.env' else val
-            env_vars[var] = val
-        except Exception:
-            raise InvalidTerraformFileError("The Terraform file specified does not follow a syntax the package can read")
+    env_vars = parse_hcl_expression(env_vars_str, TERRAFORM_VARIABLES)
+    if not isinstance(env_vars, dict):
+        raise InvalidTerraformFileError("The Terraform file specified does not follow a syntax the package can read")
     if not env_vars:
         raise InvalidTerraformFileError("The Terraform file specified does not contain any env variables")
-    return env_vars
-
+    return {key: format_env_value(value) for key, value in env_vars.items()}
@@ -21,3 +21,18 @@ class PortUnavailableError(Exception):
 class DifferentClassTypesError(Exception):
     """Used when the user included two different types of functions in the user-defined classes"""
     pass
+
+
+class ServerStartupError(Exception):
+    """Used when the local server exits or is not ready before the startup timeout"""
+    pass
+
+
+class InvalidBaselineFileError(Exception):
+    """Used when the baseline file of the latencies cannot be read"""
+    pass
+
+
+class InvalidCasesFileError(Exception):
+    """Used when a line of the JSONL file of the cases of a test class is not valid json"""
+    pass
@@ -1,22 +1,39 @@
+import copy
+import functools
+import hashlib
+import itertools
+import json
 import os
 import socket
-import shutil
+import statistics
 import sys
 import time
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from importlib import import_module
-from typing import List, Tuple, Type
+from typing import Callable, Dict, List, Tuple, Type
 
 from requests import ConnectionError
+from requests import ReadTimeout
+from requests import Session
 
+from .cpu_profiling import collect_profile
+from .cpu_profiling import display_hot_functions
 from .exceptions import DifferentClassTypesError
 from .exceptions import MissingTestClassError
 from .exceptions import PortUnavailableError
+from .exceptions import ServerStartupError
 from .logger import custom_logger
 from .test_classes.base_test import BaseFunctionTest
 from .test_classes.event_test import EventFunctionTest
 from .test_classes.http_test import HttpFunctionTest
-from .utils import log_reader
+from .log_collector import LogCollector
+from .utils import route_execution_logs
+from .utils import split_logs
+
+
+# number of cases of a test class read and sent to the local servers at a time
+CASES_BATCH_SIZE = 100
 
 
 def import_user_classes(module_name: str) -> list:
@@ -56,80 +73,462 @@ def create_tests(user_defined_classes: List[object]) -> Tuple[List[BaseFunctionT
     return test_classes, types.pop()
 
 
-def start_server(port: int, entrypoint: str, temp_file_path) -> object:
-    """Use function-framework to launch a server with the user's cloud function locally"""
+def first_cases(tests: List[BaseFunctionTest]) -> List[BaseFunctionTest]:
+    """
+    Return the tests with those defining cases replaced by their first case, for the commands sending each test
+    as one request, the tests without any case are left out
+    Raise a MissingTestClassError if no test is left
+    """
+    selected_tests = []
+    for test in tests:
+        if test.cases is None:
+            selected_tests.append(test)
+            continue
+        case = next(test.iter_cases(), None)
+        if case is None:
+            custom_logger.log_colored([(f"test {test.name}: ", "DEFAULT"), ("skipped", "YELLOW"), (" (no case)", "DEFAULT")])
+            continue
+        selected_tests.append(test.with_case(0, case))
+    if not selected_tests:
+        raise MissingTestClassError("None of your test classes has a case to invoke the function with")
+    return selected_tests
+
+
+def start_server(port: int, entrypoint: str, temp_file_path: str, startup_timeout: float, env_vars: dict = None) -> object:
+    """
+    Use function-framework to launch a server with the user's cloud function locally
+    env_vars are added to the environment of the server on top of the current environment
+    """
     check_port_availability(port)
-    try:
-        process = subprocess.Popen(
-            ['functions_framework', f'--target={entrypoint}', f'--port={port}', f'--source={temp_file_path}'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        time.sleep(1) # to make sure the server has time to be running
-        return process
-    except ConnectionError:
-        error_message = (
-            f"Could not start the local server. Make sure that the entrypoint function of your Cloud Function "
-            "is called {entrypoint}. Otherwise, you can change this parameters in your test file or in the cli."
-        )
-        raise ConnectionError(error_message)
+    process = subprocess.Popen(
+        ['functions_framework', f'--target={entrypoint}', f'--port={port}', f'--source={temp_file_path}'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        # unbuffered so that the logs of an invocation reach the pipes before its response
+        env={**os.environ, 'PYTHONUNBUFFERED': '1', **(env_vars or {})},
+        # in its own process group so that the server and its workers can be killed together
+        start_new_session=True,
+    )
+    startup_time = wait_for_server(process, port, entrypoint, startup_timeout)
+    custom_logger.log_colored(f"Local server ready on port {port} in {round(startup_time, 6)}s")
+    return process
+
+
+def start_servers(ports: List[int], entrypoint: str, temp_file_path: str, startup_timeout: float, env_vars: dict = None) -> List[object]:
+    """
+    Launch one local server per port in parallel and return their processes in the order of the ports
+    If one of the servers cannot start, terminate the others and raise its Exception
+    """
+    with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+        futures = [
+            executor.submit(start_server, port, entrypoint, temp_file_path, startup_timeout, env_vars)
+            for port in ports
+        ]
+    exceptions = [future.exception() for future in futures if future.exception() is not None]
+    if exceptions:
+        for future in futures:
+            if future.exception() is None:
+                terminate_server(future.result())
+        raise exceptions[0]
+    return [future.result() for future in futures]
+
+
+def terminate_server(process: object) -> None:
+    """Terminate the local server and wait for it to exit, reading what is left in its pipes so as to close them"""
+    process.terminate()
+    process.communicate()
+
+
+def wait_for_server(process: object, port: int, entrypoint: str, startup_timeout: float) -> float:
+    """
+    Poll the port with an exponential backoff until the server accepts connections
+    Raise an Exception if the process exits or if the server is not ready before the startup timeout
+    Return the time it took for the server to be ready
+    """
+    start_time = time.perf_counter()
+    delay = 0.01
+    while True:
+        if process.poll() is not None:
+            _, stderr = process.communicate()
+            error_message = (
+                f"Could not start the local server. Make sure that the entrypoint function of your Cloud Function "
+                f"is called {entrypoint}. Otherwise, you can change this parameters in your test file or in the cli.\n"
+                f"{stderr.decode('utf-8').strip()}"
+            )
+            raise ServerStartupError(error_message)
+        if is_port_in_use(port):
+            return time.perf_counter() - start_time
+        remaining_time = startup_timeout - (time.perf_counter() - start_time)
+        if remaining_time <= 0:
+            terminate_server(process)
+            raise ServerStartupError(f"The local server was not ready after {startup_timeout}s")
+        time.sleep(min(delay, remaining_time))
+        delay = min(delay * 2, 0.2)
+
+
+def is_port_in_use(port: int) -> bool:
+    """Return whether a process is accepting connections on the port of localhost"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(1)
+        return s.connect_ex(("localhost", port)) == 0
+
+
+def wait_for_port_release(port: int, timeout: float) -> None:
+    """Poll the port until no process accepts connections on it anymore, at most timeout seconds"""
+    start_time = time.perf_counter()
+    while is_port_in_use(port) and time.perf_counter() - start_time < timeout:
+        time.sleep(0.01)
 
 
 def check_port_availability(port: int) -> None:
     """Check whether the port chosen is available, raise Exception if not"""
-    host = "localhost"
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    socket.setdefaulttimeout(1)
-    result = s.connect_ex((host, port))
-    if result == 0:
-        PortUnavailableError(f"Port {port} is already used by another process")
-    else:
-        pass
+    if is_port_in_use(port):
+        raise PortUnavailableError(f"Port {port} is already used by another process")
 
 
-def create_temp_file_event(tempfile: object, source: str, entrypoint: str, event_func_entrypoint: str) -> Tuple[str, str]:
+def find_available_ports(start_port: int, number: int) -> List[int]:
+    """Return the first number available ports of localhost starting from start_port"""
+    ports = []
+    port = start_port
+    while len(ports) < number:
+        if port > 65535:
+            raise PortUnavailableError(f"Could not find {number} available ports from port {start_port}")
+        try:
+            check_port_availability(port)
+            ports.append(port)
+        except PortUnavailableError:
+            pass
+        port += 1
+    return ports
+
+
+def create_shim(shim_path: str, source: str, entrypoint: str) -> str:
+    """
+    Write in the shim a module importing the entrypoint from the source in place, so that code can be added around the function
+    The source keeps its directory on the path to import its sibling modules and its cached bytecode is reused
+    Return the entrypoint
+    """
+    directory, filename = os.path.split(os.path.abspath(source))
+    module_name = os.path.splitext(filename)[0]
+    with open(shim_path, 'w') as shim_file:
+        shim_file.write(
+            "import sys\n"
+            f"sys.path.insert(0, {directory!r})\n"
+            "# imported again when the function is reloaded in the same process\n"
+            f"sys.modules.pop({module_name!r}, None)\n"
+            f"from {module_name} import {entrypoint}\n"
+        )
+    return entrypoint
+
+
+def add_event_wrapper(shim_path: str, entrypoint: str, event_func_entrypoint: str) -> str:
     """
-    Create a temporary file with the content of the source
-    Add a event_func_entrypoint function that will receive the request in the server and redirect it
+    Add to the shim a event_func_entrypoint function that will receive the request in the server and redirect it
     to the user'd original entrypoint after having transformed the request param into event/context
+    It responds with the result of the invocation as json: whether the function succeeded, the type and
+    the traceback of its Exception if it crashed and the time spent in the function in seconds
+    Return the event_func_entrypoint
     """
-    temp_file_path = tempfile.name
-    with open(source, 'r') as src_file:
-        with open(temp_file_path, 'w') as dest_file:
-            shutil.copyfileobj(src_file, dest_file)
-    with open(temp_file_path, 'a') as temp_file:
-        temp_file.write(
+    with open(shim_path, 'a') as shim_file:
+        shim_file.write(
             "\n\n"
             f"def {event_func_entrypoint}(request):\n"
-            "    payload = request.get_json()\n"
+            "    import time\n"
+            "    import traceback\n"
+            "    payload = request.get_json(silent=True) or {}\n"
             "    event = payload.get('event')\n"
             "    context = payload.get('context')\n"
-            f"    {entrypoint}(event, context)\n"
-            "    return('DUMMY', 200)\n"
+            "    start_time = time.perf_counter()\n"
+            "    try:\n"
+            f"        {entrypoint}(event, context)\n"
+            "    except Exception as error:\n"
+            "        exception = type(error).__name__\n"
+            "        # the traceback starts after the frame of this wrapper\n"
+            "        error_traceback = ''.join(traceback.format_exception(type(error), error, error.__traceback__.tb_next))\n"
+            "    else:\n"
+            "        exception = None\n"
+            "        error_traceback = None\n"
+            "    duration = time.perf_counter() - start_time\n"
+            "    return ({'success': exception is None, 'exception': exception, 'traceback': error_traceback, 'duration': duration}, 200)\n"
         )
-    return temp_file_path, event_func_entrypoint
+    return event_func_entrypoint
 
 
-def run_tests(process: object, local_url: str, tests: Type[BaseFunctionTest]) -> Tuple[List, List]:
-    """Run all tests, return lists with the failures and the successes"""
-    results = []
-    for test in tests:
-        try:
-            test.make_post_request(local_url)
-        except ConnectionError:
-            error_message = (
-                f"Could not run your Cloud Function. Make sure that the entrypoint you provided "
-                "(main by default) matches the name of your function."
+def add_log_format(shim_path: str) -> None:
+    """
+    Add to the shim the format of the records of logging written by a server labelling its logs with execution ids
+    functions-framework writes them as their message only, they are prefixed with their level and logger
+    as they are by logging without the labels, so that split_logs tells them apart from the crashes
+    """
+    with open(shim_path, 'a') as shim_file:
+        shim_file.write(
+            "\n\n"
+            "import logging\n"
+            "for _cloud_functions_test_handler in logging.getLogger().handlers:\n"
+            "    _cloud_functions_test_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))\n"
+        )
+
+
+def cache_shim(shim_path: str, source: str) -> str:
+    """
+    Move the shim to a file named after the source and a hash of its content, so that the same shim is reused
+    by the next runs along with its cached bytecode. Return the path of the cached shim
+    """
+    with open(shim_path, 'rb') as shim_file:
+        content_hash = hashlib.sha256(shim_file.read()).hexdigest()[:16]
+    cached_path = os.path.join(
+        os.path.dirname(shim_path),
+        f"{os.path.splitext(os.path.basename(source))[0]}_{content_hash}.py"
+    )
+    if os.path.exists(cached_path):
+        os.remove(shim_path)
+    else:
+        os.replace(shim_path, cached_path)
+    return cached_path
+
+
+def run_tests(
+    servers: List[Tuple[object, str]],
+    tests: List[BaseFunctionTest],
+    session: Session,
+    workers: int = 1,
+    latency_samples: int = 1,
+    profile_dir: str = None,
+    profile_top: int = 0,
+    suite_timeout: float = None,
+    restart_server: Callable[[int], LogCollector] = None
+) -> Tuple[List, List]:
+    """
+    Run all tests with the same http session, return lists with the failures and the successes
+    servers is a list of (log_collector, local_url) of the local servers, the tests are spread between them
+    and each server runs its share of the tests at the same time as the others
+    The latency of the tests that check it is then measured one test at a time over latency_samples requests
+    The results are checked once all requests are done to keep the order of the tests
+    The tests with cases are run case by case when their result is checked
+    With a profile_dir, the profiles of the invocations of each test are collected in it
+    and the profile_top hot functions are logged after the result of the test
+    With a suite_timeout, the requests not sent within suite_timeout seconds are not sent and their tests time out
+    A server whose request timed out is replaced by restart_server(index of the server), which returns its log collector
+    and updates servers, so that the invocation stuck in it does not slow down the next tests
+    """
+    deadline = time.monotonic() + suite_timeout if suite_timeout is not None else None
+    request_tests = [test for test in tests if test.cases is None]
+    test_logs = send_sharded_requests(servers, request_tests, session, workers, deadline, restart_server)
+    for index, test in enumerate(request_tests):
+        if test.measure_latency and test.timed_out is None:
+            server_index = index % len(servers)
+            test.latency = measure_test_latency(
+                test,
+                servers[server_index][1],
+                session,
+                latency_samples,
+                deadline,
+                functools.partial(restart_server, server_index) if restart_server is not None else None,
             )
-            raise Exception(error_message)
-        error_logs, standard_logs = log_reader(process)
-        validity_result = test.check_response_validity(error_logs, standard_logs)
-        results.append(validity_result)
-    failures = [item[1] for item in results if item[0] == 'failed']
-    successes = [item[1] for item in results if item[0] == 'passed']
+    for test in tests:
+        if test.cases is not None:
+            test.result = run_test_cases(servers, test, session, workers, deadline, restart_server)
+        elif test.timed_out is not None:
+            test.result = test.timeout_result(*test_logs[test.execution_id])
+        else:
+            test.result = test.check_response_validity(*test_logs[test.execution_id])
+        if profile_dir is not None:
+            stats = collect_profile(test, profile_dir)
+            if stats is not None:
+                display_hot_functions(stats, profile_top)
+    failures = [test.result[1] for test in tests if test.result[0] == 'failed']
+    successes = [test.result[1] for test in tests if test.result[0] == 'passed']
     return (failures, successes)
 
 
+def send_sharded_requests(
+    servers: List[Tuple[object, str]],
+    tests: List[BaseFunctionTest],
+    session: Session,
+    workers: int,
+    deadline: float = None,
+    restart_server: Callable[[int], LogCollector] = None
+) -> Dict[str, Tuple[str, str]]:
+    """
+    Spread the tests between the servers, the test i going to the server i modulo the number of servers,
+    and make their requests to each server at the same time
+    Return their logs in a dict execution_id: tuple(error, standard)
+    """
+    shards = [tests[index::len(servers)] for index in range(len(servers))]
+    test_logs = {}
+    with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+        for shard_logs in executor.map(
+            lambda index, shard: send_test_requests(
+                servers[index][0],
+                servers[index][1],
+                shard,
+                session,
+                workers,
+                deadline,
+                functools.partial(restart_server, index) if restart_server is not None else None,
+            ),
+            range(len(servers)),
+            shards
+        ):
+            test_logs.update(shard_logs)
+    return test_logs
+
+
+def run_test_cases(
+    servers: List[Tuple[object, str]],
+    test: BaseFunctionTest,
+    session: Session,
+    workers: int,
+    deadline: float = None,
+    restart_server: Callable[[int], LogCollector] = None
+) -> Tuple[str, list]:
+    """
+    Run the cases of the test by batches of CASES_BATCH_SIZE read lazily from its cases
+    so that the memory used does not depend on the number of cases, only the failed cases are kept
+    The cases left when the deadline of the suite is reached are not run
+    Log the result of the test as a whole and return its status and the detailled logs of its failed cases
+    """
+    start_time = time.perf_counter()
+    cases = enumerate(test.iter_cases())
+    passed = 0
+    failed = 0
+    display_message = []
+    # whether some cases were not run because of the deadline
+    exhausted = False
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            exhausted = next(cases, None) is not None
+            break
+        batch = [test.with_case(index, case) for index, case in itertools.islice(cases, CASES_BATCH_SIZE)]
+        if not batch:
+            break
+        test_logs = send_sharded_requests(servers, batch, session, workers, deadline, restart_server)
+        for invocation in batch:
+            if invocation.timed_out is not None:
+                status, case_message = invocation.timeout_result(*test_logs[invocation.execution_id])
+            else:
+                if invocation.max_latency is not None:
+                    invocation.latency = invocation.response.elapsed.total_seconds()
+                status, case_message = invocation.check_response_validity(*test_logs[invocation.execution_id])
+            if status == 'failed':
+                failed += 1
+                display_message.extend(case_message)
+            else:
+                passed += 1
+    duration = round(time.perf_counter() - start_time, 6)
+    if exhausted:
+        display_message.append("The cases left were not run, the time budget of the suite was exhausted")
+    if failed or exhausted:
+        custom_logger.log_colored([(f"test {test.name} ({passed + failed} cases) in {duration}s: ", "DEFAULT"), ("FAILED", "RED")])
+        return ("failed", [(f"test {test.name}: {failed} of {passed + failed} cases failed", "CYAN"), *display_message])
+    custom_logger.log_colored([(f"test {test.name} ({passed} cases) in {duration}s: ", "DEFAULT"), ("PASSED", "GREEN")])
+    return ("passed", [])
+
+
+def send_test_requests(
+    log_collector: LogCollector,
+    local_url: str,
+    tests: List[BaseFunctionTest],
+    session: Session,
+    workers: int,
+    deadline: float = None,
+    restart_server: Callable[[], LogCollector] = None
+) -> Dict[str, Tuple[str, str]]:
+    """
+    Make the requests of the tests to the server and return their logs in a dict execution_id: tuple(error, standard)
+    The logs of a request are those collected between the moment it is sent and the moment
+    everything the server wrote before its response has been collected
+    With several workers, the requests are sent concurrently and the logs are routed to each test
+    through the execution id of its request
+    Without log collector, the function is run in-process and the logs are attached to the responses
+    Once a request timed out, the logs written until then are collected and the server is replaced by restart_server
+    """
+    test_logs = {}
+    if log_collector is None:
+        for test in tests:
+            make_test_request(test, local_url, session, deadline)
+            test_logs[test.execution_id] = test.response.logs if test.response is not None else ("", "")
+    elif workers > 1:
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            stuck = any(executor.map(lambda test: make_test_request(test, local_url, session, deadline), tests))
+        log_collector.sync()
+        execution_logs = route_execution_logs(log_collector.slice(start, time.monotonic()))
+        for test in tests:
+            test_logs[test.execution_id] = execution_logs.get(test.execution_id, ("", ""))
+        # what the server wrote outside of the invocations cannot be attached to one of the tests
+        unattributed_logs = "\n".join(logs for logs in execution_logs.get(None, ()) if logs)
+        if unattributed_logs:
+            custom_logger.log_colored((f"Logs of the server not attributed to a test:\n{unattributed_logs}", "YELLOW"))
+        if stuck and restart_server is not None:
+            restart_server()
+    else:
+        for test in tests:
+            start = time.monotonic()
+            stuck = make_test_request(test, local_url, session, deadline)
+            log_collector.sync()
+            test_logs[test.execution_id] = split_logs(log_collector.slice(start, time.monotonic()))
+            if stuck and restart_server is not None:
+                log_collector = restart_server()
+    return test_logs
+
+
+def measure_test_latency(
+    test: BaseFunctionTest,
+    local_url: str,
+    session: Session,
+    samples: int,
+    deadline: float = None,
+    restart_server: Callable[[], LogCollector] = None
+) -> float:
+    """
+    Make the request of a copy of the test until samples response times are known, including the one of the test
+    Return their median to reduce the noise of a single measure, the samples stop at the first one that times out
+    or once the deadline of the suite is reached. A server left with a request that timed out is replaced by restart_server
+    """
+    response_times = [test.response.elapsed.total_seconds()]
+    for _ in range(samples - 1):
+        invocation = copy.copy(test)
+        stuck = make_test_request(invocation, local_url, session, deadline)
+        if stuck and restart_server is not None:
+            restart_server()
+        if invocation.response is None:
+            break
+        response_times.append(invocation.response.elapsed.total_seconds())
+    return statistics.median(response_times)
+
+
+def make_test_request(test: BaseFunctionTest, local_url: str, session: Session, deadline: float = None) -> bool:
+    """
+    Make the request of the test to the local server, within the timeout of the test and before the deadline if any
+    If the request times out or the deadline is reached before it is sent, the test has no response
+    and test.timed_out explains why. Return whether the server was left with a request that timed out
+    """
+    timeout = test.timeout
+    reason = f"No response within the timeout of {timeout}s"
+    if deadline is not None:
+        remaining_time = deadline - time.monotonic()
+        if remaining_time <= 0:
+            test.timed_out = "Not run, the time budget of the suite was exhausted"
+            return False
+        if timeout is None or remaining_time < timeout:
+            timeout = remaining_time
+            reason = "No response before the end of the time budget of the suite"
+    try:
+        test.make_post_request(local_url, session, timeout)
+    except ReadTimeout:
+        test.response = None
+        test.timed_out = reason
+        return True
+    except ConnectionError:
+        error_message = (
+            f"Could not run your Cloud Function. Make sure that the entrypoint you provided "
+            "(main by default) matches the name of your function."
+        )
+        raise Exception(error_message)
+    return False
+
+
 def display_detailed_results(failures: list, successes: list) -> None:
     """Given lists of failures and successes, log their results"""
     custom_logger.log_colored(f"*** {len(successes)} tests passed and {len(failures)} failed ***")
@@ -143,3 +542,9 @@ def display_detailed_results(failures: list, successes: list) -> None:
         for result in successes:
             for item in result:
                 custom_logger.log_colored(item)
+
+
+def write_results_report(failures: list, successes: list, location: str) -> None:
+    """Write the detailled logs of the failures and of the successes as json in the file provided"""
+    with open(location, 'w') as file:
+        json.dump({"failures": failures, "successes": successes}, file, indent=2)
@@ -0,0 +1,480 @@
+import re
+import textwrap
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .exceptions import InvalidTerraformFileError
+
+
+# one token of HCL after the whitespace, the strings and the heredocs are only started by the pattern and scanned apart
+TOKEN_PATTERN = re.compile(
+    r'(?P<space>[ \t\r]+)'
+    r'|(?P<comment>#[^\n]*|//[^\n]*|/\*(?s:.*?)\*/)'
+    r'|(?P<newline>\n)'
+    r'|(?P<heredoc><<-?(?P<marker>[A-Za-z_][A-Za-z0-9_-]*)[ \t]*\r?\n)'
+    r'|(?P<string>")'
+    r'|(?P<number>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)'
+    r'|(?P<identifier>[A-Za-z_][A-Za-z0-9_-]*)'
+    r'|(?P<operator>==|!=|<=|>=|&&|\|\||=>|\.\.\.|[{}\[\]()=,.:?!<>+\-*/%])'
+)
+ESCAPE_PATTERN = re.compile(r'\\(u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)|\$\$\{|%%\{')
+ESCAPES = {"n": "\n", "r": "\r", "t": "\t", '"': '"', "\\": "\\"}
+LITERALS = {"true": True, "false": False, "null": None}
+# precedence of the binary operators, the higher the tighter
+BINARY_OPERATORS = {"||": 1, "&&": 2, "==": 3, "!=": 3, "<": 4, ">": 4, "<=": 4, ">=": 4, "+": 5, "-": 5, "*": 6, "/": 6, "%": 6}
+CLOSING = {"(": ")", "[": "]", "{": "}"}
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+    end: int
+    line: int
+
+
+class Expression(str):
+    """Expression of a Terraform file that cannot be evaluated without Terraform, as it is written in the file"""
+    pass
+
+
+class Block:
+    """Block of a Terraform file with its type and labels, the attributes defined in it and the blocks nested in it"""
+
+    def __init__(self, block_type: Optional[str], labels: List[str], line: int) -> None:
+        self.type = block_type
+        self.labels = labels
+        self.line = line
+        self.attributes: Dict[str, Any] = {}
+        self.blocks: List["Block"] = []
+
+
+def scan_string(text: str, start: int) -> int:
+    """Return the position after the closing quote of the string whose content starts at start, None if it's not closed"""
+    position = start
+    while position < len(text):
+        character = text[position]
+        if character == "\\":
+            position += 2
+        elif character == '"':
+            return position + 1
+        elif character == "\n":
+            return None
+        elif text.startswith(("$${", "%%{"), position):
+            position += 3
+        elif text.startswith(("${", "%{"), position):
+            position = scan_interpolation(text, position + 2)
+            if position is None:
+                return None
+        else:
+            position += 1
+    return None
+
+
+def scan_interpolation(text: str, start: int) -> int:
+    """Return the position after the brace closing the interpolation whose content starts at start, None if it's not closed"""
+    depth = 1
+    position = start
+    while position < len(text):
+        character = text[position]
+        if character == '"':
+            position = scan_string(text, position + 1)
+            if position is None:
+                return None
+            continue
+        if character == "{":
+            depth += 1
+        elif character == "}":
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return None
+
+
+def tokenize(text: str, filename: str) -> List[Token]:
+    """Return the tokens of the HCL text, the comments and the whitespace other than newlines are dropped"""
+    tokens = []
+    position = 0
+    line = 1
+    while position < len(text):
+        match = TOKEN_PATTERN.match(text, position)
+        if match is None:
+            raise InvalidTerraformFileError(f"{filename}:{line}: unexpected character {text[position]!r}")
+        kind = match.lastgroup
+        end = match.end()
+        if kind == "string":
+            end = scan_string(text, end)
+            if end is None:
+                raise InvalidTerraformFileError(f"{filename}:{line}: unterminated string")
+        elif kind == "heredoc":
+            marker = re.compile(rf"^[ \t]*{re.escape(match.group('marker'))}[ \t]*\r?$", re.MULTILINE)
+            closing = marker.search(text, end)
+            if closing is None:
+                raise InvalidTerraformFileError(f"{filename}:{line}: unterminated heredoc")
+            end = closing.end()
+        if kind not in ("space", "comment"):
+            tokens.append(Token(kind, text[position:end], position, end, line))
+        line += text.count("\n", position, end)
+        position = end
+    tokens.append(Token("end", "", len(text), len(text), line))
+    return tokens
+
+
+def unescape(text: str) -> str:
+    """Return the literal part of a quoted template with its escape sequences replaced by the characters they stand for"""
+    def replace(match: re.Match) -> str:
+        sequence = match.group(0)
+        if sequence in ("$${", "%%{"):
+            return sequence[1:]
+        escaped = match.group(1)
+        if escaped[0] in "uU" and len(escaped) > 1:
+            return chr(int(escaped[1:], 16))
+        return ESCAPES.get(escaped, escaped)
+    return ESCAPE_PATTERN.sub(replace, text)
+
+
+def format_value(value: Any) -> str:
+    """Return the value as it is converted to a string by Terraform"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class HclParser:
+    """
+    Parser of the HCL of Terraform files into blocks of attributes
+    The literal values, the collections and the templates are evaluated into python values, the references
+    found in variables are replaced by their value and any other expression is kept as an Expression
+    InvalidTerraformFileError is raised, with the line, as soon as the text is found invalid
+    """
+
+    def __init__(self, text: str, filename: str = "<string>", variables: Dict[str, Any] = None) -> None:
+        self.text = text
+        self.filename = filename
+        self.variables = variables or {}
+        self.tokens = tokenize(text, filename)
+        self.position = 0
+        # the newlines separate the attributes and the items of objects, but not the items of lists or arguments
+        self.newlines_ignored = False
+
+    def error(self, message: str, token: Token = None) -> InvalidTerraformFileError:
+        token = token or self.tokens[self.position]
+        return InvalidTerraformFileError(f"{self.filename}:{token.line}: {message}")
+
+    def peek(self, offset: int = 0) -> Token:
+        """Return the token offset tokens after the next one, skipping the newlines where they are ignored"""
+        position = self.position
+        while True:
+            while self.newlines_ignored and self.tokens[position].kind == "newline":
+                position += 1
+            if offset == 0 or self.tokens[position].kind == "end":
+                return self.tokens[position]
+            position += 1
+            offset -= 1
+
+    def advance(self) -> Token:
+        """Read the next token, skipping the newlines where they are ignored"""
+        while self.newlines_ignored and self.tokens[self.position].kind == "newline":
+            self.position += 1
+        token = self.tokens[self.position]
+        if token.kind != "end":
+            self.position += 1
+        return token
+
+    def skip_newlines(self) -> None:
+        while self.tokens[self.position].kind == "newline":
+            self.position += 1
+
+    def accept(self, text: str) -> bool:
+        """Read the next token if it's the operator text, return whether it was"""
+        token = self.peek()
+        if token.kind == "operator" and token.text == text:
+            self.advance()
+            return True
+        return False
+
+    def expect(self, text: str) -> Token:
+        token = self.advance()
+        if token.kind != "operator" or token.text != text:
+            raise self.error(f"expected {text!r} but found {token.text or 'the end of the file'!r}", token)
+        return token
+
+    def source_since(self, token: Token) -> Expression:
+        """Return the text of the expression from the token to the last token read"""
+        return Expression(self.text[token.start:self.tokens[self.position - 1].end])
+
+    def parse(self) -> Block:
+        """Return the root block of the text, holding its top-level attributes and blocks"""
+        root = Block(None, [], 1)
+        self.parse_body(root)
+        token = self.advance()
+        if token.kind != "end":
+            raise self.error(f"unexpected {token.text!r}", token)
+        return root
+
+    def parse_body(self, block: Block) -> None:
+        """Read the attributes and the nested blocks of the block, until its closing brace or the end of the text"""
+        while True:
+            self.skip_newlines()
+            token = self.tokens[self.position]
+            if token.kind == "end" or token.text == "}":
+                return
+            if token.kind != "identifier":
+                raise self.error(f"expected an attribute or a block but found {token.text!r}")
+            self.advance()
+            if self.accept("="):
+                block.attributes[token.text] = self.parse_expression()
+            else:
+                labels = []
+                while self.peek().kind in ("identifier", "string"):
+                    label = self.advance()
+                    labels.append(label.text if label.kind == "identifier" else unescape(label.text[1:-1]))
+                self.expect("{")
+                nested = Block(token.text, labels, token.line)
+                self.parse_body(nested)
+                self.expect("}")
+                block.blocks.append(nested)
+            end = self.tokens[self.position]
+            if end.kind not in ("newline", "end") and end.text != "}":
+                raise self.error(f"expected a newline but found {end.text!r}", end)
+
+    def parse_expression(self) -> Any:
+        """Read an expression, a conditional one included"""
+        first = self.peek()
+        condition = self.parse_binary(1)
+        if not self.accept("?"):
+            return condition
+        self.parse_expression()
+        self.expect(":")
+        self.parse_expression()
+        return self.source_since(first)
+
+    def parse_binary(self, precedence: int) -> Any:
+        """Read an expression made of operators binding at least as tightly as precedence"""
+        first = self.peek()
+        value = self.parse_unary()
+        while True:
+            token = self.peek()
+            operator_precedence = BINARY_OPERATORS.get(token.text) if token.kind == "operator" else None
+            if operator_precedence is None or operator_precedence < precedence:
+                return value
+            self.advance()
+            self.parse_binary(operator_precedence + 1)
+            value = self.source_since(first)
+
+    def parse_unary(self) -> Any:
+        first = self.peek()
+        if self.accept("-"):
+            value = self.parse_unary()
+            return -value if isinstance(value, (int, float)) and not isinstance(value, bool) else self.source_since(first)
+        if self.accept("!"):
+            self.parse_unary()
+            return self.source_since(first)
+        return self.parse_postfix()
+
+    def parse_postfix(self) -> Any:
+        """Read a value followed by the attributes, indexes and splats accessed in it"""
+        first = self.peek()
+        value = self.parse_primary()
+        traversed = False
+        while True:
+            token = self.peek()
+            if token.kind != "operator":
+                break
+            if token.text == ".":
+                self.advance()
+                name = self.advance()
+                if name.kind not in ("identifier", "number") and name.text != "*":
+                    raise self.error(f"expected an attribute name but found {name.text!r}", name)
+            elif token.text == "[":
+                self.advance()
+                with_newlines_ignored = self.newlines_ignored
+                self.newlines_ignored = True
+                if not self.accept("*"):
+                    self.parse_expression()
+                self.expect("]")
+                self.newlines_ignored = with_newlines_ignored
+            else:
+                break
+            traversed = True
+        if not traversed:
+            return value
+        traversal = self.source_since(first)
+        return self.variables.get(traversal, traversal)
+
+    def parse_primary(self) -> Any:
+        token = self.advance()
+        if token.kind == "number":
+            return float(token.text) if any(character in token.text for character in ".eE") else int(token.text)
+        if token.kind == "string":
+            return self.parse_template(token.text[1:-1], token, quoted=True)
+        if token.kind == "heredoc":
+            lines = token.text.split("\n")
+            content = "\n".join(lines[1:-1]) + "\n" if len(lines) > 2 else ""
+            if token.text.startswith("<<-"):
+                content = textwrap.dedent(content)
+            return self.parse_template(content, token, quoted=False)
+        if token.kind == "identifier":
+            if token.text in LITERALS:
+                return LITERALS[token.text]
+            if self.peek().text == "(" and self.peek().kind == "operator":
+                self.parse_arguments()
+                return self.source_since(token)
+            return self.variables.get(token.text, Expression(token.text))
+        if token.kind == "operator" and token.text == "(":
+            with_newlines_ignored = self.newlines_ignored
+            self.newlines_ignored = True
+            value = self.parse_expression()
+            self.expect(")")
+            self.newlines_ignored = with_newlines_ignored
+            return value
+        if token.kind == "operator" and token.text == "[":
+            return self.parse_tuple(token)
+        if token.kind == "operator" and token.text == "{":
+            return self.parse_object(token)
+        raise self.error(f"expected a value but found {token.text or 'the end of the file'!r}", token)
+
+    def parse_arguments(self) -> None:
+        """Read the arguments of a function call"""
+        with_newlines_ignored = self.newlines_ignored
+        self.newlines_ignored = True
+        self.expect("(")
+        while not self.accept(")"):
+            self.parse_expression()
+            self.accept("...")
+            if not self.accept(","):
+                self.expect(")")
+                break
+        self.newlines_ignored = with_newlines_ignored
+
+    def skip_for_expression(self, opening: Token) -> Expression:
+        """Read a for expression up to the bracket closing it, it is kept as an Expression"""
+        depth = 1
+        while depth:
+            token = self.advance()
+            if token.kind == "end":
+                raise self.error(f"{opening.text!r} is not closed", opening)
+            if token.kind == "operator" and token.text in CLOSING:
+                depth += 1
+            elif token.kind == "operator" and token.text in CLOSING.values():
+                depth -= 1
+        return self.source_since(opening)
+
+    def parse_tuple(self, opening: Token) -> Any:
+        with_newlines_ignored = self.newlines_ignored
+        self.newlines_ignored = True
+        try:
+            if self.peek().text == "for" and self.peek(1).kind == "identifier":
+                return self.skip_for_expression(opening)
+            items = []
+            while not self.accept("]"):
+                items.append(self.parse_expression())
+                if not self.accept(","):
+                    self.expect("]")
+                    break
+            return items
+        finally:
+            self.newlines_ignored = with_newlines_ignored
+
+    def parse_object(self, opening: Token) -> Any:
+        """Read an object whose items are separated by commas or newlines, the keys can be names or expressions"""
+        with_newlines_ignored = self.newlines_ignored
+        self.newlines_ignored = False
+        try:
+            self.skip_newlines()
+            if self.peek().text == "for" and self.peek(1).kind == "identifier":
+                return self.skip_for_expression(opening)
+            items = {}
+            while True:
+                self.skip_newlines()
+                if self.accept("}"):
+                    return items
+                key_token = self.peek()
+                separator = self.peek(1)
+                if key_token.kind == "identifier" and separator.kind == "operator" and separator.text in ("=", ":"):
+                    self.advance()
+                    key = key_token.text
+                else:
+                    key = self.parse_expression()
+                separator = self.advance()
+                if separator.kind != "operator" or separator.text not in ("=", ":"):
+                    raise self.error(f"expected '=' after the key {key!r} but found {separator.text!r}", separator)
+                items[format_value(key)] = self.parse_expression()
+                end = self.peek()
+                if end.kind == "operator" and end.text == ",":
+                    self.advance()
+                elif end.kind != "newline" and end.text != "}":
+                    raise self.error(f"expected ',' or a newline after the value of {key!r} but found {end.text!r}", end)
+        finally:
+            self.newlines_ignored = with_newlines_ignored
+
+    def parse_template(self, content: str, token: Token, quoted: bool) -> Any:
+        """
+        Return the value of a template with its interpolations replaced by their value
+        A template whose interpolations cannot all be evaluated is kept as an Expression with them as written
+        and a template made of a single interpolation has the value of the interpolation
+        """
+        parts: List[Tuple[bool, str]] = []
+        position = 0
+        literal_start = 0
+        while position < len(content):
+            if content.startswith(("$${", "%%{"), position):
+                position += 3
+            elif content.startswith(("${", "%{"), position):
+                end = scan_interpolation(content, position + 2)
+                if end is None:
+                    raise self.error("unterminated interpolation", token)
+                parts.append((False, content[literal_start:position]))
+                parts.append((True, content[position:end]))
+                position = literal_start = end
+            elif quoted and content[position] == "\\":
+                position += 2
+            else:
+                position += 1
+        parts.append((False, content[literal_start:]))
+        values = [
+            self.evaluate_interpolation(text, token) if interpolated
+            else unescape(text) if quoted
+            else text.replace("$${", "${").replace("%%{", "%{")
+            for interpolated, text in parts
+        ]
+        if any(isinstance(value, Expression) for value in values):
+            return Expression("".join(
+                text if isinstance(value, Expression) else format_value(value)
+                for (_, text), value in zip(parts, values)
+            ) if quoted else content)
+        if len(parts) == 3 and not values[0] and not values[2]:
+            return values[1]
+        return "".join(format_value(value) for value in values)
+
+    def evaluate_interpolation(self, text: str, token: Token) -> Any:
+        """Return the value of the expression of a ${...} interpolation, an Expression for the directives"""
+        if text.startswith("%{"):
+            return Expression(text)
+        parser = HclParser(text[2:-1].strip("~"), self.filename, self.variables)
+        parser.newlines_ignored = True
+        try:
+            value = parser.parse_expression()
+            if parser.peek().kind != "end":
+                raise parser.error(f"unexpected {parser.peek().text!r}")
+        except InvalidTerraformFileError:
+            raise self.error(f"invalid interpolation {text!r}", token)
+        return value
+
+
+def parse_hcl(text: str, filename: str = "<string>", variables: Dict[str, Any] = None) -> Block:
+    """Return the root block of the HCL text, the references found in variables are replaced by their value"""
+    return HclParser(text, filename, variables).parse()
+
+
+def parse_hcl_expression(text: str, variables: Dict[str, Any] = None) -> Any:
+    """Return the value of the HCL expression, the references found in variables are replaced by their value"""
+    parser = HclParser(text.strip(), variables=variables)
+    parser.newlines_ignored = True
+    value = parser.parse_expression()
+    token = parser.peek()
+    if token.kind != "end":
+        raise parser.error(f"unexpected {token.text!r}", token)
+    return value
@@ -0,0 +1,92 @@
+import contextlib
+import io
+import json
+import logging
+import time
+import traceback
+from datetime import timedelta
+from typing import Any, Iterator, Tuple
+
+
+class InProcessResponse:
+    """Response of a call to the function in-process with the attributes of requests.Response used by the tests"""
+
+    def __init__(
+        self,
+        status_code: int,
+        headers: dict,
+        content: bytes,
+        elapsed: timedelta,
+        exception: Exception,
+        logs: Tuple[str, str]
+    ) -> None:
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.elapsed = elapsed
+        self.exception = exception
+        self.logs = logs
+
+    @property
+    def text(self) -> str:
+        """Content of the response decoded as a string"""
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self) -> Any:
+        """Content of the response decoded as json, raise json.JSONDecodeError if it's not a json"""
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size: int) -> Iterator[bytes]:
+        """Content of the response in chunks of chunk_size bytes"""
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self) -> None:
+        """Nothing to release, defined so that the response can be closed like a requests.Response"""
+        pass
+
+
+class InProcessSession:
+    """
+    Replacement of requests.Session that calls the function through the WSGI test client of the app
+    created by functions-framework in the current process instead of making a request to a local server
+    The logs of each call and the Exception raised by the function, if any, are attached to the response
+    """
+
+    def __init__(self, source: str, entrypoint: str) -> None:
+        """Import the source and create the app of the function"""
+        # imported here so that runs using a local server do not pay for the import of functions-framework
+        from functions_framework import create_app
+        self.app = create_app(entrypoint, source)
+        # let the Exceptions of the function reach the test client instead of being turned into an error page
+        self.app.config['PROPAGATE_EXCEPTIONS'] = True
+        self.client = self.app.test_client()
+
+    def post(self, url: str, headers: dict = None, json: Any = None, **kwargs) -> InProcessResponse:
+        """Call the function with the headers and the json payload provided, the url is ignored"""
+        standard_logs = io.StringIO()
+        error_logs = io.StringIO()
+        # same format as the logs of the local server so that they are displayed the same way
+        handler = logging.StreamHandler(standard_logs)
+        handler.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+        exception = None
+        start_time = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(standard_logs), contextlib.redirect_stderr(error_logs):
+                response = self.client.post('/', headers=headers, json=json)
+            status_code, headers, content = response.status_code, dict(response.headers), response.get_data()
+        except Exception as e:
+            exception = e
+            status_code, headers, content = 500, {}, b"500 Internal Server Error"
+            error_logs.write(traceback.format_exc())
+        finally:
+            elapsed = timedelta(seconds=time.perf_counter() - start_time)
+            root_logger.removeHandler(handler)
+        logs = (error_logs.getvalue().strip('\n'), standard_logs.getvalue().strip('\n'))
+        return InProcessResponse(status_code, headers, content, elapsed, exception, logs)
+
+    def close(self) -> None:
+        """Nothing to release, defined so that the session can be closed like a requests.Session"""
+        pass
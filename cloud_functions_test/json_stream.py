@@ -0,0 +1,196 @@
+import codecs
+import json
+import re
+from json.decoder import scanstring
+from typing import Any, Iterable, Tuple
+
+
+# number of bytes read at once from the body of a response parsed while it is streamed
+STREAM_CHUNK_SIZE = 65536
+# one token of json after optional whitespace: punctuation, string, number or literal, with the grammar of the json module
+TOKEN_PATTERN = re.compile(
+    r'[ \t\n\r]*(?:'
+    r'([{}\[\]:,])'
+    r'|"((?:[^"\\\x00-\x1f]|\\.)*)"'
+    r'|(-?(?:0|[1-9]\d*))(\.\d+)?([eE][-+]?\d+)?'
+    r'|(true|false|null)'
+    r')'
+)
+WHITESPACE_PATTERN = re.compile(r'[ \t\n\r]*')
+# the rest of the buffer after a number when it may be the beginning of the rest of the number
+NUMBER_TAIL_PATTERN = re.compile(r'[.eE+\-\d]*\Z')
+LITERALS = {"true": True, "false": False, "null": None}
+CLOSING = {"{": "}", "[": "]"}
+# what the next token can be after a value, depending on the container the value is in
+AFTER_VALUE = {"{": "comma_or_end", "[": "comma_or_end", None: "done"}
+DECODER = json.JSONDecoder()
+
+# ("start_map", None), ("start_array", None), ("key", str) or ("value", value) for the scalars
+Event = Tuple[str, Any]
+
+
+class JsonStream:
+    """
+    Reader of a json document made of chunks of utf-8 bytes, the chunks are only read as needed
+    The containers walked through are read event by event and the other values are read whole by the json decoder
+    Only the part of the document not read yet and the value being read whole are kept in memory
+    ValueError is raised as soon as the document is found invalid
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ""
+        self.position = 0
+        self.final = False
+        # kinds of the containers being read and what the next token can be
+        self.stack = [None]
+        self.expecting = "value"
+
+    def fill(self, size: int = 1) -> None:
+        """Drop the part of the buffer already read and add at least size characters of the next chunks to it"""
+        parts = [self.buffer[self.position:]]
+        added = 0
+        while added < size and not self.final:
+            chunk = next(self.chunks, None)
+            self.final = chunk is None
+            parts.append(self.decoder.decode(chunk or b"", self.final))
+            added += len(parts[-1])
+        self.buffer = "".join(parts)
+        self.position = 0
+
+    def next_token(self) -> re.Match:
+        """Read the next token, a number ending the buffer is only read once the next chunk tells where it ends"""
+        while True:
+            match = TOKEN_PATTERN.match(self.buffer, self.position)
+            if match is not None and (
+                self.final
+                or match.group(3) is None
+                or not NUMBER_TAIL_PATTERN.match(self.buffer, match.end())
+            ):
+                self.position = match.end()
+                return match
+            if self.final:
+                if self.buffer[self.position:].strip(" \t\n\r"):
+                    raise ValueError("Expecting value")
+                raise ValueError("Unexpected end of the document")
+            self.fill()
+
+    def read_event(self) -> Event:
+        """Read the start of the next container, the next key of an object or the next scalar value"""
+        while True:
+            punctuation, string, integer, fraction, exponent, literal = self.next_token().groups()
+            if string is not None:
+                if "\\" in string:
+                    string = scanstring(string + '"', 0, True)[0]
+                if self.expecting in ("key", "key_or_end"):
+                    self.expecting = "colon"
+                    return ("key", string)
+                return self.value_event(string)
+            if integer is not None:
+                return self.value_event(float(integer + (fraction or "") + (exponent or "")) if fraction or exponent else int(integer))
+            if literal is not None:
+                return self.value_event(LITERALS[literal])
+            if punctuation in "{[" and self.expecting in ("value", "value_or_end"):
+                self.stack.append(punctuation)
+                self.expecting = "key_or_end" if punctuation == "{" else "value_or_end"
+                return ("start_map" if punctuation == "{" else "start_array", None)
+            if punctuation == ":" and self.expecting == "colon":
+                self.expecting = "value"
+                continue
+            raise ValueError(f"Unexpected {punctuation!r}")
+
+    def value_event(self, value: Any) -> Event:
+        """Return the event of the scalar value read, if a value was expected"""
+        if self.expecting not in ("value", "value_or_end"):
+            raise ValueError("Extra data" if self.expecting == "done" else f"Unexpected value {value!r}")
+        self.expecting = AFTER_VALUE[self.stack[-1]]
+        return ("value", value)
+
+    def end_of_container(self) -> bool:
+        """
+        Return whether the container being read ends, in which case its end is read,
+        otherwise the separator before its next element or key is read
+        """
+        match = self.next_token()
+        punctuation = match.group(1)
+        if punctuation is not None and punctuation == CLOSING.get(self.stack[-1]) and self.expecting != "colon":
+            if self.expecting in ("key", "value"):
+                raise ValueError(f"Illegal trailing comma before {punctuation!r}")
+            self.stack.pop()
+            self.expecting = AFTER_VALUE[self.stack[-1]]
+            return True
+        if punctuation == "," and self.expecting == "comma_or_end":
+            self.expecting = "key" if self.stack[-1] == "{" else "value"
+            return False
+        if self.expecting in ("key_or_end", "value_or_end"):
+            # first element or key of the container, read by the caller
+            self.position = match.start()
+            return False
+        raise ValueError("Expecting ',' delimiter")
+
+    def read_value(self) -> Any:
+        """
+        Read the next value whole with the json decoder, much faster than event by event
+        The buffer is extended until it holds the whole value, by twice as many characters each time
+        """
+        if self.expecting == "colon":
+            if self.next_token().group(1) != ":":
+                raise ValueError("Expecting ':' delimiter")
+            self.expecting = "value"
+        if self.expecting not in ("value", "value_or_end"):
+            raise ValueError("Extra data" if self.expecting == "done" else "Expecting ',' delimiter")
+        size = STREAM_CHUNK_SIZE
+        while True:
+            self.position = WHITESPACE_PATTERN.match(self.buffer, self.position).end()
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.position)
+                # a value ending the buffer may continue in the next chunk, as may a number followed by
+                # the beginning of the rest of it, such as 1 read from 1. when the next chunk starts with 5
+                number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                incomplete = end == len(self.buffer) or (number and NUMBER_TAIL_PATTERN.match(self.buffer, end))
+                if not incomplete or self.final:
+                    self.position = end
+                    self.expecting = AFTER_VALUE[self.stack[-1]]
+                    return value
+            except json.JSONDecodeError as error:
+                if self.final:
+                    # the position of the error is relative to the buffer, not to the document
+                    raise ValueError(error.msg)
+            self.fill(size)
+            size *= 2
+
+    def skip_value(self) -> None:
+        """Read the next value without keeping it"""
+        self.read_value()
+
+    def read_end(self) -> None:
+        """Read the rest of the document, raise ValueError if anything but whitespace follows the json value"""
+        if self.expecting != "done":
+            raise ValueError("Unexpected end of the document")
+        while True:
+            if self.buffer[self.position:].strip(" \t\n\r"):
+                raise ValueError("Extra data")
+            if self.final:
+                return
+            self.position = len(self.buffer)
+            self.fill()
+
+
+def describe_json_value(event: Event) -> Any:
+    """Return the value read with the event if it's a scalar, otherwise the kind of container it starts"""
+    kind, value = event
+    if kind == "start_map":
+        return "an object"
+    if kind == "start_array":
+        return "an array"
+    return value
+
+
+def format_json_path(path: str, key: Any) -> str:
+    """Return the path of the key in the object or of the index in the array at the path"""
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    if isinstance(key, str) and key.isidentifier():
+        return f"{path}.{key}"
+    return f"{path}[{json.dumps(key)}]"
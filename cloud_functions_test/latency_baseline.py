@@ -0,0 +1,35 @@
+import json
+import os
+from typing import Dict, List
+
+from .exceptions import InvalidBaselineFileError
+from .test_classes.base_test import BaseFunctionTest
+
+
+def load_baseline(location: str) -> Dict[str, float]:
+    """Load the latencies recorded in the baseline file as a dict test_name: latency, empty if the file does not exist"""
+    if not os.path.exists(location):
+        return {}
+    try:
+        with open(location, 'r') as file:
+            baseline = json.load(file)
+        return {name: float(latency) for name, latency in baseline.items()}
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        raise InvalidBaselineFileError(f"The baseline file {location} must contain a json object test_name: latency")
+
+
+def apply_baseline(tests: List[BaseFunctionTest], baseline: Dict[str, float], tolerance: float) -> None:
+    """Set the baseline latency of the tests recorded in the baseline so that their latency is measured and compared"""
+    for test in tests:
+        if test.name in baseline:
+            test.baseline_latency = baseline[test.name]
+            test.baseline_tolerance = tolerance
+            test.measure_latency = True
+
+
+def write_baseline(tests: List[BaseFunctionTest], location: str) -> None:
+    """Record the latencies measured for the tests in the baseline file, keeping those of the other tests"""
+    baseline = load_baseline(location)
+    baseline.update({test.name: test.latency for test in tests if test.latency is not None})
+    with open(location, 'w') as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
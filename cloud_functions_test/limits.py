@@ -0,0 +1,96 @@
+from typing import List, Optional
+
+from .logger import custom_logger
+from .memory_profiling import PEAK_RSS_FUNCTIONS
+
+
+# header of the responses in which the limits wrapper reports the peak RSS of the process during the invocation
+PEAK_RSS_HEADER = "X-Cloud-Functions-Test-Peak-Rss"
+# share of a limit above which a test is reported as close to it
+LIMIT_WARNING_RATIO = 0.8
+
+
+def add_limits_emulation(shim_path: str, entrypoint: str, limits_func_entrypoint: str, memory_limit_mb: int = None) -> str:
+    """
+    Add to the shim of the function a limits_func_entrypoint function calling the entrypoint
+    With a memory_limit_mb, the data segment of the server loading the shim is limited to it
+    so that the allocations beyond the memory available to the function fail with a MemoryError
+    Each invocation reports the peak RSS of the process during the invocation in a header of the response, in bytes
+    Return the limits_func_entrypoint
+    """
+    with open(shim_path, 'a') as shim_file:
+        if memory_limit_mb is not None:
+            shim_file.write(
+                "\n\n"
+                "import resource\n"
+                f"resource.setrlimit(resource.RLIMIT_DATA, ({memory_limit_mb * 2 ** 20}, {memory_limit_mb * 2 ** 20}))\n"
+            )
+        shim_file.write(
+            "\n\n"
+            f"{PEAK_RSS_FUNCTIONS}"
+            "\n\n"
+            f"def {limits_func_entrypoint}(request):\n"
+            "    import flask\n"
+            "\n"
+            "    @flask.after_this_request\n"
+            "    def add_peak_rss_header(response):\n"
+            f"        response.headers['{PEAK_RSS_HEADER}'] = str(_cloud_functions_test_peak_rss())\n"
+            "        return response\n"
+            "\n"
+            "    # the peak RSS of the process starts again from its current RSS\n"
+            "    _cloud_functions_test_reset_peak_rss()\n"
+            f"    return {entrypoint}(request)\n"
+        )
+    return limits_func_entrypoint
+
+
+def server_limits_env(max_concurrency: Optional[int]) -> dict:
+    """
+    Return the environment variables limiting the number of requests handled at the same time by a server
+    to the concurrency of an instance of the function, 1 by default as in production
+    """
+    return {'THREADS': str(max_concurrency or 1)}
+
+
+def parse_peak_rss_header(value: Optional[str]) -> Optional[int]:
+    """Return the peak RSS reported in the header in bytes, None if it's missing"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_ratio(value: Optional[float], limit: Optional[float]) -> Optional[float]:
+    """Return the share of the limit reached by the value, None if either is unknown"""
+    if value is None or not limit:
+        return None
+    return value / limit
+
+
+def display_limits_results(tests: List, limits: dict) -> None:
+    """
+    Log how close each test came to the limits of the function as a table: its duration compared to the timeout
+    and the peak RSS of the server during its invocation compared to the memory available, in MB
+    The tests above a limit are in red, those above LIMIT_WARNING_RATIO of a limit in yellow
+    """
+    memory_limit_mb, timeout = limits["memory_mb"], limits["timeout"]
+    custom_logger.log_centered(
+        f"LIMITS (memory {memory_limit_mb or '-'} MB, timeout {timeout or '-'}s, concurrency {limits['max_concurrency'] or 1})"
+    )
+    name_width = max([len("test")] + [len(test.name) for test in tests])
+    custom_logger.log_colored((f"{'test':<{name_width}}  {'duration':>9}  {'timeout':>7}  {'peak RSS':>9}  {'memory':>7}", "CYAN"))
+    for test in tests:
+        duration = test.response.elapsed.total_seconds() if test.response is not None else None
+        peak_rss_mb = test.peak_rss / 2 ** 20 if test.peak_rss is not None else None
+        timeout_ratio = 1.0 if test.timed_out is not None else compute_ratio(duration, timeout)
+        memory_ratio = compute_ratio(peak_rss_mb, memory_limit_mb)
+        line = "  ".join([
+            f"{test.name:<{name_width}}",
+            f"{duration:>9.3f}" if duration is not None else f"{'-':>9}",
+            f"{'TIMEOUT' if test.timed_out is not None else '-' if timeout_ratio is None else f'{timeout_ratio:.0%}':>7}",
+            f"{peak_rss_mb:>9.1f}" if peak_rss_mb is not None else f"{'-':>9}",
+            f"{'-' if memory_ratio is None else f'{memory_ratio:.0%}':>7}",
+        ])
+        highest_ratio = max(ratio for ratio in (timeout_ratio, memory_ratio, 0) if ratio is not None)
+        color = "RED" if highest_ratio >= 1 else "YELLOW" if highest_ratio >= LIMIT_WARNING_RATIO else "DEFAULT"
+        custom_logger.log_colored((line, color))
@@ -0,0 +1,106 @@
+import os
+import selectors
+import threading
+import time
+from collections import deque
+from typing import List, Tuple
+
+
+# maximum number of lines kept by a collector, the oldest lines are dropped beyond it
+LOG_BUFFER_SIZE = 100000
+
+
+class LogCollector:
+    """
+    Continuously read the stdout and stderr of a process from a background thread
+    The lines are kept in a bounded buffer along with the time at which they were read so that the process
+    never blocks on full pipes and the logs of each invocation can be sliced from the buffer afterwards
+    """
+
+    def __init__(self, process: object, buffer_size: int = LOG_BUFFER_SIZE) -> None:
+        """Start reading the pipes of the process"""
+        self.buffer = deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.partial_lines = {}
+        self.open_streams = 0
+        self.sync_requests = 0
+        self.synced_requests = 0
+        self.closed = False
+        # a pipe written by sync to wake up the reading thread
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.wakeup_read, selectors.EVENT_READ, None)
+        for name, stream in (('stdout', process.stdout), ('stderr', process.stderr)):
+            self.selector.register(stream.fileno(), selectors.EVENT_READ, name)
+            self.partial_lines[name] = b''
+            self.open_streams += 1
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        """Read the pipes until the process closes them"""
+        try:
+            while self.open_streams:
+                for key, _ in self.selector.select():
+                    if key.data is not None:
+                        self.read_stream(key)
+                        continue
+                    os.read(self.wakeup_read, 4096)
+                    with self.condition:
+                        requests = self.sync_requests
+                    # the pipes are read until they are empty, everything written before the sync is then in the buffer
+                    while True:
+                        ready = [key for key, _ in self.selector.select(0) if key.data is not None]
+                        if not ready:
+                            break
+                        for ready_key in ready:
+                            self.read_stream(ready_key)
+                    with self.condition:
+                        self.synced_requests = requests
+                        self.condition.notify_all()
+        finally:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+            self.selector.close()
+            os.close(self.wakeup_read)
+            os.close(self.wakeup_write)
+
+    def read_stream(self, key: selectors.SelectorKey) -> None:
+        """Read the data available in a pipe and add its complete lines to the buffer"""
+        name = key.data
+        data = os.read(key.fd, 65536)
+        if not data:
+            self.selector.unregister(key.fd)
+            self.open_streams -= 1
+            lines = [self.partial_lines[name]] if self.partial_lines[name] else []
+        else:
+            lines = (self.partial_lines[name] + data).split(b'\n')
+            self.partial_lines[name] = lines.pop()
+        read_time = time.monotonic()
+        with self.condition:
+            for line in lines:
+                self.buffer.append((read_time, name, line.decode('utf-8', errors='replace') + '\n'))
+
+    def sync(self, timeout: float = 1.0) -> None:
+        """Wait until everything written to the pipes before the call is in the buffer"""
+        with self.condition:
+            if self.closed:
+                return
+            self.sync_requests += 1
+            request = self.sync_requests
+            os.write(self.wakeup_write, b'.')
+            self.condition.wait_for(lambda: self.synced_requests >= request or self.closed, timeout)
+
+    def slice(self, start: float, end: float) -> List[Tuple[str, str]]:
+        """
+        Remove from the buffer the lines read before end and return those read after start as (stream, line)
+        start and end are markers taken with time.monotonic around an invocation
+        """
+        lines = []
+        with self.condition:
+            while self.buffer and self.buffer[0][0] < end:
+                read_time, name, line = self.buffer.popleft()
+                if read_time >= start:
+                    lines.append((name, line))
+        return lines
@@ -1,5 +1,5 @@
 import logging
-import os
+import shutil
 from typing import List, Tuple
 
 
@@ -9,6 +9,7 @@ class CustomLogger:
         'RED': '\033[31m',
         'GREEN': '\033[92m',
         'CYAN': '\033[96m',
+        'YELLOW': '\033[93m',
         'DEFAULT': '\033[0m',
     }
 
@@ -41,7 +42,8 @@ class CustomLogger:
     def log_centered(self, messages: List[str], padding_char: str = '=') -> None:
         """Log the messages provided in the center of the terminal with the padding_chars all around it"""
         display_message = ' ' + "".join(messages) + ' '
-        term_width = os.get_terminal_size().columns
+        # falls back to 80 columns when the output is not a terminal
+        term_width = shutil.get_terminal_size().columns
         padding_needed = term_width - len(display_message)
         padding_one_side = padding_needed // 2
         padded_string = padding_char * padding_one_side + display_message + padding_char * padding_one_side
@@ -1,17 +1,88 @@
+import os
+import random
+import signal
+import statistics
 import subprocess
+import sys
 import tempfile
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Iterator, List, Optional, Tuple, Type
 
 import requests
 
+from .autoscaling import COLD_START_MEASURES
+from .autoscaling import PEAK_RATE_FACTOR
+from .autoscaling import display_autoscaling_results
+from .autoscaling import generate_arrivals
+from .autoscaling import simulate_autoscaling
+from .autoscaling import write_autoscaling_report
+from .bench import display_benchmark_results
+from .bench import invoke_test
+from .bench import run_benchmark
+from .bench import write_benchmark_report
+from .cold_start import display_cold_start_results
+from .cold_start import measure_cold_start
+from .cold_start import measure_import_times
+from .cpu_profiling import add_cpu_profiling
+from .environment import environment_files
+from .environment import is_terraform_location
+from .environment import load_terraform_limits
+from .environment import load_terraform_memory
+from .environment import load_terraform_scaling
+from .environment import load_terraform_timeout
 from .environment import setup_environment
-from .functions import create_temp_file_event
+from .exceptions import MissingTestClassError
+from .functions import add_event_wrapper
+from .functions import add_log_format
+from .functions import cache_shim
+from .functions import create_shim
 from .functions import create_tests
 from .functions import display_detailed_results
+from .functions import find_available_ports
+from .functions import first_cases
 from .functions import import_user_classes
 from .functions import run_tests
 from .functions import start_server
+from .functions import start_servers
+from .functions import wait_for_port_release
+from .functions import write_results_report
+from .inprocess import InProcessSession
+from .latency_baseline import apply_baseline
+from .latency_baseline import load_baseline
+from .latency_baseline import write_baseline
+from .limits import add_limits_emulation
+from .limits import display_limits_results
+from .limits import server_limits_env
+from .log_collector import LogCollector
 from .logger import custom_logger
-from .utils import set_fd_nonblocking
+from .memory_profiling import add_memory_profiling
+from .memory_profiling import display_memory_results
+from .replay import display_replay_results
+from .replay import read_capture
+from .replay import run_replay
+from .replay import write_replay_report
+from .result_cache import compute_cache_keys
+from .result_cache import load_result_cache
+from .result_cache import lookup_cached_results
+from .result_cache import update_result_cache
+from .suites import discover_suites
+from .suites import display_suites_results
+from .suites import run_suites
+from .thread_scaling import compute_scaling
+from .thread_scaling import display_scaling_results
+from .thread_scaling import run_serial
+from .thread_scaling import run_thread_level
+from .thread_scaling import server_threads_env
+from .thread_scaling import thread_levels
+from .thread_scaling import write_scaling_report
+from .utils import discard_logs
+from .watcher import discard_bytecode
+from .watcher import fingerprint_classes
+from .watcher import get_mtimes
+from .watcher import reload_module
+from .watcher import wait_for_changes
+from .test_classes.base_test import BaseFunctionTest
 from .test_classes.event_test import EventFunctionTest
 from .test_classes.http_test import HttpFunctionTest
 
@@ -19,44 +90,670 @@ from .test_classes.http_test import HttpFunctionTest
 LOCAL_URL_BASE = 'http://localhost'
 TEST_MODULE = "cf_tests"
 EVENT_FUNC_ENTRYPOINT = "cloud_functions_test_entrypoint"
+MEMORY_FUNC_ENTRYPOINT = "cloud_functions_test_memory_entrypoint"
+PROFILE_FUNC_ENTRYPOINT = "cloud_functions_test_profile_entrypoint"
+LIMITS_FUNC_ENTRYPOINT = "cloud_functions_test_limits_entrypoint"
+IN_PROCESS_ENGINE = "inprocess"
+# directory of the shims wrapping the entrypoint of the functions, kept between runs
+SHIM_DIR = os.path.join(tempfile.gettempdir(), "cloud_functions_test_shims")
 
 
-def main(cli_test_module: str, cli_source: str, cli_entrypoint: str, cli_env: str, cli_port: int) -> None:
+def main(
+    cli_test_module: str,
+    cli_source: str,
+    cli_entrypoint: str,
+    cli_env: str,
+    cli_port: int,
+    cli_startup_timeout: float = None,
+    cli_workers: int = None,
+    cli_servers: int = None,
+    cli_engine: str = None,
+    cli_baseline: str = None,
+    cli_baseline_tolerance: float = None,
+    cli_latency_samples: int = None,
+    cli_update_baseline: bool = False,
+    cli_watch: bool = False,
+    cli_no_cache: bool = False,
+    cli_report: str = None,
+    cli_profile_memory: bool = False,
+    cli_profile: bool = False,
+    cli_profile_dir: str = None,
+    cli_profile_top: int = None,
+    cli_timeout: float = None,
+    cli_suite_timeout: float = None,
+    cli_emulate_limits: bool = False,
+    cli_terraform_function: str = None
+) -> bool:
+    """
+    Run the tests of the module against the function and display their results
+    Return whether every test passed, latency regressions being failures, in the first run when watching
+    """
+    test_module, tests, test_type, settings = prepare_run(
+        cli_test_module,
+        source=cli_source,
+        entrypoint=cli_entrypoint,
+        env=cli_env,
+        port=cli_port,
+        startup_timeout=cli_startup_timeout,
+        workers=cli_workers,
+        servers=cli_servers,
+        engine=cli_engine,
+        baseline=cli_baseline,
+        baseline_tolerance=cli_baseline_tolerance,
+        latency_samples=cli_latency_samples,
+        update_baseline=cli_update_baseline,
+        watch=cli_watch,
+        no_cache=cli_no_cache,
+        cache_file=None,
+        cache_max_age=None,
+        cache_max_entries=None,
+        report=cli_report,
+        profile_memory=cli_profile_memory,
+        profile=cli_profile,
+        profile_dir=cli_profile_dir,
+        profile_top=cli_profile_top,
+        timeout=cli_timeout,
+        suite_timeout=cli_suite_timeout,
+        emulate_limits=cli_emulate_limits,
+        terraform_function=cli_terraform_function,
+    )
+    custom_logger.log_centered(f"Running {len(tests)} tests from the {test_module} module...")
+
+    prepare_latency_checks(tests, settings)
+
+    # with concurrent requests, functions-framework labels each log with the execution id of its request
+    server_env = {'LOG_EXECUTION_ID': 'true'} if settings.workers > 1 else {}
+    limits = load_limits(settings)
+    if limits is not None:
+        server_env.update(server_limits_env(limits["max_concurrency"]))
+    # with a pool of servers, they run on the first available ports from the one chosen
+    ports = find_available_ports(settings.port, settings.servers) if settings.servers > 1 else [settings.port]
+
+    # the tests whose result is cached are not run, nor is the function if all of them are
+    # all tests are run when profiling the function or emulating its limits as it is reported for each of them
+    tests_to_run, cached_successes = tests, []
+    if not settings.no_cache and not settings.profile_memory and not settings.profile and not settings.emulate_limits:
+        cache_keys = compute_cache_keys(tests, settings.source, settings.env, settings.entrypoint)
+        tests_to_run, cached_successes = lookup_cached_results(tests, load_result_cache(settings.cache_file), cache_keys)
+        if not tests_to_run and not settings.watch:
+            display_detailed_results([], cached_successes)
+            if settings.report:
+                write_results_report([], cached_successes, settings.report)
+            return True
+
+    function = SimpleNamespace(processes=[], servers=[], session=None, restart_server=None)
+    start_function(function, test_type, settings, ports, server_env)
+    try:
+        passed = run_and_display(function, tests_to_run, settings, cached_successes)
+        if settings.watch:
+            watch(function, test_module, tests, test_type, settings, ports, server_env)
+    finally:
+        stop_function(function)
+    return passed
+
+
+def bench(
+    cli_test_module: str,
+    cli_source: str,
+    cli_entrypoint: str,
+    cli_env: str,
+    cli_port: int,
+    cli_startup_timeout: float,
+    iterations: int,
+    warmup: int,
+    concurrency: int,
+    json_path: str = None,
+    cli_terraform_function: str = None
+) -> None:
+    """Invoke each test repeatedly on the local server with the concurrency provided and report its latency percentiles and throughput"""
+    test_module, tests, test_type, settings = prepare_run(
+        cli_test_module,
+        source=cli_source,
+        entrypoint=cli_entrypoint,
+        env=cli_env,
+        port=cli_port,
+        startup_timeout=cli_startup_timeout,
+        terraform_function=cli_terraform_function,
+    )
+    tests = first_cases(tests)
+    custom_logger.log_centered(
+        f"Benchmarking {len(tests)} tests from the {test_module} module "
+        f"({iterations} iterations, {warmup} warmup, concurrency {concurrency})..."
+    )
+
+    with function_source(test_type, settings.source, settings.entrypoint) as (source, entrypoint):
+        process = start_server(settings.port, entrypoint, source, settings.startup_timeout)
+
+    try:
+        # the logs are not displayed, they only need to be read for the server not to block on full pipes
+        discard_logs(process)
+        local_url = ":".join([LOCAL_URL_BASE, str(settings.port)])
+        with requests.Session() as session:
+            session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+            results = run_benchmark(local_url, tests, session, iterations, warmup, concurrency)
+        display_benchmark_results(results)
+        if json_path:
+            write_benchmark_report(results, json_path)
+    finally:
+        stop_function(SimpleNamespace(processes=[process], servers=[], session=None, restart_server=None))
+
+
+def replay(
+    cli_test_module: str,
+    cli_source: str,
+    cli_entrypoint: str,
+    cli_env: str,
+    cli_port: int,
+    cli_startup_timeout: float,
+    capture: str,
+    speed: float,
+    concurrency: int,
+    window: float,
+    json_path: str = None,
+    cli_terraform_function: str = None
+) -> None:
+    """
+    Stream the requests of a capture of production traffic into the local server, at their recorded rate
+    sped up by speed or as fast as possible, and report the latency and the errors over time
+    """
+    test_module, tests, test_type, settings = prepare_run(
+        cli_test_module,
+        source=cli_source,
+        entrypoint=cli_entrypoint,
+        env=cli_env,
+        port=cli_port,
+        startup_timeout=cli_startup_timeout,
+        terraform_function=cli_terraform_function,
+    )
+    if test_type == EventFunctionTest:
+        raise ValueError("Only the traffic of http-triggered functions can be replayed")
+    rate = f"{speed}x the recorded rate" if speed else "maximum rate"
+    custom_logger.log_centered(f"Replaying {capture} ({rate}, concurrency {concurrency})...")
+
+    process = start_server(settings.port, settings.entrypoint, settings.source, settings.startup_timeout)
+    try:
+        # the logs are not displayed, they only need to be read for the server not to block on full pipes
+        discard_logs(process)
+        local_url = ":".join([LOCAL_URL_BASE, str(settings.port)])
+        with requests.Session() as session:
+            session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+            results = run_replay(local_url, read_capture(capture), session, speed, concurrency, window)
+        display_replay_results(results)
+        if json_path:
+            write_replay_report(results, json_path)
+    finally:
+        stop_function(SimpleNamespace(processes=[process], servers=[], session=None, restart_server=None))
+
+
+def concurrency_scaling(
+    cli_test_module: str,
+    cli_source: str,
+    cli_entrypoint: str,
+    cli_env: str,
+    cli_port: int,
+    cli_startup_timeout: float,
+    max_threads: int,
+    server_workers: int,
+    iterations: int,
+    json_path: str = None,
+    cli_terraform_function: str = None
+) -> None:
+    """
+    Serve the function with 1, 2, 4... up to max_threads threads handling requests at the same time in each worker,
+    as an instance of a 2nd gen function does, and invoke each test concurrently against each of these servers
+    Report how the throughput scales with the threads and the results differing from a serial run of the tests
+    """
+    test_module, tests, test_type, settings = prepare_run(
+        cli_test_module,
+        source=cli_source,
+        entrypoint=cli_entrypoint,
+        env=cli_env,
+        port=cli_port,
+        startup_timeout=cli_startup_timeout,
+        terraform_function=cli_terraform_function,
+    )
+    tests = first_cases(tests)
+    custom_logger.log_centered(
+        f"Measuring the concurrency scaling of {len(tests)} tests from the {test_module} module "
+        f"(up to {max_threads} threads, {server_workers} workers, {iterations} iterations)..."
+    )
+
+    local_url = ":".join([LOCAL_URL_BASE, str(settings.port)])
+    results = []
+    serial_results = {}
+    with function_source(test_type, settings.source, settings.entrypoint) as (source, entrypoint):
+        with requests.Session() as session:
+            session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=max_threads))
+            for threads in thread_levels(max_threads):
+                process = start_server(
+                    settings.port, entrypoint, source, settings.startup_timeout, server_threads_env(threads, server_workers)
+                )
+                try:
+                    # the logs are not displayed, they only need to be read for the server not to block on full pipes
+                    discard_logs(process)
+                    if threads == 1:
+                        serial_results = run_serial(tests, local_url, session)
+                    results.append(run_thread_level(tests, local_url, session, threads, iterations, serial_results))
+                finally:
+                    # the connections kept alive with the server are closed along with it
+                    session.close()
+                    process.send_signal(signal.SIGINT)
+                    process.wait()
+                    wait_for_port_release(settings.port, settings.startup_timeout)
+    display_scaling_results(compute_scaling(results), serial_results)
+    if json_path:
+        write_scaling_report(results, json_path)
+
+
+def autoscale(
+    cli_test_module: str,
+    cli_source: str,
+    cli_entrypoint: str,
+    cli_env: str,
+    cli_port: int,
+    cli_startup_timeout: float,
+    arrival_profile: str,
+    rate: float,
+    peak_rate: float,
+    duration: float,
+    samples: int,
+    cold_start_time: float,
+    idle_timeout: float,
+    min_instances: int,
+    max_instances: int,
+    window: float,
+    seed: int,
+    json_path: str = None,
+    cli_terraform_function: str = None
+) -> None:
+    """
+    Measure the latency of the tests and the cold start of the function on the local server,
+    then simulate the arrival rate profile against a pool of instances scaled as defined in the Terraform file
+    Report the queueing delay, the cold starts and the instance-seconds of the simulation
+    """
+    test_module, tests, test_type, settings = prepare_run(
+        cli_test_module,
+        source=cli_source,
+        entrypoint=cli_entrypoint,
+        env=cli_env,
+        port=cli_port,
+        startup_timeout=cli_startup_timeout,
+        terraform_function=cli_terraform_function,
+    )
+    tests = first_cases(tests)
+    if not is_terraform_location(settings.env):
+        raise ValueError("The scaling of the function is read from its Terraform file, it must be provided as the env file")
+    scaling = load_terraform_scaling(settings.env, settings.terraform_function, settings.source)
+    scaling["min_instances"] = min_instances if min_instances is not None else scaling["min_instances"] or 0
+    scaling["max_instances"] = max_instances if max_instances is not None else scaling["max_instances"]
+    scaling["max_concurrency"] = scaling["max_concurrency"] or 1
+    custom_logger.log_centered(f"Measuring the latency of {len(tests)} tests from the {test_module} module ({samples} invocations each)...")
+
+    local_url = ":".join([LOCAL_URL_BASE, str(settings.port)])
+    with function_source(test_type, settings.source, settings.entrypoint) as (source, entrypoint):
+        if cold_start_time is None:
+            cold_start_time = statistics.median(
+                measure_cold_start(settings.port, entrypoint, source, settings.startup_timeout, tests[0], local_url)
+                for _ in range(COLD_START_MEASURES)
+            )
+        process = start_server(settings.port, entrypoint, source, settings.startup_timeout)
+    try:
+        # the logs are not displayed, they only need to be read for the server not to block on full pipes
+        discard_logs(process)
+        with requests.Session() as session:
+            latencies = [invoke_test(test, local_url, session)[0] for test in tests for _ in range(samples)]
+    finally:
+        stop_function(SimpleNamespace(processes=[process], servers=[], session=None, restart_server=None))
+    custom_logger.log_colored(
+        f"Latency: median {statistics.median(latencies) * 1000:.1f}ms over {len(latencies)} invocations, cold start {cold_start_time:.3f}s"
+    )
+
+    rng = random.Random(seed)
+    arrivals = generate_arrivals(arrival_profile, rate, peak_rate if peak_rate is not None else rate * PEAK_RATE_FACTOR, duration, rng)
+    results = simulate_autoscaling(
+        arrivals, latencies, cold_start_time, scaling["min_instances"], scaling["max_instances"], scaling["max_concurrency"],
+        idle_timeout, window, rng
+    )
+    display_autoscaling_results(results, scaling)
+    if json_path:
+        write_autoscaling_report(results, json_path)
+
 
+def cold_start(
+    cli_test_module: str,
+    cli_source: str,
+    cli_entrypoint: str,
+    cli_env: str,
+    cli_port: int,
+    cli_startup_timeout: float,
+    starts: int,
+    top: int,
+    budget: float = None,
+    cli_terraform_function: str = None
+) -> bool:
+    """
+    Measure the time from the spawn of a new server to its first response over several starts
+    and the import time of the modules loaded by the source
+    Return whether the median cold start is within the budget, if any
+    """
+    test_module, tests, test_type, settings = prepare_run(
+        cli_test_module,
+        source=cli_source,
+        entrypoint=cli_entrypoint,
+        env=cli_env,
+        port=cli_port,
+        startup_timeout=cli_startup_timeout,
+        terraform_function=cli_terraform_function,
+    )
+    tests = first_cases(tests)
+    custom_logger.log_centered(f"Measuring the cold start of the function with the first test of the {test_module} module...")
+
+    local_url = ":".join([LOCAL_URL_BASE, str(settings.port)])
+    with function_source(test_type, settings.source, settings.entrypoint) as (source, entrypoint):
+        cold_starts = [
+            measure_cold_start(settings.port, entrypoint, source, settings.startup_timeout, tests[0], local_url)
+            for _ in range(starts)
+        ]
+    load_time, imports = measure_import_times(settings.source)
+    return display_cold_start_results(cold_starts, load_time, imports, top, budget)
+
+
+def run_all(cli_test_module: str, cli_port: int, cli_servers: int, root: str, jobs: int, suite_args: List[str]) -> bool:
+    """
+    Run the tests of every function under root concurrently, a function being a directory containing the test module
+    Each function gets its own ports and its results are merged into one report
+    Return whether the tests of every function passed
+    """
+    package_settings = sys.modules[__package__]
+    test_module = cli_test_module or TEST_MODULE
+    servers = cli_servers or package_settings.servers
+    suites = discover_suites(root, test_module)
+    if not suites:
+        raise MissingTestClassError(f"No directory under {root} contains a {test_module} module")
+    # each function gets as many ports as it has servers
+    ports = find_available_ports(cli_port or package_settings.port, len(suites) * servers)
+    reports = run_suites(root, suites, ports[::servers], jobs, suite_args)
+    display_suites_results(reports)
+    return not any(report["failures"] or report["error"] is not None for report in reports)
+
+
+def prepare_latency_checks(tests: List[BaseFunctionTest], settings: SimpleNamespace) -> None:
+    """Set which tests have their latency measured to be recorded in the baseline or compared to it"""
+    if settings.update_baseline:
+        if not settings.baseline:
+            raise ValueError("A baseline file must be provided to record the latencies of the tests")
+        for test in tests:
+            test.measure_latency = True
+    elif settings.baseline:
+        apply_baseline(tests, load_baseline(settings.baseline), settings.baseline_tolerance)
+
+
+def load_limits(settings: SimpleNamespace) -> Optional[dict]:
+    """Return the limits of the function read from the Terraform env file to emulate them, None if they are not emulated"""
+    if not settings.emulate_limits:
+        return None
+    if not is_terraform_location(settings.env):
+        raise ValueError("The limits of the function are read from its Terraform file, it must be provided as the env file")
+    return load_terraform_limits(settings.env, settings.terraform_function, settings.source)
+
+
+def start_function(
+    function: SimpleNamespace,
+    test_type: Type[BaseFunctionTest],
+    settings: SimpleNamespace,
+    ports: List[int],
+    server_env: dict
+) -> None:
+    """
+    Start the local servers of the function, or load it in-process with the in-process engine
+    Set in function the processes of the servers, the (log_collector, local_url) of each server,
+    the session with which the tests call them and the function restarting a server from its index
+    """
+    profile_dir = settings.profile_dir if settings.profile else None
+    if profile_dir is not None:
+        os.makedirs(profile_dir, exist_ok=True)
+    # the limits are enforced on the servers only, in-process they would apply to the tests themselves
+    limits = load_limits(settings) if settings.engine != IN_PROCESS_ENGINE else None
+    labelled_logs = settings.workers > 1 and settings.engine != IN_PROCESS_ENGINE
+    with function_source(
+        test_type, settings.source, settings.entrypoint, settings.profile_memory, profile_dir, limits, labelled_logs
+    ) as (source, entrypoint):
+        if settings.engine == IN_PROCESS_ENGINE:
+            # the function is called through the WSGI test client of its app, there is no server to start
+            function.session = InProcessSession(source, entrypoint)
+            function.servers = [(None, LOCAL_URL_BASE)]
+            return
+        function.processes = start_servers(ports, entrypoint, source, settings.startup_timeout, server_env)
+    # the shim of the function outlives the context so that the servers can be restarted with it
+    function.restart_server = lambda index: restart_server(
+        function, index, ports[index], entrypoint, source, settings.startup_timeout, server_env
+    )
+    # the logs of each server are read continuously from the start so that it never blocks on full pipes
+    log_collectors = [LogCollector(process) for process in function.processes]
+    local_urls = [":".join([LOCAL_URL_BASE, str(port)]) for port in ports]
+    function.servers = list(zip(log_collectors, local_urls))
+    # a single session for the whole run so that the connections to the servers are kept alive between tests
+    function.session = requests.Session()
+    function.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=settings.workers))
+
+
+def stop_function(function: SimpleNamespace) -> None:
+    """Stop the local servers of the function and wait for them to release their ports"""
+    if function.session is not None:
+        function.session.close()
+    # SIGINT makes gunicorn shut down right away, with SIGTERM it may wait 30s for keep-alive connections
+    for process in function.processes:
+        process.send_signal(signal.SIGINT)
+    for process in function.processes:
+        process.wait()
+    function.processes, function.servers, function.session, function.restart_server = [], [], None, None
+
+
+def restart_server(
+    function: SimpleNamespace,
+    index: int,
+    port: int,
+    entrypoint: str,
+    source: str,
+    startup_timeout: float,
+    server_env: dict
+) -> LogCollector:
+    """
+    Replace the local server at index in function, stuck with an invocation that timed out, by a new one on the same port
+    Return the log collector of the new server
+    """
+    process = function.processes[index]
+    # gunicorn waits for the stuck worker before stopping, it is killed along with it instead
+    os.killpg(process.pid, signal.SIGKILL)
+    process.wait()
+    # the workers may still hold the port for a moment after the server is gone
+    wait_for_port_release(port, startup_timeout)
+    custom_logger.log_colored((f"Restarting the local server on port {port} after a timeout", "YELLOW"))
+    function.processes[index] = start_server(port, entrypoint, source, startup_timeout, server_env)
+    log_collector = LogCollector(function.processes[index])
+    function.servers[index] = (log_collector, function.servers[index][1])
+    return log_collector
+
+
+def run_and_display(
+    function: SimpleNamespace,
+    tests: List[BaseFunctionTest],
+    settings: SimpleNamespace,
+    cached_successes: List = None
+) -> bool:
+    """
+    Run the tests against the function, display their results along with the cached successes
+    Record the results in the cache and the latencies in the baseline if asked to
+    Return whether every test passed
+    """
+    # the keys are computed before the run so that a file modified meanwhile does not get the results
+    cache_keys = compute_cache_keys(tests, settings.source, settings.env, settings.entrypoint)
+    if settings.profile_memory:
+        memory_limit_mb = (
+            load_terraform_memory(settings.env, settings.terraform_function, settings.source)
+            if is_terraform_location(settings.env) else None
+        )
+        for test in tests:
+            test.memory_limit_mb = memory_limit_mb
+    # the tests without a timeout of their own get the one of the settings or of the Terraform file
+    default_timeout = settings.timeout
+    if default_timeout is None and is_terraform_location(settings.env):
+        default_timeout = load_terraform_timeout(settings.env, settings.terraform_function, settings.source)
+    for test in tests:
+        if test.timeout is None:
+            test.timeout = default_timeout
+    if tests:
+        failures, successes = run_tests(
+            function.servers,
+            tests,
+            function.session,
+            settings.workers,
+            settings.latency_samples,
+            settings.profile_dir if settings.profile else None,
+            settings.profile_top,
+            settings.suite_timeout,
+            function.restart_server,
+        )
+    else:
+        failures, successes = [], []
+    successes = (cached_successes or []) + successes
+    display_detailed_results(failures, successes)
+    if settings.profile_memory and tests:
+        display_memory_results(tests, memory_limit_mb)
+    limits = load_limits(settings)
+    if limits is not None and tests:
+        display_limits_results(tests, limits)
+    if settings.report:
+        write_results_report(failures, successes, settings.report)
+    if not settings.no_cache:
+        update_result_cache(settings.cache_file, tests, cache_keys, settings.cache_max_age, settings.cache_max_entries)
+    if settings.update_baseline:
+        write_baseline(tests, settings.baseline)
+        custom_logger.log_colored(f"Latencies of {len(tests)} tests recorded in {settings.baseline}")
+    return not failures
+
+
+def watch(
+    function: SimpleNamespace,
+    test_module: str,
+    tests: List[BaseFunctionTest],
+    test_type: Type[BaseFunctionTest],
+    settings: SimpleNamespace,
+    ports: List[int],
+    server_env: dict
+) -> None:
+    """
+    Re-run tests whenever the source of the function, the test module or the env file changes, until interrupted
+    The function is only restarted when its source or the env file changes, all tests are then re-run
+    When only the test module changes, only the test classes that were added or modified are re-run
+    An error in the files changed is displayed and the next change is waited for
+    """
+    module_path = sys.modules[test_module].__file__
+    env_paths = set(environment_files(settings.env))
+    paths = [settings.source, module_path, *sorted(env_paths)]
+    mtimes = get_mtimes(paths)
+    fingerprints = fingerprint_classes(import_user_classes(test_module))
+    custom_logger.log_centered("Watching for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            changed_paths, mtimes = wait_for_changes(paths, mtimes)
+            try:
+                restart = bool(changed_paths & {settings.source, *env_paths}) or not function.servers
+                previous_fingerprints = fingerprints
+                if module_path in changed_paths:
+                    reload_module(test_module)
+                    user_defined_classes = import_user_classes(test_module)
+                    new_tests, new_test_type = create_tests(user_defined_classes)
+                    fingerprints = fingerprint_classes(user_defined_classes)
+                    restart = restart or new_test_type != test_type
+                    tests, test_type = new_tests, new_test_type
+                if changed_paths & env_paths:
+                    setup_environment(
+                        settings.env, override=True, terraform_function=settings.terraform_function, source=settings.source
+                    )
+                if settings.source in changed_paths:
+                    discard_bytecode(settings.source)
+                if restart:
+                    tests_to_run = tests
+                else:
+                    tests_to_run = [test for test in tests if previous_fingerprints.get(test.name) != fingerprints[test.name]]
+                changed_files = ', '.join(sorted(os.path.relpath(path) for path in changed_paths))
+                custom_logger.log_centered(f"Running {len(tests_to_run)} tests after changes in {changed_files}...")
+                if restart:
+                    stop_function(function)
+                    start_function(function, test_type, settings, ports, server_env)
+                if tests_to_run:
+                    prepare_latency_checks(tests_to_run, settings)
+                    run_and_display(function, tests_to_run, settings)
+            except Exception as e:
+                custom_logger.log_colored((f"{type(e).__name__}: {e}", "RED"))
+            custom_logger.log_centered("Watching for changes, press Ctrl+C to stop")
+    except KeyboardInterrupt:
+        pass
+
+
+def prepare_run(cli_test_module: str, **cli_settings) -> Tuple[str, List[BaseFunctionTest], Type[BaseFunctionTest], SimpleNamespace]:
+    """
+    Import the user-defined classes, load the settings and the environment variables
+    Return the name of the test module, the tests created from the classes, their type and the settings
+    """
     test_module = cli_test_module or TEST_MODULE
 
     user_defined_classes = import_user_classes(test_module)
 
-    # other settings variables, variables are imported after importing user-defined classes
+    # other settings variables, variables are read after importing user-defined classes
     # so that their value can be modified in the test_module by the user
-    from . import source as settings_source
-    from . import entrypoint as settings_entrypoint
-    from . import port as settings_port
-    from . import env as settings_env
-    source = cli_source or settings_source
-    entrypoint = cli_entrypoint or settings_entrypoint
-    env = cli_env or settings_env
-    port = cli_port or settings_port
-    local_url = ":".join([LOCAL_URL_BASE, str(port)])
-
-    setup_environment(env)
+    # a value given on the cli overrides the setting even if it's 0, a flag not given is False and leaves it as is
+    package_settings = sys.modules[__package__]
+    settings = SimpleNamespace(**{
+        name: cli_value if cli_value is not None and cli_value is not False else getattr(package_settings, name)
+        for name, cli_value in cli_settings.items()
+    })
+
+    setup_environment(settings.env, terraform_function=settings.terraform_function, source=settings.source)
 
     # create BaseFunctionTest objects from the user-defined classes
     tests, test_type = create_tests(user_defined_classes)
-    custom_logger.log_centered(f"Running {len(tests)} tests from the {test_module} module...")
+    return test_module, tests, test_type, settings
 
-    # if it's for an event function, create temp file to turn the http request into an event/context pair
-    if test_type == EventFunctionTest:
-        with tempfile.NamedTemporaryFile(suffix='.py') as temp_file:
-            temp_source, temp_entrypoint = create_temp_file_event(temp_file, source, entrypoint, EVENT_FUNC_ENTRYPOINT)
-            process = start_server(port, temp_entrypoint, temp_source)
-    else:
-        process = start_server(port, entrypoint, source)
 
-    try:
-        set_fd_nonblocking(process.stderr.fileno())
-        set_fd_nonblocking(process.stdout.fileno())
-        failures, successes = run_tests(process, local_url, tests)
-        display_detailed_results(failures, successes)
-    finally:
-        process.terminate()
+@contextmanager
+def function_source(
+    test_type: Type[BaseFunctionTest],
+    source: str,
+    entrypoint: str,
+    profile_memory: bool = False,
+    profile_dir: str = None,
+    limits: dict = None,
+    labelled_logs: bool = False
+) -> Iterator[Tuple[str, str]]:
+    """
+    Yield the source and the entrypoint functions-framework should load
+    If it's for an event function, they are those of a shim importing the source and turning the http request
+    into an event/context pair
+    If the memory is profiled, the entrypoint of the shim is wrapped to report the memory used by each invocation
+    With a profile_dir, the entrypoint of the shim is wrapped to write the cpu profile of each invocation in it
+    With limits, the memory of the server is limited and the entrypoint of the shim is wrapped to report
+    the peak RSS during each invocation
+    With labelled_logs, the records of logging are formatted as they are when the logs are not labelled
+    The shims are kept in SHIM_DIR to be reused by the next runs
+    """
+    if test_type != EventFunctionTest and not profile_memory and profile_dir is None and limits is None and not labelled_logs:
+        yield source, entrypoint
+        return
+    os.makedirs(SHIM_DIR, exist_ok=True)
+    # written under a temporary name, then moved to the name of its content once complete
+    with tempfile.NamedTemporaryFile(dir=SHIM_DIR, suffix='.py', delete=False) as shim_file:
+        shim_path = shim_file.name
+    entrypoint = create_shim(shim_path, source, entrypoint)
+    if test_type == EventFunctionTest:
+        entrypoint = add_event_wrapper(shim_path, entrypoint, EVENT_FUNC_ENTRYPOINT)
+    if profile_dir is not None:
+        entrypoint = add_cpu_profiling(shim_path, entrypoint, PROFILE_FUNC_ENTRYPOINT, profile_dir)
+    if profile_memory:
+        entrypoint = add_memory_profiling(shim_path, entrypoint, MEMORY_FUNC_ENTRYPOINT)
+    if limits is not None:
+        entrypoint = add_limits_emulation(shim_path, entrypoint, LIMITS_FUNC_ENTRYPOINT, limits["memory_mb"])
+    if labelled_logs:
+        add_log_format(shim_path)
+    yield cache_shim(shim_path, source), entrypoint
@@ -1,19 +1,39 @@
 import re
 from typing import Any
+from typing import Callable
 from typing import List
+from typing import Optional
 from typing import Tuple
 from typing import Type
 from typing import Union
-from typing import _SpecialForm
+
+from .json_stream import JsonStream
+from .json_stream import describe_json_value
+from .json_stream import format_json_path
+
+
+Matcher = Callable[[Any], bool]
+# (path, expected object at the path, what was received) of the first mismatch of a streamed json value
+Mismatch = Tuple[str, Any, Any]
+StreamMatcher = Callable[[JsonStream, str], Optional[Mismatch]]
 
 
 def partial_matching(expected: Any, actual: Any) -> bool:
     """
     Return whether the actual object matches the expected object
-    The function is recursive to be able to treat lists and dicts
     Supports the use of regex patterns
     Supports the use of Ellipsis in the expected object for partial matching
     Supports the use of types (either native or typing) in the expected object
+    To check several objects against the same expected object, compile it once with compile_matcher
+    """
+    return compile_matcher(expected)(actual)
+
+
+def compile_matcher(expected: Any) -> Matcher:
+    """
+    Turn the expected object into a function returning whether an actual object matches it
+    The expected object is walked once, the function returned only does the checks needed for each node
+    The function is recursive to be able to treat lists and dicts
     """
 
     # modify instance tuples as expected into lists because tuple is not json serializable
@@ -21,73 +41,205 @@ def partial_matching(expected: Any, actual: Any) -> bool:
         expected = list(expected)
 
     # typing.Any
-    if isinstance(expected, _SpecialForm) and expected._name == "Any":
-        return True
+    if expected is Any:
+        return lambda actual: True
 
     # typing.Union
     if hasattr(expected, '__origin__') and expected.__origin__ is Union:
-        return any(partial_matching(t, actual) for t in expected.__args__)
+        matchers = [compile_matcher(t) for t in expected.__args__]
+        return lambda actual: any(matcher(actual) for matcher in matchers)
 
     # typing.List
     if hasattr(expected, '__origin__') and expected.__origin__ is list:
-        if not isinstance(actual, list):
-            return False
-        element_type = expected.__args__[0]
-        return all(partial_matching(element_type, a) for a in actual)
+        element_matcher = compile_matcher(expected.__args__[0])
+        return lambda actual: isinstance(actual, list) and all(map(element_matcher, actual))
 
     # typing.Tuple
     if hasattr(expected, '__origin__') and expected.__origin__ is tuple:
         # tuple is not json-serializable so it's transformed into a list
-        if not isinstance(actual, list):
-            return False
-        element_types = expected.__args__
-        if len(element_types) != len(actual):
-            return False
-        return all(
-            partial_matching(element_type, a)
-            for a, element_type in zip(actual, element_types)
+        element_matchers = [compile_matcher(t) for t in expected.__args__]
+        return lambda actual: (
+            isinstance(actual, list)
+            and len(actual) == len(element_matchers)
+            and all(matcher(a) for a, matcher in zip(actual, element_matchers))
         )
 
     # typing.Dict
     if hasattr(expected, '__origin__') and expected.__origin__ is dict:
-        if not isinstance(actual, dict):
-            return False
-        key_type, value_type = expected.__args__
-        return all(
-            partial_matching(key_type, k) and partial_matching(value_type, v)
-            for k, v in actual.items()
+        key_matcher, value_matcher = [compile_matcher(t) for t in expected.__args__]
+        return lambda actual: (
+            isinstance(actual, dict)
+            and all(key_matcher(k) and value_matcher(v) for k, v in actual.items())
         )
 
     # instance regex
-    if isinstance(expected, re.Pattern) and isinstance(actual, str):
-        return bool(expected.match(actual))
+    if isinstance(expected, re.Pattern):
+        return lambda actual: isinstance(actual, str) and bool(expected.match(actual))
 
     # instance list
     if isinstance(expected, list):
+        return compile_list_matcher(expected)
+
+    # instance dict
+    if isinstance(expected, dict):
+        return compile_dict_matcher(expected)
+
+    # other basic types
+    if isinstance(expected, type):
+        return lambda actual: isinstance(actual, expected) or expected == actual
+
+    # all remaining cases
+    return lambda actual: expected == actual
+
+
+def compile_list_matcher(expected: list) -> Matcher:
+    """Compile an expected list, with an Ellipsis only the first elements of the actual list are checked"""
+    partial = Ellipsis in expected
+    element_matchers = [compile_matcher(item) for item in expected if item != Ellipsis]
+    length = len(element_matchers)
+
+    def match(actual: Any) -> bool:
         if not isinstance(actual, list):
             return False
-        if Ellipsis in expected:
-            expected = [item for item in expected if item != Ellipsis]
-            actual = actual[:len(expected)]
-        if len(expected) != len(actual):
+        if partial:
+            actual = actual[:length]
+        if len(actual) != length:
             return False
-        return all(partial_matching(e, a) for e, a in zip(expected, actual))
+        return all(matcher(a) for a, matcher in zip(actual, element_matchers))
 
-    # instance dict
-    if isinstance(expected, dict):
+    return match
+
+
+def compile_dict_matcher(expected: dict) -> Matcher:
+    """Compile an expected dict, with an Ellipsis key only the keys of the expected dict are checked"""
+    partial = Ellipsis in expected
+    keys = expected.keys() - {Ellipsis}
+    value_matchers = [
+        (key, compile_matcher(value))
+        for key, value in expected.items()
+        if key is not Ellipsis and value is not Ellipsis
+    ]
+
+    def match(actual: Any) -> bool:
         if not isinstance(actual, dict):
             return False
-        if not Ellipsis in expected and not expected.keys() == actual.keys():
+        if partial:
+            if not keys <= actual.keys():
+                return False
+        elif keys != actual.keys():
             return False
-        else:
-            return all(partial_matching(expected[key], actual[key]) for key in expected if not expected[key] == Ellipsis)
+        return all(matcher(actual[key]) for key, matcher in value_matchers)
 
-    # other basic types
-    try:
-        if isinstance(actual, expected):
-            return True
-    except TypeError:
-        pass
+    return match
 
-    # all remaining cases
-    return expected == actual
+
+
+def compile_stream_matcher(expected: Any) -> StreamMatcher:
+    """
+    Turn the expected object into a function checking the next json value of a stream
+    The function is given the stream and the path of the value, it returns None if the value matches
+    Otherwise it stops reading at the first mismatch and returns its path, the expected object at this path
+    and what was received. The containers of the expected object are walked through element by element,
+    only the values checked by a leaf of the expected object are decoded whole
+    """
+    if isinstance(expected, tuple):
+        expected = list(expected)
+
+    # typing.Any
+    if expected is Any:
+        def match_any(stream: JsonStream, path: str) -> Optional[Mismatch]:
+            stream.skip_value()
+            return None
+
+        return match_any
+
+    # typing.List, the elements are decoded and checked one at a time
+    if hasattr(expected, '__origin__') and expected.__origin__ is list:
+        element_matcher = compile_stream_matcher(expected.__args__[0])
+
+        def match_elements(stream: JsonStream, path: str) -> Optional[Mismatch]:
+            event = stream.read_event()
+            if event[0] != "start_array":
+                return (path, expected, describe_json_value(event))
+            index = 0
+            while not stream.end_of_container():
+                mismatch = element_matcher(stream, format_json_path(path, index))
+                if mismatch is not None:
+                    return mismatch
+                index += 1
+            return None
+
+        return match_elements
+
+    if isinstance(expected, list):
+        return compile_list_stream_matcher(expected)
+
+    if isinstance(expected, dict):
+        return compile_dict_stream_matcher(expected)
+
+    # all remaining cases are checked on the decoded value
+    matcher = compile_matcher(expected)
+
+    def match_value(stream: JsonStream, path: str) -> Optional[Mismatch]:
+        actual = stream.read_value()
+        return None if matcher(actual) else (path, expected, actual)
+
+    return match_value
+
+
+def compile_list_stream_matcher(expected: list) -> StreamMatcher:
+    """Compile an expected list for a stream, with an Ellipsis the elements after the expected ones are skipped"""
+    partial = Ellipsis in expected
+    element_matchers = [compile_stream_matcher(item) for item in expected if item != Ellipsis]
+    length = len(element_matchers)
+
+    def match(stream: JsonStream, path: str) -> Optional[Mismatch]:
+        event = stream.read_event()
+        if event[0] != "start_array":
+            return (path, expected, describe_json_value(event))
+        for index, element_matcher in enumerate(element_matchers):
+            if stream.end_of_container():
+                return (path, expected, f"an array of {index} elements")
+            mismatch = element_matcher(stream, format_json_path(path, index))
+            if mismatch is not None:
+                return mismatch
+        while not stream.end_of_container():
+            if not partial:
+                return (path, expected, f"an array of more than {length} elements")
+            stream.skip_value()
+        return None
+
+    return match
+
+
+def compile_dict_stream_matcher(expected: dict) -> StreamMatcher:
+    """Compile an expected dict for a stream, with an Ellipsis key the other keys are skipped"""
+    partial = Ellipsis in expected
+    keys = expected.keys() - {Ellipsis}
+    value_matchers = {
+        key: compile_stream_matcher(value)
+        for key, value in expected.items()
+        if key is not Ellipsis and value is not Ellipsis
+    }
+
+    def match(stream: JsonStream, path: str) -> Optional[Mismatch]:
+        event = stream.read_event()
+        if event[0] != "start_map":
+            return (path, expected, describe_json_value(event))
+        missing_keys = set(keys)
+        while not stream.end_of_container():
+            _, key = stream.read_event()
+            if key in value_matchers:
+                mismatch = value_matchers[key](stream, format_json_path(path, key))
+                if mismatch is not None:
+                    return mismatch
+            elif key in keys or partial:
+                stream.skip_value()
+            else:
+                return (path, expected, f"an object with the unexpected key {key!r}")
+            missing_keys.discard(key)
+        if missing_keys:
+            return (path, expected, f"an object without the key {sorted(missing_keys, key=repr)[0]!r}")
+        return None
+
+    return match
@@ -0,0 +1,108 @@
+from typing import List, Optional
+
+from .logger import custom_logger
+
+
+# header of the responses in which the profiling wrapper reports the memory usage of the invocation
+MEMORY_HEADER = "X-Cloud-Functions-Test-Memory"
+# functions of the shims resetting and reading the peak RSS of the process, in bytes
+# outside of Linux, the peak cannot be reset and is the one since the start of the process
+PEAK_RSS_FUNCTIONS = (
+    "def _cloud_functions_test_reset_peak_rss():\n"
+    "    try:\n"
+    "        with open('/proc/self/clear_refs', 'w') as clear_refs:\n"
+    "            clear_refs.write('5')\n"
+    "    except OSError:\n"
+    "        pass\n"
+    "\n\n"
+    "def _cloud_functions_test_peak_rss():\n"
+    "    import resource\n"
+    "    import sys\n"
+    "    try:\n"
+    "        with open('/proc/self/status') as status:\n"
+    "            for line in status:\n"
+    "                if line.startswith('VmHWM:'):\n"
+    "                    return int(line.split()[1]) * 1024\n"
+    "    except OSError:\n"
+    "        pass\n"
+    "    # ru_maxrss is in bytes on macOS and in KB on the other platforms\n"
+    "    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024\n"
+)
+
+
+def add_memory_profiling(shim_path: str, entrypoint: str, memory_func_entrypoint: str) -> str:
+    """
+    Add to the shim of the function a memory_func_entrypoint function calling the entrypoint
+    It records the peak of the memory traced by tracemalloc and the RSS of the process during the invocation
+    and reports them in a header of the response, in bytes: peak traced, RSS delta, RSS after the invocation, peak RSS
+    Return the memory_func_entrypoint
+    """
+    with open(shim_path, 'a') as shim_file:
+        shim_file.write(
+            "\n\n"
+            f"{PEAK_RSS_FUNCTIONS}"
+            "\n\n"
+            "def _cloud_functions_test_rss():\n"
+            "    import os\n"
+            "    try:\n"
+            "        with open('/proc/self/statm') as statm:\n"
+            "            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')\n"
+            "    except OSError:\n"
+            "        # the current RSS is only known on Linux, the peak RSS stands for it elsewhere\n"
+            "        return _cloud_functions_test_peak_rss()\n"
+            "\n\n"
+            f"def {memory_func_entrypoint}(request):\n"
+            "    import tracemalloc\n"
+            "    import flask\n"
+            "    usage = []\n"
+            "\n"
+            "    @flask.after_this_request\n"
+            "    def add_memory_header(response):\n"
+            f"        response.headers['{MEMORY_HEADER}'] = ','.join(str(value) for value in usage)\n"
+            "        return response\n"
+            "\n"
+            "    if not tracemalloc.is_tracing():\n"
+            "        tracemalloc.start()\n"
+            "    tracemalloc.reset_peak()\n"
+            "    start_traced, _ = tracemalloc.get_traced_memory()\n"
+            "    start_rss = _cloud_functions_test_rss()\n"
+            "    _cloud_functions_test_reset_peak_rss()\n"
+            "    try:\n"
+            f"        return {entrypoint}(request)\n"
+            "    finally:\n"
+            "        _, peak_traced = tracemalloc.get_traced_memory()\n"
+            "        rss = _cloud_functions_test_rss()\n"
+            "        usage.extend([peak_traced - start_traced, rss - start_rss, rss, _cloud_functions_test_peak_rss()])\n"
+        )
+    return memory_func_entrypoint
+
+
+def parse_memory_header(value: Optional[str]) -> Optional[dict]:
+    """Return the memory usage reported in the header as a dict of bytes, None if it's missing"""
+    if not value:
+        return None
+    try:
+        peak_traced, rss_delta, rss, peak_rss = [int(item) for item in value.split(',')]
+    except ValueError:
+        return None
+    return {"peak_traced": peak_traced, "rss_delta": rss_delta, "rss": rss, "peak_rss": peak_rss}
+
+
+def display_memory_results(tests: List, memory_limit_mb: Optional[int]) -> None:
+    """Log the memory usage of each test as a table in MB, the tests whose peak RSS exceeds the limit are in red"""
+    name_width = max([len("test")] + [len(test.name) for test in tests])
+    limit = f"limit {memory_limit_mb} MB" if memory_limit_mb is not None else "no limit found"
+    custom_logger.log_centered(f"MEMORY (in MB, {limit})")
+    custom_logger.log_colored((
+        f"{'test':<{name_width}}  {'peak traced':>11}  {'RSS delta':>11}  {'RSS':>11}  {'peak RSS':>11}", "CYAN"
+    ))
+    for test in tests:
+        if test.memory_usage is None:
+            custom_logger.log_colored(f"{test.name:<{name_width}}" + f"  {'-':>11}" * 4)
+            continue
+        line = f"{test.name:<{name_width}}" + "".join(
+            f"  {test.memory_usage[key] / 2 ** 20:>11.2f}" for key in ("peak_traced", "rss_delta", "rss", "peak_rss")
+        )
+        exceeded = memory_limit_mb is not None and test.memory_usage["peak_rss"] > memory_limit_mb * 2 ** 20
+        custom_logger.log_colored((line, "RED" if exceeded else "DEFAULT"))
@@ -0,0 +1,166 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple, Union
+
+from requests import RequestException
+from requests import Session
+
+from .bench import percentile
+from .exceptions import InvalidAttributeTypeError
+from .exceptions import InvalidCasesFileError
+from .logger import custom_logger
+from .test_classes.http_test import HttpFunctionTest
+from .utils import read_jsonl
+
+
+def parse_timestamp(value: Union[int, float, str]) -> float:
+    """Return the timestamp of a recorded request in seconds, given as seconds since the epoch or as an ISO 8601 string"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    # fromisoformat does not read the Z suffix before python 3.11
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def read_capture(location: str) -> Iterator[Tuple[float, dict]]:
+    """
+    Yield the (timestamp, case) of each request of the capture one at a time
+    Each line of the capture is a json object with the timestamp, headers and body of a request
+    """
+    for index, request in enumerate(read_jsonl(location)):
+        try:
+            timestamp = parse_timestamp(request["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidCasesFileError(f"Request {index} of the capture {location} does not have a valid timestamp")
+        yield timestamp, {"headers": request.get("headers"), "data": request.get("body")}
+
+
+def run_replay(
+    local_url: str,
+    capture: Iterator[Tuple[float, dict]],
+    session: Session,
+    speed: float,
+    concurrency: int,
+    window: float
+) -> List[dict]:
+    """
+    Send the requests of the capture to the local server with up to concurrency requests at the same time
+    With a speed, each request is sent at its recorded time from the first one divided by the speed,
+    or as soon as a request slot is free if they are all busy. Without speed, they are sent as fast as possible
+    Return the statistics of the requests sent in each window of seconds since the start of the replay
+    """
+    template = HttpFunctionTest(type("Replay", (), {}))
+    slots = threading.BoundedSemaphore(concurrency)
+    lock = threading.Lock()
+    windows: Dict[int, dict] = {}
+
+    def window_statistics(sent_at: float) -> dict:
+        return windows.setdefault(int(sent_at // window), {"requests": 0, "latencies": [], "errors": {}, "lag": 0.0})
+
+    def record(sent_at: float, latency: float, error: str) -> None:
+        with lock:
+            statistics = window_statistics(sent_at)
+            statistics["requests"] += 1
+            if latency is not None:
+                statistics["latencies"].append(latency)
+            if error is not None:
+                statistics["errors"][error] = statistics["errors"].get(error, 0) + 1
+
+    def send(index: int, case: dict, sent_at: float) -> None:
+        try:
+            latency, error = replay_request(template, index, case, local_url, session)
+            record(sent_at, latency, error)
+        finally:
+            slots.release()
+
+    start_time = time.perf_counter()
+    first_timestamp = None
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for index, (timestamp, case) in enumerate(capture):
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            if speed:
+                delay = start_time + (timestamp - first_timestamp) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            # the capture is only read as fast as the requests can be sent so that it is never loaded in memory
+            slots.acquire()
+            sent_at = time.perf_counter() - start_time
+            if speed:
+                # how late the request is sent compared to its recorded time because no request slot was free
+                with lock:
+                    statistics = window_statistics(sent_at)
+                    statistics["lag"] = max(statistics["lag"], sent_at - (timestamp - first_timestamp) / speed)
+            executor.submit(send, index, case, sent_at)
+    return [
+        compute_window_statistics(key * window, window, windows[key])
+        for key in sorted(windows)
+        if windows[key]["requests"]
+    ]
+
+
+def replay_request(template: HttpFunctionTest, index: int, case: dict, local_url: str, session: Session) -> Tuple[float, str]:
+    """
+    Make a recorded request with the request-building logic of the http tests
+    Return its latency, None if it could not be made, and its error, None if the function responded without crashing
+    """
+    start_time = time.perf_counter()
+    try:
+        invocation = template.with_case(index, case)
+        invocation.make_post_request(local_url, session)
+    except InvalidAttributeTypeError:
+        return None, "invalid request"
+    except RequestException as error:
+        return time.perf_counter() - start_time, type(error).__name__
+    latency = time.perf_counter() - start_time
+    if invocation.response.status_code >= 500:
+        return latency, f"status {invocation.response.status_code}"
+    return latency, None
+
+
+def compute_window_statistics(start: float, window: float, statistics: dict) -> dict:
+    """Given the latencies, the errors and the lag of the requests sent in a window, return its statistics"""
+    # the requests that could not be made have no latency
+    latencies = sorted(statistics["latencies"]) or [0.0]
+    return {
+        "start": start,
+        "requests": statistics["requests"],
+        "requests_per_second": statistics["requests"] / window,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "max": latencies[-1],
+        "errors": statistics["errors"],
+        "lag": statistics["lag"],
+    }
+
+
+def display_replay_results(results: List[dict]) -> None:
+    """Log the statistics of each window as a table, latencies are in milliseconds, then the errors of the replay"""
+    custom_logger.log_centered("REPLAY (latencies in ms)")
+    custom_logger.log_colored((
+        f"{'time (s)':>8}  {'requests':>8}  {'req/s':>8}  {'p50':>9}  {'p95':>9}  {'max':>9}  {'errors':>6}  {'lag (s)':>7}",
+        "CYAN"
+    ))
+    errors = {}
+    for result in results:
+        window_errors = sum(result["errors"].values())
+        for error, count in result["errors"].items():
+            errors[error] = errors.get(error, 0) + count
+        line = (
+            f"{result['start']:>8.1f}  {result['requests']:>8}  {result['requests_per_second']:>8.1f}  "
+            + "  ".join(f"{result[column] * 1000:>9.3f}" for column in ("p50", "p95", "max"))
+            + f"  {window_errors:>6}  {result['lag']:>7.3f}"
+        )
+        custom_logger.log_colored((line, "RED" if window_errors else "DEFAULT"))
+    total = sum(result["requests"] for result in results)
+    custom_logger.log_colored(f"*** {total} requests replayed, {sum(errors.values())} errors ***")
+    for error, count in sorted(errors.items(), key=lambda item: item[1], reverse=True):
+        custom_logger.log_colored((f"{count:>8}  {error}", "RED"))
+
+
+def write_replay_report(results: List[dict], path: str) -> None:
+    """Write the statistics of each window as json in the file provided, latencies are in seconds"""
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
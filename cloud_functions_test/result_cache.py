@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .environment import environment_files
+from .logger import custom_logger
+from .suites import IGNORED_DIRECTORIES
+from .test_classes.base_test import BaseFunctionTest
+
+# directory of the default cache files of the results, one per working directory, next to the Terraform indexes
+RESULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "cloud_functions_test_results")
+
+
+def hash_files(paths: List[str]) -> str:
+    """Return a hash of the content of the files, the files that do not exist are hashed as empty"""
+    files_hash = hashlib.sha256()
+    for path in paths:
+        files_hash.update(path.encode('utf-8') + b'\0')
+        if os.path.isfile(path):
+            with open(path, 'rb') as file:
+                files_hash.update(hashlib.sha256(file.read()).digest())
+    return files_hash.hexdigest()
+
+
+def find_source_modules(source: str) -> List[str]:
+    """
+    Return the paths of the python files under the directory of the source, which it may import,
+    the hidden directories and those of IGNORED_DIRECTORIES are skipped
+    """
+    paths = []
+    for directory, subdirectories, files in os.walk(os.path.dirname(os.path.abspath(source))):
+        subdirectories[:] = sorted(
+            subdirectory for subdirectory in subdirectories
+            if not subdirectory.startswith('.') and subdirectory not in IGNORED_DIRECTORIES
+        )
+        paths.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith('.py'))
+    return paths
+
+
+def compute_cache_keys(tests: List[BaseFunctionTest], source: str, env: str, entrypoint: str) -> Dict[str, str]:
+    """
+    Return a dict test name: key identifying the result of the test
+    The key changes whenever the source or another python file of its directory, the env file, the entrypoint,
+    an attribute of the test or the content of the JSONL file of its cases changes
+    """
+    files_hash = hash_files([source, *find_source_modules(source), *environment_files(env)])
+    keys = {}
+    for test in tests:
+        attributes = {attr: repr(getattr(test, attr)) for attr in test.attributes}
+        cases_hash = hash_files([test.cases]) if isinstance(test.cases, str) else None
+        content = json.dumps([files_hash, entrypoint, type(test).__name__, test.name, attributes, cases_hash], sort_keys=True)
+        keys[test.name] = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    return keys
+
+
+def result_cache_path(location: Optional[str]) -> str:
+    """
+    Return the path of the cache file provided or, without one, of the file in RESULT_CACHE_DIR
+    named after a hash of the absolute path of the working directory
+    """
+    if location is not None:
+        return location
+    path_hash = hashlib.sha256(os.path.abspath(os.getcwd()).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(RESULT_CACHE_DIR, f"{path_hash}.json")
+
+
+def load_result_cache(location: Optional[str]) -> dict:
+    """Return the results cached in the file provided or the default one, an unreadable file is treated as an empty cache"""
+    try:
+        with open(result_cache_path(location), 'r') as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def lookup_cached_results(tests: List[BaseFunctionTest], cache: dict, keys: Dict[str, str]) -> Tuple[List[BaseFunctionTest], List]:
+    """
+    Log the tests whose result is cached as passed
+    Return the tests that still need to run and the detailled logs of the cached successes
+    """
+    tests_to_run = []
+    cached_successes = []
+    for test in tests:
+        entry = cache.get(keys[test.name])
+        # the latency of a test depends on the machine and must be measured at each run
+        if entry is None or test.measure_latency:
+            tests_to_run.append(test)
+            continue
+        custom_logger.log_colored([(f"test {test.name}: ", "DEFAULT"), ("PASSED", "GREEN"), (" (cached)", "DEFAULT")])
+        # json turns the (message, color) tuples into lists
+        cached_successes.append([tuple(item) if isinstance(item, list) else item for item in entry["message"]])
+    return tests_to_run, cached_successes
+
+
+def update_result_cache(
+    location: Optional[str],
+    tests: List[BaseFunctionTest],
+    keys: Dict[str, str],
+    max_age: float,
+    max_entries: int
+) -> None:
+    """
+    Add the results of the tests that passed to the cache file provided or the default one, keeping those already in it
+    The results recorded more than max_age days ago are evicted, then the oldest ones beyond max_entries
+    """
+    cache = load_result_cache(location)
+    now = time.time()
+    for test in tests:
+        if test.result is not None and test.result[0] == "passed" and not test.measure_latency:
+            cache[keys[test.name]] = {"test": test.name, "time": now, "message": test.result[1]}
+    entries = sorted(
+        ((key, entry) for key, entry in cache.items() if now - entry.get("time", 0) <= max_age * 86400),
+        key=lambda item: item[1].get("time", 0),
+        reverse=True
+    )
+    location = result_cache_path(location)
+    os.makedirs(os.path.dirname(os.path.abspath(location)), exist_ok=True)
+    # written under a temporary name, then moved in place so that concurrent runs never read a partial cache
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(location)), suffix='.json', delete=False) as file:
+        json.dump(dict(entries[:max_entries]), file, indent=2)
+    os.replace(file.name, location)
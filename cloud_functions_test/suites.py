@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from .functions import display_detailed_results
+from .logger import custom_logger
+
+
+# directories that never contain the test module of a function
+IGNORED_DIRECTORIES = {'__pycache__', 'node_modules', 'venv', 'site-packages'}
+
+
+def discover_suites(root: str, test_module: str) -> List[str]:
+    """Return the directories under root that contain the test module, each of them being the directory of a function"""
+    suites = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(
+            subdirectory for subdirectory in subdirectories
+            if not subdirectory.startswith('.') and subdirectory not in IGNORED_DIRECTORIES
+        )
+        if f"{test_module}.py" in files:
+            suites.append(os.path.relpath(directory, root))
+    return suites
+
+
+def run_suites(root: str, suites: List[str], ports: List[int], jobs: int, suite_args: List[str]) -> List[dict]:
+    """
+    Run the tests of the suites concurrently, up to jobs at the same time, each in its own process
+    Each suite runs in its directory with the cli arguments provided, its local servers use the ports from ports[i]
+    Return the report of each suite in the order of the suites
+    """
+    custom_logger.log_centered(f"Running the tests of {len(suites)} functions...")
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(
+            lambda suite, port: run_suite(root, suite, port, suite_args),
+            suites,
+            ports
+        ))
+
+
+def run_suite(root: str, suite: str, port: int, suite_args: List[str]) -> dict:
+    """
+    Run the tests of a suite with the cli in a new process so that its settings, its environment variables
+    and its test module do not interfere with those of the other suites
+    Return a dict with the suite, its duration, its failures and successes, and its output if it could not run
+    """
+    start_time = time.perf_counter()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report_path = os.path.join(temp_dir, 'report.json')
+        completed_process = subprocess.run(
+            [sys.executable, '-m', 'cloud_functions_test.cli', *suite_args, '--port', str(port), '--report', report_path],
+            cwd=os.path.join(root, suite),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        try:
+            with open(report_path, 'r') as file:
+                results = json.load(file)
+            error = None
+        except (OSError, ValueError):
+            results = {"failures": [], "successes": []}
+            error = completed_process.stdout.decode('utf-8', errors='replace').strip()
+    report = {
+        "suite": suite,
+        "duration": time.perf_counter() - start_time,
+        # json turns the (message, color) tuples into lists
+        "failures": [[tuple(item) if isinstance(item, list) else item for item in result] for result in results["failures"]],
+        "successes": [[tuple(item) if isinstance(item, list) else item for item in result] for result in results["successes"]],
+        "error": error,
+    }
+    status = ("FAILED", "RED") if report["failures"] or error else ("PASSED", "GREEN")
+    custom_logger.log_colored([(f"suite {suite} in {round(report['duration'], 3)}s: ", "DEFAULT"), status])
+    return report
+
+
+def display_suites_results(reports: List[dict]) -> None:
+    """Merge the results of the suites into one report, each result being preceded by the suite it comes from"""
+    failures = []
+    successes = []
+    for report in reports:
+        if report["error"] is not None:
+            failures.append([(f"[{report['suite']}]", "CYAN"), "Could not run the tests", report["error"]])
+        failures.extend([(f"[{report['suite']}]", "CYAN"), *result] for result in report["failures"])
+        # the successes without detailled logs are only counted
+        successes.extend([(f"[{report['suite']}]", "CYAN"), *result] if result else [] for result in report["successes"])
+    failed_suites = sum(1 for report in reports if report["failures"] or report["error"] is not None)
+    custom_logger.log_colored(f"*** {len(reports) - failed_suites} functions passed and {failed_suites} failed ***")
+    display_detailed_results(failures, successes)
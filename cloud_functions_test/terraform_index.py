@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from .exceptions import InvalidTerraformFileError
+from .hcl import Block
+from .hcl import Expression
+from .hcl import format_value
+from .hcl import parse_hcl
+
+
+# references replaced by a value when the Terraform files are read, the other references are kept as written
+TERRAFORM_VARIABLES = {"var.env": "dev"}
+# resources of Cloud Functions, the modules defining one of FUNCTION_ATTRIBUTES are considered functions as well
+FUNCTION_RESOURCES = ("google_cloudfunctions_function", "google_cloudfunctions2_function")
+FUNCTION_ATTRIBUTES = (
+    "environment_variables", "entry_point", "runtime", "source_dir",
+    "available_memory_mb", "memory_mb", "available_memory", "timeout", "timeout_seconds",
+    "min_instances", "max_instances", "max_instance_request_concurrency",
+)
+# bytes of the units of the memory of 2nd gen functions
+MEMORY_UNITS = {"k": 10 ** 3, "M": 10 ** 6, "G": 10 ** 9, "Mi": 2 ** 20, "Gi": 2 ** 30}
+# directory of the files in which the functions found in the Terraform files of each directory are kept
+# along with the mtime of each file, out of the directory so as not to leave a file in the infrastructure repository
+INDEX_DIR = os.path.join(tempfile.gettempdir(), "cloud_functions_test_terraform_indexes")
+INDEX_VERSION = 1
+
+# functions of each Terraform file already read by this process, with the mtime and size of the file then
+_read_files: Dict[str, tuple] = {}
+
+
+def collect_attributes(block: Block) -> Dict[str, Any]:
+    """Return the attributes of the block and of the blocks nested in it, those of the block itself first"""
+    attributes = dict(block.attributes)
+    for nested in block.blocks:
+        for name, value in collect_attributes(nested).items():
+            attributes.setdefault(name, value)
+    return attributes
+
+
+def find_function_blocks(root: Block) -> List[Block]:
+    """Return the resources of Cloud Functions and the modules looking like functions, in the order of the file"""
+    return [
+        block for block in root.blocks
+        if (block.type == "resource" and block.labels[:1] and block.labels[0] in FUNCTION_RESOURCES)
+        or (block.type == "module" and any(name in block.attributes for name in FUNCTION_ATTRIBUTES))
+    ]
+
+
+def to_number(value: Any) -> Optional[float]:
+    """Return the value as a number if it is one or a string of one, None otherwise"""
+    if isinstance(value, bool) or isinstance(value, Expression):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_memory_mb(attributes: Dict[str, Any]) -> Optional[int]:
+    """
+    Return the memory in MB available to the function, read from available_memory_mb or memory_mb,
+    or from available_memory and its unit for 2nd gen functions
+    """
+    for name in ("available_memory_mb", "memory_mb"):
+        memory_mb = to_number(attributes.get(name))
+        if memory_mb is not None:
+            return int(memory_mb)
+    memory = attributes.get("available_memory")
+    if isinstance(memory, str) and not isinstance(memory, Expression):
+        for unit in sorted(MEMORY_UNITS, key=len, reverse=True):
+            amount = to_number(memory[:-len(unit)]) if memory.endswith(unit) else None
+            if amount is not None:
+                return round(amount * MEMORY_UNITS[unit] / 2 ** 20)
+    return None
+
+
+def read_first_number(attributes: Dict[str, Any], names: tuple) -> Optional[float]:
+    """Return the number of the first attribute of names defining one, None if none does"""
+    for name in names:
+        number = to_number(attributes.get(name))
+        if number is not None:
+            return number
+    return None
+
+
+def read_function(block: Block) -> dict:
+    """
+    Return what the package needs of the function defined by the block: the names selecting it,
+    its source directory relative to the file, its env variables and its limits
+    """
+    attributes = collect_attributes(block)
+    names = [block.labels[-1]] if block.labels else []
+    if isinstance(attributes.get("name"), str) and not isinstance(attributes["name"], Expression):
+        names.append(attributes["name"])
+    source_dir = attributes.get("source_dir")
+    environment_variables = attributes.get("environment_variables")
+    timeout = read_first_number(attributes, ("timeout", "timeout_seconds"))
+    max_concurrency = read_first_number(attributes, ("max_instance_request_concurrency",))
+    min_instances = read_first_number(attributes, ("min_instances", "min_instance_count"))
+    max_instances = read_first_number(attributes, ("max_instances", "max_instance_count"))
+    return {
+        "names": list(dict.fromkeys(names)),
+        "line": block.line,
+        "source_dir": source_dir if isinstance(source_dir, str) and not isinstance(source_dir, Expression) else None,
+        # a map the package cannot read is kept as written to be reported when the env variables are loaded
+        "environment_variables": (
+            {name: format_env_value(value) for name, value in environment_variables.items()}
+            if isinstance(environment_variables, dict) else environment_variables
+        ),
+        "memory_mb": read_memory_mb(attributes),
+        "timeout": timeout,
+        "max_concurrency": int(max_concurrency) if max_concurrency is not None else None,
+        "min_instances": int(min_instances) if min_instances is not None else None,
+        "max_instances": int(max_instances) if max_instances is not None else None,
+    }
+
+
+def format_env_value(value: Any) -> str:
+    """Return the value of an env variable as a string, the collections as json"""
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    # a string that is the reference of a variable is replaced by its value, as the line-based reader did
+    return TERRAFORM_VARIABLES.get(value, format_value(value)) if isinstance(value, str) else format_value(value)
+
+
+def read_terraform_file(path: str) -> List[dict]:
+    """Return the functions defined in the Terraform file, the file is only parsed again once modified"""
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _read_files.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with open(path, 'r') as file:
+        root = parse_hcl(file.read(), path, TERRAFORM_VARIABLES)
+    functions = [read_function(block) for block in find_function_blocks(root)]
+    _read_files[path] = (signature, functions)
+    return functions
+
+
+def find_terraform_files(directory: str) -> List[str]:
+    """Return the paths of the Terraform files under the directory, the hidden directories such as .terraform are skipped"""
+    paths = []
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(name for name in directories if not name.startswith('.'))
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.tf'))
+    return paths
+
+
+def index_file_path(directory: str) -> str:
+    """Return the path of the index file of the Terraform directory, named after a hash of its absolute path"""
+    path_hash = hashlib.sha256(os.path.abspath(directory).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(INDEX_DIR, f"{path_hash}.json")
+
+
+def load_index_file(location: str) -> dict:
+    """Return the files indexed in the index file, an unreadable or outdated index is treated as empty"""
+    try:
+        with open(location, 'r') as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+        return {}
+    return index.get("files", {})
+
+
+def build_terraform_index(location: str) -> List[dict]:
+    """
+    Return the functions defined in the Terraform file or in the Terraform files under the directory provided,
+    each with the path of its file. The functions of a directory are kept in its index file in INDEX_DIR along with
+    the mtime and the size of each file, so that only the files modified since the last run are parsed again
+    """
+    if not os.path.isdir(location):
+        return [{**function, "file": location} for function in read_terraform_file(location)]
+    index_path = index_file_path(location)
+    indexed_files = load_index_file(index_path)
+    files = {}
+    for path in find_terraform_files(location):
+        relative_path = os.path.relpath(path, location)
+        stat = os.stat(path)
+        entry = indexed_files.get(relative_path)
+        if entry is None or [entry.get("mtime_ns"), entry.get("size")] != [stat.st_mtime_ns, stat.st_size]:
+            entry = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "functions": read_terraform_file(path)}
+        files[relative_path] = entry
+    if files != indexed_files:
+        try:
+            os.makedirs(INDEX_DIR, exist_ok=True)
+            # written under a temporary name, then moved in place so that concurrent runs never read a partial index
+            with tempfile.NamedTemporaryFile('w', dir=INDEX_DIR, suffix='.json', delete=False) as file:
+                json.dump({"version": INDEX_VERSION, "files": files}, file)
+            os.replace(file.name, index_path)
+        except OSError:
+            # without a writable INDEX_DIR, the directory is indexed again at each run
+            pass
+    return [
+        {**function, "file": os.path.join(location, relative_path)}
+        for relative_path, entry in files.items()
+        for function in entry["functions"]
+    ]
+
+
+def select_terraform_function(location: str, name: str = None, source: str = None) -> Optional[dict]:
+    """
+    Return the function of the Terraform file or directory provided with the name, a label or the name attribute
+    of its block, or without a name the function whose source_dir is the directory of the source
+    Otherwise, the only function of a directory or the first function of a file is returned, None if there is none
+    Raise InvalidTerraformFileError if the function cannot be told apart from the others
+    """
+    functions = build_terraform_index(location)
+    by_name: Dict[str, List[dict]] = {}
+    by_source_dir: Dict[str, List[dict]] = {}
+    for function in functions:
+        for function_name in function["names"]:
+            by_name.setdefault(function_name, []).append(function)
+        if function["source_dir"] is not None:
+            source_dir = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(function["file"])), function["source_dir"]))
+            by_source_dir.setdefault(source_dir, []).append(function)
+    if name is not None:
+        matches = by_name.get(name, [])
+        if not matches:
+            raise InvalidTerraformFileError(f"No function named {name} in {location}, found: {describe_functions(functions)}")
+    else:
+        matches = by_source_dir.get(os.path.dirname(os.path.abspath(source)), []) if source is not None else []
+        if not matches:
+            if not functions or not os.path.isdir(location) or len(functions) == 1:
+                return functions[0] if functions else None
+            raise InvalidTerraformFileError(
+                f"Several functions are defined in {location} and none has the directory of {source} as source_dir, "
+                f"select one with the terraform_function setting among: {describe_functions(functions)}"
+            )
+    if len(matches) > 1:
+        raise InvalidTerraformFileError(f"Several functions of {location} match: {describe_functions(matches)}")
+    return matches[0]
+
+
+def describe_functions(functions: List[dict]) -> str:
+    """Return the names of the functions along with where they are defined"""
+    return ", ".join(
+        f"{'/'.join(function['names']) or '<unnamed>'} ({os.path.relpath(function['file'])}:{function['line']})"
+        for function in functions
+    )
@@ -1,12 +1,31 @@
+import copy
 import json
+import types
+import uuid
 from abc import abstractmethod
-from typing import Any, Tuple, Type, Union
+from typing import Any, Iterator, List, Optional, Tuple, Type, Union
 
 from requests import Response
+from requests import Session
 
 from ..exceptions import InvalidAttributeTypeError
+from ..limits import PEAK_RSS_HEADER
+from ..limits import parse_peak_rss_header
+from ..logger import custom_logger
+from ..memory_profiling import MEMORY_HEADER
+from ..memory_profiling import parse_memory_header
+from ..utils import read_jsonl
 
 
+# header read by functions-framework to label the logs of an invocation when LOG_EXECUTION_ID is enabled
+EXECUTION_ID_HEADER = "Function-Execution-Id"
+# label and color with which the status of a test is logged
+STATUS_LABELS = {
+    "passed": ("PASSED", "GREEN"),
+    "failed": ("FAILED", "RED"),
+    "timeout": ("TIMEOUT", "RED"),
+}
+
 class BaseFunctionTest:
     """
     Base class for the function test classes
@@ -16,9 +35,28 @@ class BaseFunctionTest:
     def __init__(self, user_defined_test_class: Type) -> None:
         """Initialize the Test object with attributes from a user-defined test class."""
         self.name = user_defined_test_class.__name__
+        self.execution_id = uuid.uuid4().hex
         self.response = None
         self.initialize_attributes(user_defined_test_class)
         self.validate_attributes()
+        # median response time over several requests, only measured for the tests whose latency is checked
+        self.latency = None
+        # the latency of the cases of a class is that of each of their responses
+        self.measure_latency = self.max_latency is not None and self.cases is None
+        # set when a baseline of the latencies is provided for the run
+        self.baseline_latency = None
+        self.baseline_tolerance = None
+        # (status, detailled logs) set once the response of the test is checked
+        self.result = None
+        # set when the memory of the function is profiled
+        self.memory_usage = None
+        self.memory_limit_mb = None
+        # peak RSS of the server during the invocation in bytes, set when the limits of the function are emulated
+        self.peak_rss = None
+        # set for the tests created from the cases of a user-defined class
+        self.case_index = None
+        # why the test has no response when its request timed out or could not be sent before the end of the suite
+        self.timed_out = None
 
     @property
     def attributes(self) -> dict:
@@ -28,9 +66,17 @@ class BaseFunctionTest:
         """
         return {
             "error": [bool],
-            "display_logs": [bool]
+            "display_logs": [bool],
+            "max_latency": [int, float],
+            "timeout": [int, float],
+            "cases": [str, types.FunctionType],
         }
 
+    @property
+    def case_fields(self) -> List[str]:
+        """Attributes set by the values of a case given as a sequence rather than as a dict, in this order"""
+        return []
+
     @staticmethod
     def get_class_attr(obj: Type, attr: str) -> Any:
         """Get an attribute from a class if it exists, otherwise return None."""
@@ -66,9 +112,45 @@ class BaseFunctionTest:
                 error_message = f"In class {self.name}, attribute '{attr}' must be of type {self.format_possible_types(expected_types)}"
                 raise InvalidAttributeTypeError(error_message)
 
+    def iter_cases(self) -> Iterator[dict]:
+        """
+        Yield the cases of the test one at a time, read lazily from the JSONL file or the generator of self.cases
+        A case is a dict of attributes of the test or a sequence of the values of the case fields
+        """
+        cases = self.cases() if callable(self.cases) else read_jsonl(self.cases)
+        for case in cases:
+            yield case if isinstance(case, dict) else dict(zip(self.case_fields, case))
+
+    def with_case(self, index: int, case: dict) -> "BaseFunctionTest":
+        """Return a copy of the test whose attributes are overridden by those of the case, named after its index"""
+        invocation = copy.copy(self)
+        for attr, value in case.items():
+            if attr not in self.attributes or attr == "cases":
+                raise InvalidAttributeTypeError(f"In class {self.name}, case {index} has an unknown attribute '{attr}'")
+            setattr(invocation, attr, value)
+        invocation.name = f"{self.name}[{index}]"
+        # the profiles of the cases are collected with those of the class through the prefix of their execution id
+        invocation.execution_id = f"{self.execution_id}-{index}"
+        invocation.case_index = index
+        invocation.cases = None
+        invocation.response = None
+        invocation.measure_latency = False
+        invocation.validate_attributes()
+        return invocation
+
+    def log_status(self, response_time: Optional[float], status: str) -> None:
+        """Log the status of the test (passed, failed or timeout), the cases of a class are only logged as a whole"""
+        if self.case_index is not None:
+            return
+        prefix = f"test {self.name}: " if response_time is None else f"test {self.name} in {response_time}s: "
+        custom_logger.log_colored([(prefix, "DEFAULT"), STATUS_LABELS[status]])
+
     @abstractmethod
-    def make_post_request(self, url: str) -> None:
-        """Make a post request to the url provided. Save the response in self.response"""
+    def make_post_request(self, url: str, session: Session, timeout: float = None) -> None:
+        """
+        Make a post request to the url provided with the session. Save the response in self.response
+        The request times out after timeout seconds, self.timeout by default
+        """
         pass
 
     @staticmethod
@@ -78,18 +160,74 @@ class BaseFunctionTest:
         Return the Exception class as the output if the function crashed.
         Otherwise, return a dict if the output was a json and a str in all other cases.
         """
-        response_output = response.text
-        if response_output.startswith("500 Internal Server Error"):
+        # responses of the in-process engine carry the Exception raised by the function
+        if getattr(response, 'exception', None) is not None:
+            return Exception
+        # the body is decoded once, by the json parser, unless it's not a json
+        content = response.content
+        if content.startswith(b"500 Internal Server Error"):
             response_output = Exception
         else:
             try:
-                response_output = response.json()
-            except json.JSONDecodeError:
-                pass
+                response_output = json.loads(content)
+            except ValueError:
+                response_output = response.text
         if isinstance(response_output, int):
             response_output = str(response_output)
         return response_output
 
+    def check_latency(self) -> List[str]:
+        """
+        Compare the latency measured for the test to its budget and to its baseline
+        Return the detailled logs of the failures, an empty list if the latency is fine or was not measured
+        """
+        display_message = []
+        if self.latency is None:
+            return display_message
+        if self.max_latency is not None and self.latency > self.max_latency:
+            display_message.append("Latency above the budget")
+            display_message.append(f"- expected: at most {self.max_latency}s")
+            display_message.append(f"- received: {round(self.latency, 6)}s")
+        if (
+            self.baseline_latency is not None
+            and self.latency > self.baseline_latency * (1 + self.baseline_tolerance / 100)
+        ):
+            display_message.append("Latency regression compared to the baseline")
+            display_message.append(f"- baseline: {round(self.baseline_latency, 6)}s (+{self.baseline_tolerance}% allowed)")
+            display_message.append(f"- received: {round(self.latency, 6)}s")
+        return display_message
+
+    def check_memory(self) -> List[str]:
+        """
+        Read the memory usage reported by the profiling wrapper and the peak RSS reported by the limits wrapper, if any
+        Compare the peak RSS of the function during the invocation to the memory available to the function
+        Return the detailled logs of the failure, an empty list if the memory is fine or was not profiled
+        """
+        display_message = []
+        headers = getattr(self.response, 'headers', {})
+        self.memory_usage = parse_memory_header(headers.get(MEMORY_HEADER))
+        self.peak_rss = parse_peak_rss_header(headers.get(PEAK_RSS_HEADER))
+        if self.memory_usage is None or self.memory_limit_mb is None:
+            return display_message
+        if self.memory_usage["peak_rss"] > self.memory_limit_mb * 2 ** 20:
+            display_message.append("Memory above the memory available to the function")
+            display_message.append(f"- expected: at most {self.memory_limit_mb} MB")
+            display_message.append(f"- received: {round(self.memory_usage['peak_rss'] / 2 ** 20, 2)} MB")
+        return display_message
+
+    def timeout_result(self, error_logs: str, standard_logs: str) -> Tuple[str, list]:
+        """
+        Log that the test timed out and return its failure with the logs collected until then
+        A test that timed out is failed, its response cannot be checked
+        """
+        self.log_status(None, "timeout")
+        display_message = [(f"test {self.name}", "CYAN")]
+        logs = "\n".join(item for item in (standard_logs, error_logs) if item)
+        if logs:
+            display_message.append(logs)
+        display_message.append(self.timed_out)
+        return ("failed", display_message)
+
     @abstractmethod
     def check_response_validity(self, error_logs: str, standard_logs: str) -> Tuple[str, str]:
         """
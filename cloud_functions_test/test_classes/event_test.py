@@ -4,7 +4,7 @@ from typing import Any, List, Union, Tuple, Type
 import requests
 
 from .base_test import BaseFunctionTest
-from ..logger import custom_logger
+from .base_test import EXECUTION_ID_HEADER
 from ..matching import partial_matching
 
 
@@ -29,12 +29,20 @@ class EventFunctionTest(BaseFunctionTest):
             **attr
         }
 
-    def make_post_request(self, url: str) -> None:
+    @property
+    def case_fields(self) -> List[str]:
+        """Attributes set by the values of a case given as a sequence rather than as a dict, in this order"""
+        return ["event", "context"]
+
+    def make_post_request(self, url: str, session: requests.Session, timeout: float = None) -> None:
         """
         Make a post request to the url provided with self.event and self.context as data
+        The session is shared by all tests of the run so that keep-alive connections are reused.
+        The request times out after timeout seconds, self.timeout by default
         Save the response in self.response
         """
-        params = {'url': url, 'headers': {'Content-Type': 'application/json'}}
+        params = {'url': url, 'headers': {'Content-Type': 'application/json', EXECUTION_ID_HEADER: self.execution_id}}
+        params['timeout'] = timeout if timeout is not None else self.timeout
         data = {}
         if self.event is not None:
             data['event'] = self.event
@@ -42,34 +50,53 @@ class EventFunctionTest(BaseFunctionTest):
             data['context'] = self.context
         if data:
             params['json'] = data
-        self.response = requests.post(**params)
+        self.response = session.post(**params)
+
+    @staticmethod
+    def extract_event_result(response: requests.Response) -> dict:
+        """
+        Get the result of the invocation returned as json by the wrapper of the event function
+        If the response is not such a result, the wrapper itself failed and it's considered as a crash
+        """
+        try:
+            result = response.json()
+        except ValueError:
+            result = None
+        if not isinstance(result, dict) or "success" not in result:
+            return {"success": False, "exception": None, "traceback": response.text, "duration": None}
+        return result
 
     def check_response_validity(self, error_logs: str, standard_logs: str) -> Tuple[str, str]:
         """
-        Check whether the function created error logs and compare it to the value of self.error
+        Check whether the function crashed according to the result returned by the wrapper and compare it to self.error
+        Check the latency and the memory of the function if they were measured
         Log whether the test passed or failed and returns the detailled logs in case of failure.
         """
-        response_time = self.response.elapsed.total_seconds()
+        result = self.extract_event_result(self.response)
+        crashed = not result["success"]
+        # time spent in the function, without the request to the wrapper, if the wrapper could measure it
+        response_time = round(result["duration"], 6) if result["duration"] is not None else self.response.elapsed.total_seconds()
+        budget_failures = self.check_latency() + self.check_memory()
+        # what the function wrote on stderr is part of its logs, a crash is only reported by the result
+        logs = "\n".join(item for item in (standard_logs, error_logs) if item)
         status = "passed"
         display_message = []
 
-        if (
-            (not error_logs and self.error)
-            or (error_logs and not self.error)
-        ):
+        if crashed != bool(self.error) or budget_failures:
             status = "failed"
-            custom_logger.log_colored([(f"test {self.name} in {response_time}s: ", "DEFAULT"), ("FAILED", "RED")])
+            self.log_status(response_time, "failed")
             display_message.append((f"test {self.name}", "CYAN"))
-            if standard_logs:
-                display_message.append(standard_logs)
-            if error_logs:
-                display_message.append("Function crashed")
-                display_message.append(error_logs)
-            else:
+            if logs:
+                display_message.append(logs)
+            if crashed and not self.error:
+                display_message.append(f"Function crashed ({result['exception']})" if result["exception"] else "Function crashed")
+                display_message.append(result["traceback"].strip())
+            elif not crashed and self.error:
                 display_message.append("Function did not crash while an error was expected")
+            display_message.extend(budget_failures)
         else:
-            custom_logger.log_colored([(f"test {self.name} in {response_time}s: ", "DEFAULT"), ("PASSED", "GREEN")])
-            if self.display_logs and standard_logs:
+            self.log_status(response_time, "passed")
+            if self.display_logs and logs:
                 display_message.append((f"test {self.name}", "CYAN"))
-                display_message.append(f"{standard_logs}")
+                display_message.append(logs)
         return (status, display_message)
@@ -1,12 +1,22 @@
 import json
 import re
-from typing import Any, List, Union, Tuple, Type
+from typing import Any, List, Optional, Union, Tuple, Type
 
 import requests
 
 from .base_test import BaseFunctionTest
-from ..logger import custom_logger
-from ..matching import partial_matching
+from .base_test import EXECUTION_ID_HEADER
+from ..json_stream import STREAM_CHUNK_SIZE
+from ..json_stream import JsonStream
+from ..matching import Mismatch
+from ..matching import compile_matcher
+from ..matching import compile_stream_matcher
+
+
+# json responses larger than this number of bytes, or of unknown length, are checked while they are read
+STREAMING_THRESHOLD = 2 ** 20
+# output reported for a response checked while it was read, its body is not kept
+STREAMED_OUTPUT = "<json response checked while it was streamed>"
 
 
 class HttpFunctionTest(BaseFunctionTest):
@@ -14,6 +24,18 @@ class HttpFunctionTest(BaseFunctionTest):
 
     def __init__(self, *args) -> None:
         super().__init__(*args)
+        self.compile_output()
+        # set when the body of the response was checked while it was read rather than loaded in memory
+        self.output_streamed = False
+        self.output_mismatch = None
+
+    def compile_output(self) -> None:
+        """
+        Compile the expected output once so that checking a response does not walk it again,
+        both for a response loaded in memory and for one checked while it is streamed
+        """
+        self.output_matcher = compile_matcher(self.output) if self.output is not None else None
+        self.output_stream_matcher = compile_stream_matcher(self.output) if self.output is not None else None
 
     @property
     def attributes(self) -> dict:
@@ -32,27 +54,83 @@ class HttpFunctionTest(BaseFunctionTest):
             **attr
         }
 
-    def make_post_request(self, url: str) -> None:
+    @property
+    def case_fields(self) -> List[str]:
+        """Attributes set by the values of a case given as a sequence rather than as a dict, in this order"""
+        return ["data", "headers", "output"]
+
+    def with_case(self, *args) -> "HttpFunctionTest":
+        """Return a copy of the test for a case, with the expected output of the case compiled"""
+        invocation = super().with_case(*args)
+        invocation.compile_output()
+        return invocation
+
+    def make_post_request(self, url: str, session: requests.Session, timeout: float = None) -> None:
         """
         Make a post request to the url provided with self.headers and the self.data as parameters.
-        Save the response in self.response
+        The session is shared by all tests of the run so that keep-alive connections are reused.
+        The execution id header is added to the headers so that the logs of the request can be identified.
+        The request times out after timeout seconds, self.timeout by default
+        Save the response in self.response, a large json body is checked against the output while it is read
         """
-        params = {'url': url}
+        params = {'url': url, 'headers': {EXECUTION_ID_HEADER: self.execution_id}}
+        params['timeout'] = timeout if timeout is not None else self.timeout
         if self.headers is not None:
-            params['headers'] = self.headers
+            params['headers'].update(self.headers)
         if self.data is not None:
             params['json'] = self.data
-        self.response = requests.post(**params)
+        # the body is only read once the headers tell whether it should be streamed
+        params['stream'] = self.output_stream_matcher is not None
+        self.response = session.post(**params)
+        self.output_streamed = params['stream'] and self.is_large_json(self.response)
+        self.output_mismatch = None
+        if self.output_streamed:
+            self.output_mismatch = self.match_streamed_output()
+        elif params['stream']:
+            # loaded in memory as it would be without streaming
+            self.response.content
+
+    @staticmethod
+    def is_large_json(response: requests.Response) -> bool:
+        """Return whether the response is a json whose body is too large to be loaded in memory or of unknown length"""
+        if not response.headers.get('Content-Type', '').startswith('application/json'):
+            return False
+        content_length = response.headers.get('Content-Length')
+        return content_length is None or int(content_length) > STREAMING_THRESHOLD
+
+    def match_streamed_output(self) -> Optional[Mismatch]:
+        """
+        Check the body of the response against the output while it is read chunk by chunk
+        The reading stops at the first mismatch, whose path, expected and received values are returned
+        Return None if the body matches the output
+        """
+        stream = JsonStream(self.response.iter_content(STREAM_CHUNK_SIZE))
+        try:
+            mismatch = self.output_stream_matcher(stream, "$")
+            if mismatch is None:
+                stream.read_end()
+            return mismatch
+        except ValueError as error:
+            return ("$", self.output, f"a body that is not valid json ({error})")
+        finally:
+            self.response.close()
 
     def check_response_validity(self, error_logs: str, standard_logs: str) -> Tuple[str, str]:
         """
         Check the validity of the request's response compared to the expected values.
+        Check the latency and the memory of the function if they were measured
         Log whether the test passed or failed and returns the status and the detailled
         logs in case of failure or if the user asked for the output to be logged.
         """
         response_status = self.response.status_code
-        response_output = self.extract_response_output(self.response)
         response_time = self.response.elapsed.total_seconds()
+        if self.output_streamed:
+            response_output = STREAMED_OUTPUT
+            output_matches = self.output_mismatch is None
+        else:
+            response_output = self.extract_response_output(self.response)
+            output_matches = self.output_matcher is None or self.output_matcher(response_output)
+        budget_failures = self.check_latency() + self.check_memory()
 
         status = "passed"
         display_message = []
@@ -61,14 +139,15 @@ class HttpFunctionTest(BaseFunctionTest):
         if (
             ((response_output == Exception) != (self.error or False))
             or (self.status_code is not None and self.status_code != response_status)
-            or (self.output is not None and not partial_matching(self.output, response_output))
+            or not output_matches
+            or budget_failures
         ):
             status = "failed"
-            custom_logger.log_colored([(f"test {self.name} in {response_time}s: ", "DEFAULT"), ("FAILED", "RED")])
+            self.log_status(response_time, "failed")
             display_message.append((f"test {self.name}", "CYAN"))
             if standard_logs: display_message.append(standard_logs)
         else:
-            custom_logger.log_colored([(f"test {self.name} in {response_time}s: ", "DEFAULT"), ("PASSED", "GREEN")])   
+            self.log_status(response_time, "passed")   
 
         # add some detailled logs for different types of failure
         if (response_output == Exception) and not self.error:
@@ -82,10 +161,16 @@ class HttpFunctionTest(BaseFunctionTest):
                 display_message.append("Unexpected status code")
                 display_message.append(f"- expected: {self.status_code}")
                 display_message.append(f"- received: {response_status}")
-            if self.output is not None and not partial_matching(self.output, response_output):
+            if not output_matches and self.output_streamed:
+                path, expected, received = self.output_mismatch
+                display_message.append(f"Unexpected output at {path}")
+                display_message.append(f"- expected: {expected}")
+                display_message.append(f"- received: {received}")
+            elif not output_matches:
                 display_message.append("Unexpected output")
                 display_message.append(f"- expected: {self.output}")
                 display_message.append(f"- received: {response_output}")
+        display_message.extend(budget_failures)
 
         # add the output to the logs in case of success if display_logs == True
         if status == "passed" and self.display_logs:
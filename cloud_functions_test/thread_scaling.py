@@ -0,0 +1,167 @@
+import copy
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from requests import RequestException
+from requests import Session
+
+from .logger import custom_logger
+from .test_classes.base_test import BaseFunctionTest
+from .test_classes.event_test import EventFunctionTest
+from .test_classes.http_test import STREAMED_OUTPUT
+
+
+# number of serial invocations of each test compared to tell whether its result is deterministic
+SERIAL_INVOCATIONS = 2
+
+
+def thread_levels(max_threads: int) -> List[int]:
+    """Return the numbers of threads of the server measured: the powers of 2 up to max_threads, and max_threads"""
+    levels = [1]
+    while levels[-1] * 2 < max_threads:
+        levels.append(levels[-1] * 2)
+    if levels[-1] != max_threads:
+        levels.append(max_threads)
+    return levels
+
+
+def server_threads_env(threads: int, server_workers: int) -> dict:
+    """Return the environment variables setting the number of worker processes and of threads per worker of a server"""
+    return {'THREADS': str(threads), 'WORKERS': str(server_workers)}
+
+
+def invocation_result(test: BaseFunctionTest, local_url: str, session: Session) -> Tuple[bool, Any]:
+    """
+    Make the request of a copy of the test, so that concurrent invocations do not share their response
+    Return whether the invocation failed and its result: the status and the output of an http function,
+    whether an event function succeeded and the exception it raised, or the error if the request could not be made
+    """
+    invocation = copy.copy(test)
+    try:
+        invocation.make_post_request(local_url, session)
+    except RequestException as error:
+        return True, (type(error).__name__,)
+    response = invocation.response
+    error = response.status_code >= 500
+    if isinstance(invocation, EventFunctionTest):
+        # the duration returned by the wrapper differs from one invocation to the next
+        result = invocation.extract_event_result(response)
+        return error or not result["success"], (result["success"], result["exception"])
+    if getattr(invocation, 'output_streamed', False):
+        # the body was checked while it was read and is not kept, only where it differed from the output is
+        mismatch = invocation.output_mismatch
+        return error, (response.status_code, STREAMED_OUTPUT if mismatch is None else f"mismatch at {mismatch[0]}")
+    return error, (response.status_code, invocation.extract_response_output(response))
+
+
+def run_serial(tests: List[BaseFunctionTest], local_url: str, session: Session) -> Dict[str, Optional[tuple]]:
+    """
+    Invoke each test SERIAL_INVOCATIONS times one request at a time
+    Return the result of each test, None for the tests whose result differs between serial invocations
+    as they cannot be compared to the concurrent invocations
+    """
+    serial_results = {}
+    for test in tests:
+        results = [invocation_result(test, local_url, session)[1] for _ in range(SERIAL_INVOCATIONS)]
+        serial_results[test.name] = results[0] if all(result == results[0] for result in results) else None
+    return serial_results
+
+
+def run_thread_level(
+    tests: List[BaseFunctionTest],
+    local_url: str,
+    session: Session,
+    threads: int,
+    iterations: int,
+    serial_results: Dict[str, Optional[tuple]]
+) -> dict:
+    """
+    Make the request of each test iterations times with threads requests at the same time
+    to a server handling up to threads requests at the same time
+    Return the throughput of the level, its errors and the results differing from the serial run of each test
+    """
+    tests_per_second = {}
+    differences = {}
+    errors = 0
+    duration = 0.0
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for test in tests:
+            start_time = time.perf_counter()
+            invocations = list(executor.map(lambda _: invocation_result(test, local_url, session), range(iterations)))
+            test_duration = time.perf_counter() - start_time
+            duration += test_duration
+            tests_per_second[test.name] = iterations / test_duration if test_duration else 0.0
+            # the crashes of a test expecting an error are its expected result, not errors
+            if not test.error:
+                errors += sum(1 for error, _ in invocations if error)
+            expected = serial_results.get(test.name)
+            if expected is None:
+                continue
+            differing = [result for _, result in invocations if result != expected]
+            if differing:
+                differences[test.name] = {
+                    "count": len(differing),
+                    "expected": format_result(expected),
+                    "received": format_result(differing[0]),
+                }
+    requests = iterations * len(tests)
+    return {
+        "threads": threads,
+        "requests": requests,
+        "requests_per_second": requests / duration if duration else 0.0,
+        "tests_requests_per_second": tests_per_second,
+        "errors": errors,
+        "differences": differences,
+    }
+
+
+def format_result(result: tuple) -> str:
+    """Return the result of an invocation as a string that can be logged and written as json"""
+    return ", ".join(value.__name__ if isinstance(value, type) else str(value) for value in result)
+
+
+def compute_scaling(results: List[dict]) -> List[dict]:
+    """Add to the results of each level its speedup over the single-threaded level and its efficiency, the speedup per thread"""
+    reference = results[0]["requests_per_second"] if results else 0.0
+    for result in results:
+        speedup = result["requests_per_second"] / reference if reference else 0.0
+        result["speedup"] = speedup
+        result["efficiency"] = speedup / result["threads"]
+    return results
+
+
+def display_scaling_results(results: List[dict], serial_results: Dict[str, Optional[tuple]]) -> None:
+    """
+    Log the throughput of each level as a table, in red when some results differ from the serial run
+    then the results differing from the serial run and the tests that could not be compared
+    """
+    custom_logger.log_centered("CONCURRENCY SCALING")
+    custom_logger.log_colored((
+        f"{'threads':>7}  {'requests':>8}  {'req/s':>9}  {'speedup':>7}  {'efficiency':>10}  {'errors':>6}  {'differing':>9}",
+        "CYAN"
+    ))
+    for result in results:
+        differing = sum(difference["count"] for difference in result["differences"].values())
+        line = (
+            f"{result['threads']:>7}  {result['requests']:>8}  {result['requests_per_second']:>9.1f}  "
+            f"{result['speedup']:>6.2f}x  {result['efficiency']:>10.0%}  {result['errors']:>6}  {differing:>9}"
+        )
+        custom_logger.log_colored((line, "RED" if differing or result["errors"] else "DEFAULT"))
+    for result in results:
+        for name, difference in result["differences"].items():
+            custom_logger.log_colored((
+                f"test {name} with {result['threads']} threads: {difference['count']} results differ from the serial run", "RED"
+            ))
+            custom_logger.log_colored(f"- serial: {difference['expected']}")
+            custom_logger.log_colored(f"- received: {difference['received']}")
+    for name, result in serial_results.items():
+        if result is None:
+            custom_logger.log_colored((f"test {name}: the result differs between serial invocations, it is not compared", "YELLOW"))
+
+
+def write_scaling_report(results: List[dict], path: str) -> None:
+    """Write the results of each level as json in the file provided"""
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
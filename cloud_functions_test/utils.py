@@ -1,37 +1,106 @@
-import fcntl
-import os
-from math import floor
-from typing import Tuple
+import json
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+from .exceptions import InvalidCasesFileError
 
-def log_reader(process: object) -> Tuple[str, str]:
-    """Read all available logs and return them in a tuple(error, standard)"""
+
+# field in which functions-framework writes the execution id of the invocation when LOG_EXECUTION_ID is enabled
+LOGGING_LABELS_FIELD = "logging.googleapis.com/labels"
+JSON_DECODER = json.JSONDecoder()
+
+
+def split_logs(lines: List[Tuple[str, str]]) -> Tuple[str, str]:
+    """Given the (stream, line) of an invocation, return its logs in a tuple(error, standard)"""
     standard_logs = []
     error_logs = []
-    while True:
-        line = process.stdout.readline()
-        if line:
-            new_logs.append(line.decode('utf-8'))
+    for stream, line in lines:
+        # logging.error/warning are added to stderr but we want to treat them as standard logs
+        if stream == 'stdout' or line.startswith('ERROR:') or line.startswith('WARNING:'):
+            standard_logs.append(line)
         else:
-            break
-    while True:
-        line = process.stderr.readline()
-        if line:
-            line = line.decode('utf-8')
-            # logging.error/warning are added to stderr but we want to treat them as standard logs
-            if line.startswith('ERROR:') or line.startswith('WARNING:'):
-                standard_logs.append(line)
-            else:
-                error_logs.append(line)
-        else:
-            break
+            error_logs.append(line)
     return(
         "".join(error_logs).strip('\n'),
         "".join(standard_logs).strip('\n')
     )
 
 
-def set_fd_nonblocking(fd: object) -> None:
-    """Set file descriptor to non-blocking such that we can read the logs without blocking the thread"""
-    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
-    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+def route_execution_logs(lines: List[Tuple[str, str]]) -> Dict[Optional[str], Tuple[str, str]]:
+    """
+    Given (stream, line) labelled with an execution id by functions-framework,
+    return the logs in a dict execution_id: tuple(error, standard) split as split_logs does
+    The lines without an execution id, such as the crashes of the server itself, are kept under None
+    """
+    execution_writes = {}
+    unattributed_lines = []
+    for stream, line in lines:
+        for payload, text in read_log_records(line):
+            labels = payload.get(LOGGING_LABELS_FIELD) if isinstance(payload, dict) else None
+            execution_id = labels.get('execution_id') if isinstance(labels, dict) else None
+            if not execution_id:
+                unattributed_lines.append((stream, text))
+                continue
+            # each record is a write without its trailing newline, print writes the separators between its values
+            # on their own, they are joined with the values around them to rebuild the line printed
+            message = payload.get('message', '')
+            separator = bool(message) and not message.strip()
+            writes = execution_writes.setdefault(execution_id, [])
+            if writes and writes[-1][0] == stream and (separator or writes[-1][2]):
+                writes[-1] = (stream, writes[-1][1] + message, separator)
+            else:
+                writes.append((stream, message, separator))
+    execution_logs = {
+        execution_id: split_logs([
+            (stream, line) for stream, message, _ in writes for line in f"{message}\n".splitlines(keepends=True)
+        ])
+        for execution_id, writes in execution_writes.items()
+    }
+    if unattributed_lines:
+        execution_logs[None] = split_logs(unattributed_lines)
+    return execution_logs
+
+
+def read_log_records(line: str) -> Iterator[Tuple[Any, str]]:
+    """
+    Yield the json value and the text of each record of the line, None as the value of a text that is not json
+    functions-framework writes a record and its newline apart, so the records of concurrent invocations
+    written in between end up on the same line
+    """
+    position = 0
+    while True:
+        start = position
+        position = len(line) - len(line[position:].lstrip())
+        if position == len(line):
+            return
+        try:
+            payload, end = JSON_DECODER.raw_decode(line, position)
+        except json.JSONDecodeError:
+            yield None, line[start:]
+            return
+        yield payload, f"{line[position:end]}\n"
+        position = end
+
+
+def read_jsonl(location: str) -> Iterator[Any]:
+    """Yield the json value of each line of the JSONL file one at a time, the blank lines are skipped"""
+    with open(location, 'r') as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise InvalidCasesFileError(f"Line {line_number} of the file {location} is not valid json: {error}")
+
+
+def discard_logs(process: object) -> None:
+    """Read and drop the logs of the process in background threads so that the process never blocks on full pipes"""
+    for stream in (process.stdout, process.stderr):
+        threading.Thread(target=drain_stream, args=(stream,), daemon=True).start()
+
+
+def drain_stream(stream: object) -> None:
+    """Read the stream until it is closed without keeping its content"""
+    while stream.read1(65536):
+        pass
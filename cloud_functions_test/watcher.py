@@ -0,0 +1,72 @@
+import contextlib
+import importlib
+import os
+import sys
+import time
+from importlib.util import cache_from_source
+from typing import Dict, List, Set, Tuple
+
+
+# number of seconds between two checks of the files watched
+WATCH_INTERVAL = 0.2
+
+
+def get_mtimes(paths: List[str]) -> Dict[str, int]:
+    """Return the modification time of each file in nanoseconds, None for the files that do not exist"""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def wait_for_changes(paths: List[str], mtimes: Dict[str, int], interval: float = WATCH_INTERVAL) -> Tuple[Set[str], Dict[str, int]]:
+    """
+    Poll the files until one of them is modified, created or deleted compared to the mtimes provided
+    Return the paths of the files that changed and their new modification times
+    """
+    current_mtimes = mtimes
+    while current_mtimes == mtimes:
+        time.sleep(interval)
+        current_mtimes = get_mtimes(paths)
+    # wait for the files to stop changing so that a file being saved is only read once complete
+    while True:
+        time.sleep(interval)
+        latest_mtimes = get_mtimes(paths)
+        if latest_mtimes == current_mtimes:
+            break
+        current_mtimes = latest_mtimes
+    changed_paths = {path for path in paths if current_mtimes[path] != mtimes.get(path)}
+    return changed_paths, current_mtimes
+
+
+def discard_bytecode(path: str) -> None:
+    """
+    Delete the cached bytecode of a python file so that its next import compiles its current source
+    The cache is otherwise only invalidated by changes of the size or of the mtime in seconds of the file
+    """
+    with contextlib.suppress(OSError, ValueError):
+        os.remove(cache_from_source(path))
+
+
+def reload_module(module_name: str) -> None:
+    """Remove the module from the imported modules so that the next import executes its current source"""
+    module = sys.modules.pop(module_name, None)
+    path = getattr(module, '__file__', None)
+    if path and path.endswith('.py'):
+        discard_bytecode(path)
+    importlib.invalidate_caches()
+
+
+def fingerprint_classes(user_defined_classes: List[type]) -> Dict[str, str]:
+    """Return a dict class name: string that changes whenever an attribute defined in the class changes"""
+    return {
+        user_defined_class.__name__: "\n".join(sorted(
+            f"{name}={value!r}"
+            for name, value in vars(user_defined_class).items()
+            if not name.startswith('__')
+        ))
+        for user_defined_class in user_defined_classes
+    }
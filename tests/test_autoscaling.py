@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from cloud_functions_test.autoscaling import arrival_rate
+from cloud_functions_test.autoscaling import generate_arrivals
+from cloud_functions_test.autoscaling import simulate_autoscaling
+
+
+def test_arrival_rate():
+    assert arrival_rate("constant", 10, 100, 60, 30) == 10
+    assert arrival_rate("ramp", 10, 100, 60, 0) == 10
+    assert arrival_rate("ramp", 10, 100, 60, 30) == 55
+    assert arrival_rate("spike", 10, 100, 60, 20) == 10
+    assert arrival_rate("spike", 10, 100, 60, 25) == 100
+    assert arrival_rate("spike", 10, 100, 60, 30) == 10
+
+
+def test_generate_arrivals():
+    arrivals = generate_arrivals("constant", 50, 50, 100, random.Random(0))
+    assert arrivals == sorted(arrivals)
+    assert all(0 <= arrival < 100 for arrival in arrivals)
+    assert len(arrivals) == pytest.approx(5000, rel=0.05)
+    # the spike makes up half of the requests when its rate is 9 times the rate elsewhere
+    arrivals = generate_arrivals("spike", 10, 90, 100, random.Random(0))
+    assert sum(1 for arrival in arrivals if 40 <= arrival < 50) / len(arrivals) == pytest.approx(0.5, abs=0.05)
+    assert generate_arrivals("constant", 0, 0, 100, random.Random(0)) == []
+
+
+def test_simulate_autoscaling():
+    # 3 requests at once with 1 instance ready: 2 new instances are started for the 2 requests left
+    results = simulate_autoscaling([0.0, 0.0, 0.0], [1.0], 2.0, 1, None, 1, 10.0, 5.0, random.Random(0))
+    assert results["cold_starts"] == 2
+    assert results["max_running_instances"] == 3
+    assert results["queueing_delay"]["max"] == 2.0
+    assert results["response_time"]["max"] == 3.0
+    # the instances run until the last request completes
+    assert results["instance_seconds"] == pytest.approx(3.0 + 3.0 + 3.0)
+    assert [window["instances"] for window in results["windows"]] == [3]
+
+    # with at most 1 instance, the requests wait for each other
+    results = simulate_autoscaling([0.0, 0.0, 0.0], [1.0], 2.0, 1, 1, 1, 10.0, 5.0, random.Random(0))
+    assert results["cold_starts"] == 0
+    assert results["queueing_delay"]["max"] == 2.0
+    assert results["instance_seconds"] == pytest.approx(3.0)
+
+    # an instance handling 2 requests at once, shut down after 1s without requests before the last one arrives
+    results = simulate_autoscaling([0.0, 0.0, 10.0], [1.0], 0.5, 0, None, 2, 1.0, 5.0, random.Random(0))
+    assert results["cold_starts"] == 2
+    assert results["queueing_delay"]["max"] == 0.5
+    assert results["instance_seconds"] == pytest.approx(2.5 + 1.5)
+    assert [window["cold_starts"] for window in results["windows"]] == [1, 0, 1]
+    assert [window["instances"] for window in results["windows"]] == [1, 0, 1]
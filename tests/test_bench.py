@@ -0,0 +1,53 @@
+import pytest
+
+from cloud_functions_test.bench import compute_benchmark_statistics
+from cloud_functions_test.bench import percentile
+from cloud_functions_test.bench import run_benchmark
+from cloud_functions_test.functions import add_event_wrapper
+from cloud_functions_test.functions import create_shim
+from cloud_functions_test.functions import create_tests
+from cloud_functions_test.inprocess import InProcessSession
+
+
+def test_percentile():
+    values = [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 100) == 5.0
+    assert percentile(values, 95) == pytest.approx(4.8)
+    assert percentile([2.0], 99) == 2.0
+
+
+def test_compute_benchmark_statistics():
+    invocations = [(0.3, False), (0.1, False), (0.2, True), (0.4, False)]
+    statistics = compute_benchmark_statistics("A", invocations, 2.0)
+    assert statistics["test"] == "A"
+    assert statistics["requests"] == 4
+    assert statistics["min"] == 0.1
+    assert statistics["max"] == 0.4
+    assert statistics["p50"] == pytest.approx(0.25)
+    assert statistics["requests_per_second"] == 2.0
+    assert statistics["error_rate"] == 0.25
+
+
+def test_run_benchmark_event_crash(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text(
+        "def main(event, context):\n"
+        "    if 'a' not in event:\n"
+        "        raise ValueError('missing a')\n"
+    )
+    shim_path = str(tmp_path / "event.py")
+    entrypoint = add_event_wrapper(shim_path, create_shim(shim_path, str(source), "main"), "event_entrypoint")
+    session = InProcessSession(shim_path, entrypoint)
+
+    class Valid:
+        event = {"a": 1}
+
+    class WrongInput:
+        event = {"b": 1}
+
+    tests, _ = create_tests([Valid, WrongInput])
+    results = run_benchmark("http://localhost", tests, session, 4, 1, 1)
+    # the wrapper of the event function answers 200 even when the function crashes
+    assert [result["error_rate"] for result in results] == [0.0, 1.0]
@@ -0,0 +1,27 @@
+from cloud_functions_test.cold_start import IMPORT_TIME_MARKER
+from cloud_functions_test.cold_start import aggregate_import_times
+from cloud_functions_test.cold_start import measure_import_times
+from cloud_functions_test.cold_start import parse_import_times
+
+
+def test_parse_import_times():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:        50 |         50 | site",
+        IMPORT_TIME_MARKER,
+        "import time:       120 |        120 |   json.decoder",
+        "import time:        80 |        200 | json",
+        "import time:       300 |        500 | requests",
+    ])
+    imports = parse_import_times(stderr)
+    assert imports == [("json.decoder", 1, 120, 120), ("json", 0, 80, 200), ("requests", 0, 300, 500)]
+    assert aggregate_import_times(imports) == [("requests", 300), ("json", 200)]
+
+
+def test_measure_import_times(tmp_path):
+    (tmp_path / "helpers.py").write_text("import json\n")
+    source = tmp_path / "main.py"
+    source.write_text("import helpers\n\ndef main(request):\n    return 'OK'\n")
+    load_time, imports = measure_import_times(str(source))
+    assert load_time > 0
+    assert "helpers" in [name for name, _, _, _ in imports]
@@ -0,0 +1,52 @@
+import os
+
+from cloud_functions_test.cpu_profiling import add_cpu_profiling
+from cloud_functions_test.cpu_profiling import collapse_stacks
+from cloud_functions_test.cpu_profiling import collect_profile
+from cloud_functions_test.functions import create_shim
+from cloud_functions_test.inprocess import InProcessSession
+from cloud_functions_test.test_classes.base_test import EXECUTION_ID_HEADER
+from cloud_functions_test.test_classes.http_test import HttpFunctionTest
+
+
+def test_cpu_profiling(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text(
+        "def square_sum(n):\n"
+        "    return sum(i * i for i in range(n))\n"
+        "\n"
+        "def main(request):\n"
+        "    return (str(square_sum(10000)), 200)\n"
+    )
+    profile_dir = tmp_path / "profiles"
+    profile_dir.mkdir()
+
+    shim_path = str(tmp_path / "profiled.py")
+    create_shim(shim_path, str(source), "main")
+    entrypoint = add_cpu_profiling(shim_path, "main", "profile_entrypoint", str(profile_dir))
+    session = InProcessSession(shim_path, entrypoint)
+
+    class A:
+        data = {}
+
+    test = HttpFunctionTest(A)
+    # two invocations of the test are merged in its profile
+    for _ in range(2):
+        response = session.post("http://localhost", headers={EXECUTION_ID_HEADER: test.execution_id}, json={})
+        assert response.text == str(sum(i * i for i in range(10000)))
+    assert len(os.listdir(profile_dir)) == 2
+
+    stats = collect_profile(test, str(profile_dir))
+    assert sorted(os.listdir(profile_dir)) == ["A.collapsed", "A.pstats"]
+    assert stats.total_calls > 0
+    assert [values[1] for function, values in stats.stats.items() if function[2] == "square_sum"] == [2]
+
+    # the stacks start at the entrypoint and the time of the generator is under square_sum
+    stacks = dict(collapse_stacks(stats))
+    assert all(stack.startswith("main.py:4(main)") for stack in stacks)
+    assert any(stack.endswith("main.py:1(square_sum);<built-in method builtins.sum>;main.py:2(<genexpr>)") for stack in stacks)
+    with open(profile_dir / "A.collapsed") as file:
+        assert len(file.readlines()) == len(stacks)
+
+    # no profile for a test that was not invoked
+    assert collect_profile(HttpFunctionTest(A), str(profile_dir)) is None
@@ -1,6 +1,9 @@
 import pytest
 
 from cloud_functions_test.exceptions import InvalidTerraformFileError
+from cloud_functions_test.environment import load_terraform_limits
+from cloud_functions_test.environment import load_terraform_scaling
+from cloud_functions_test.environment import load_terraform_timeout
 from cloud_functions_test.environment import parse_terraform_env_str
 
 
@@ -17,6 +20,10 @@ def test_parse_terraform_env_str():
     input_str = '{VAR1="${var.env}", VAR2="var.env"}'
     expected_output = {'VAR1': 'dev', 'VAR2': 'dev'}
     assert parse_terraform_env_str(input_str) == expected_output
+    # values containing commas and equal signs
+    input_str = '{URL="https://example.com/?a=1,b=2", VAR2 = "x"}'
+    expected_output = {'URL': 'https://example.com/?a=1,b=2', 'VAR2': 'x'}
+    assert parse_terraform_env_str(input_str) == expected_output
     # malformed input (missing '=')
     input_str = '{VAR1 "value1"}'
     with pytest.raises(InvalidTerraformFileError):
@@ -29,3 +36,49 @@ def test_parse_terraform_env_str():
     input_str = '{}'
     with pytest.raises(InvalidTerraformFileError):
         parse_terraform_env_str(input_str)
+
+
+def test_load_terraform_timeout(tmp_path):
+    location = tmp_path / "main.tf"
+    location.write_text('module "function" {\n  memory_mb   = 512\n  timeout     = 540\n}\n')
+    assert load_terraform_timeout(str(location)) == 540
+    location.write_text('resource "google_cloudfunctions2_function" "function" {\n  service_config {\n    timeout_seconds = 60\n  }\n}\n')
+    assert load_terraform_timeout(str(location)) == 60
+    location.write_text('module "function" {\n  memory_mb = 512\n}\n')
+    assert load_terraform_timeout(str(location)) is None
+
+
+def test_load_terraform_limits(tmp_path):
+    location = tmp_path / "main.tf"
+    location.write_text('module "function" {\n  available_memory_mb = 256\n  timeout = 60\n}\n')
+    assert load_terraform_limits(str(location)) == {"memory_mb": 256, "timeout": 60, "max_concurrency": None}
+    location.write_text(
+        'resource "google_cloudfunctions2_function" "function" {\n'
+        '  service_config {\n'
+        '    available_memory = "1Gi"\n'
+        '    timeout_seconds = 120\n'
+        '    max_instance_request_concurrency = 80\n'
+        '  }\n'
+        '}\n'
+    )
+    assert load_terraform_limits(str(location)) == {"memory_mb": 1024, "timeout": 120, "max_concurrency": 80}
+    location.write_text('resource "google_cloudfunctions2_function" "function" {\n  available_memory = "512M"\n}\n')
+    assert load_terraform_limits(str(location))["memory_mb"] == 488
+
+
+def test_load_terraform_scaling(tmp_path):
+    location = tmp_path / "main.tf"
+    location.write_text('module "function" {\n  max_instances = 10\n  min_instances = 1\n}\n')
+    assert load_terraform_scaling(str(location)) == {"min_instances": 1, "max_instances": 10, "max_concurrency": None}
+    location.write_text(
+        'resource "google_cloudfunctions2_function" "function" {\n'
+        '  service_config {\n'
+        '    max_instance_count = 100\n'
+        '    max_instance_request_concurrency = 80\n'
+        '  }\n'
+        '}\n'
+    )
+    assert load_terraform_scaling(str(location)) == {"min_instances": None, "max_instances": 100, "max_concurrency": 80}
+    # no limit on the number of instances
+    location.write_text('module "function" {\n  max_instances = 0\n}\n')
+    assert load_terraform_scaling(str(location))["max_instances"] is None
@@ -1,6 +1,28 @@
+import datetime
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
 import pytest
+from requests import ReadTimeout
 
+from cloud_functions_test.exceptions import MissingTestClassError
+from cloud_functions_test.exceptions import PortUnavailableError
+from cloud_functions_test.exceptions import ServerStartupError
+from cloud_functions_test.functions import add_event_wrapper
+from cloud_functions_test.functions import cache_shim
+from cloud_functions_test.functions import create_shim
 from cloud_functions_test.functions import create_tests
+from cloud_functions_test.functions import find_available_ports
+from cloud_functions_test.functions import first_cases
+from cloud_functions_test.functions import make_test_request
+from cloud_functions_test.functions import measure_test_latency
+from cloud_functions_test.functions import run_tests
+from cloud_functions_test.functions import wait_for_server
+from cloud_functions_test.inprocess import InProcessSession
 from cloud_functions_test.test_classes.event_test import EventFunctionTest
 from cloud_functions_test.test_classes.http_test import HttpFunctionTest
 
@@ -28,3 +50,206 @@ def test_create_tests():
     for test in tests:
         assert isinstance(test, EventFunctionTest)
         assert class_name == EventFunctionTest
+
+
+def test_wait_for_server():
+    # process exiting before the server is ready
+    process = subprocess.Popen([sys.executable, '-c', 'import sys; sys.exit("boom")'], stderr=subprocess.PIPE)
+    with pytest.raises(ServerStartupError, match="boom"):
+        wait_for_server(process, 0, "main", 5)
+    # process accepting connections
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        s.listen()
+        port = s.getsockname()[1]
+        process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)'])
+        try:
+            assert wait_for_server(process, port, "main", 5) < 5
+        finally:
+            process.terminate()
+    # server never ready
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with pytest.raises(ServerStartupError):
+        wait_for_server(process, port, "main", 0.1)
+    # the server is reaped and its pipes closed before the error is raised
+    assert process.returncode is not None
+    assert process.stdout.closed and process.stderr.closed
+
+
+def test_find_available_ports():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        s.listen()
+        port = s.getsockname()[1]
+        ports = find_available_ports(port, 2)
+        assert len(ports) == 2
+        assert port not in ports
+        assert all(p > port for p in ports)
+    with pytest.raises(PortUnavailableError):
+        find_available_ports(65536, 1)
+
+
+def test_run_tests_with_cases(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text("def main(request):\n    return {'double': request.get_json()['value'] * 2}\n")
+    cases_file = tmp_path / "cases.jsonl"
+    cases_file.write_text("\n".join(
+        json.dumps({"data": {"value": value}, "output": {"double": value * 2 if value != 7 else 0}})
+        for value in range(250)
+    ) + "\n\n")
+
+    class FileCases:
+        cases = str(cases_file)
+
+    class GeneratorCases:
+        def cases():
+            for value in range(3):
+                yield ({"value": value}, None, {"double": value * 2})
+
+    tests, _ = create_tests([FileCases, GeneratorCases])
+    failures, successes = run_tests([(None, "http://localhost")], tests, InProcessSession(str(source), "main"))
+    assert tests[0].result[0] == "failed"
+    assert failures == [[("test FileCases: 1 of 250 cases failed", "CYAN"), ("test FileCases[7]", "CYAN"),
+                         "Unexpected output", "- expected: {'double': 0}", "- received: {'double': 14}"]]
+    assert successes == [[]]
+
+
+def test_make_test_request_timeout():
+
+    class HangingSession:
+        def post(self, **params):
+            self.timeout = params['timeout']
+            raise ReadTimeout()
+
+    class DummyClass:
+        timeout = 2
+
+    session = HangingSession()
+    test = HttpFunctionTest(DummyClass)
+    assert make_test_request(test, "http://localhost", session)
+    assert session.timeout == 2
+    assert test.response is None
+    assert test.timed_out == "No response within the timeout of 2s"
+    assert test.timeout_result("", "")[0] == "failed"
+
+    # the deadline of the suite is closer than the timeout of the test
+    test = HttpFunctionTest(DummyClass)
+    assert make_test_request(test, "http://localhost", session, time.monotonic() + 0.5)
+    assert session.timeout <= 0.5
+    assert test.timed_out == "No response before the end of the time budget of the suite"
+
+    test = HttpFunctionTest(DummyClass)
+    assert not make_test_request(test, "http://localhost", session, time.monotonic() - 1)
+    assert test.timed_out == "Not run, the time budget of the suite was exhausted"
+
+
+def test_add_event_wrapper(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text(
+        "import sys\n"
+        "\n"
+        "def main(event, context):\n"
+        "    sys.stderr.write('only a warning\\n')\n"
+        "    if event != context:\n"
+        "        raise ValueError('different')\n"
+    )
+
+    shim_path = str(tmp_path / "event.py")
+    entrypoint = add_event_wrapper(shim_path, create_shim(shim_path, str(source), "main"), "event_entrypoint")
+    session = InProcessSession(shim_path, entrypoint)
+
+    class Matching:
+        event = {"a": 1}
+        context = {"a": 1}
+
+    class Different:
+        event = {"a": 1}
+        context = {"b": 2}
+        error = True
+
+    tests, _ = create_tests([Matching, Different])
+    for test in tests:
+        test.make_post_request("http://localhost", session)
+    result = EventFunctionTest.extract_event_result(tests[0].response)
+    assert result["success"] and result["exception"] is None and result["duration"] >= 0
+    result = EventFunctionTest.extract_event_result(tests[1].response)
+    assert not result["success"] and result["exception"] == "ValueError"
+    assert f'File "{source}", line 6, in main' in result["traceback"]
+    # what the function writes on stderr is not a crash
+    assert tests[0].check_response_validity(*tests[0].response.logs)[0] == "passed"
+    assert tests[1].check_response_validity(*tests[1].response.logs)[0] == "passed"
+
+
+def test_create_shim(tmp_path):
+    # the source imports a sibling module, which a copy of the source in another directory could not do
+    (tmp_path / "helpers.py").write_text("def double(value):\n    return value * 2\n")
+    source = tmp_path / "main.py"
+    source.write_text("from helpers import double\n\ndef main(request):\n    return {'double': double(request.get_json()['value'])}\n")
+    shim_dir = tmp_path / "shims"
+    shim_dir.mkdir()
+
+    shim_paths = []
+    for _ in range(2):
+        shim_path = str(shim_dir / "shim.py")
+        create_shim(shim_path, str(source), "main")
+        shim_paths.append(cache_shim(shim_path, str(source)))
+    # the same shim is reused
+    assert shim_paths[0] == shim_paths[1]
+    assert [path.name for path in shim_dir.iterdir()] == [os.path.basename(shim_paths[0])]
+    assert os.path.basename(shim_paths[0]).startswith("main_")
+
+    response = InProcessSession(shim_paths[0], "main").post("http://localhost", json={"value": 2})
+    assert response.json() == {"double": 4}
+
+
+def test_measure_test_latency_timeout():
+
+    class HangingSession:
+        def __init__(self):
+            self.requests = 0
+
+        def post(self, **params):
+            self.requests += 1
+            raise ReadTimeout()
+
+    class Response:
+        elapsed = datetime.timedelta(seconds=0.25)
+
+    class DummyClass:
+        timeout = 2
+
+    restarts = []
+    session = HangingSession()
+    test = HttpFunctionTest(DummyClass)
+    test.response = Response()
+    # the sample that times out stops the measure and the server stuck with it is restarted
+    assert measure_test_latency(test, "http://localhost", session, 5, None, lambda: restarts.append(1)) == 0.25
+    assert session.requests == 1
+    assert restarts == [1]
+
+    # no sample is taken once the deadline of the suite is reached
+    session = HangingSession()
+    assert measure_test_latency(test, "http://localhost", session, 5, time.monotonic() - 1) == 0.25
+    assert session.requests == 0
+
+
+def test_first_cases():
+
+    class Plain:
+        data = {"a": 1}
+
+    class Cases:
+        case_fields = ["data"]
+
+        def cases():
+            yield [{"a": 2}]
+            yield [{"a": 3}]
+
+    class NoCase:
+        def cases():
+            return iter([])
+
+    tests = first_cases([HttpFunctionTest(Plain), HttpFunctionTest(Cases), HttpFunctionTest(NoCase)])
+    assert [(test.name, test.data) for test in tests] == [("Plain", {"a": 1}), ("Cases[0]", {"a": 2})]
+    with pytest.raises(MissingTestClassError):
+        first_cases([HttpFunctionTest(NoCase)])
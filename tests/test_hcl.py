@@ -0,0 +1,72 @@
+import pytest
+
+from cloud_functions_test.exceptions import InvalidTerraformFileError
+from cloud_functions_test.hcl import Expression
+from cloud_functions_test.hcl import parse_hcl
+from cloud_functions_test.hcl import parse_hcl_expression
+
+
+def test_parse_hcl():
+    root = parse_hcl(
+        '# functions\n'
+        'module "orders" {\n'
+        '  source = "../modules/function" // shared module\n'
+        '  environment_variables = {\n'
+        '    ENV     = var.env,\n'
+        '    URL     = "https://example.com/a?b=1,c=2"\n'
+        '    "NAME"  = "orders_${var.env}"\n'
+        '    BUCKET  = google_storage_bucket.bucket.name\n'
+        '    LIST    = ["a",\n'
+        '      "b"]\n'
+        '    /* disabled\n'
+        '    OLD = 1 */\n'
+        '  }\n'
+        '  memory_mb = 512\n'
+        '  script = <<-EOT\n'
+        '    echo ${var.env}\n'
+        '  EOT\n'
+        '}\n'
+        'resource "google_cloudfunctions2_function" "payments" {\n'
+        '  service_config { timeout_seconds = 60 }\n'
+        '}\n',
+        "main.tf",
+        {"var.env": "dev"},
+    )
+    orders, payments = root.blocks
+    assert (orders.type, orders.labels, orders.line) == ("module", ["orders"], 2)
+    assert orders.attributes["environment_variables"] == {
+        "ENV": "dev",
+        "URL": "https://example.com/a?b=1,c=2",
+        "NAME": "orders_dev",
+        "BUCKET": "google_storage_bucket.bucket.name",
+        "LIST": ["a", "b"],
+    }
+    assert isinstance(orders.attributes["environment_variables"]["BUCKET"], Expression)
+    assert orders.attributes["memory_mb"] == 512
+    assert orders.attributes["script"] == "echo dev\n"
+    assert payments.labels == ["google_cloudfunctions2_function", "payments"]
+    assert payments.blocks[0].type == "service_config"
+    assert payments.blocks[0].attributes == {"timeout_seconds": 60}
+
+
+def test_parse_hcl_expression():
+    assert parse_hcl_expression('"a\\"b\\u00e9 $${literal}"') == 'a"bé ${literal}'
+    assert parse_hcl_expression('-1.5') == -1.5
+    assert parse_hcl_expression('"${var.enabled}"', {"var.enabled": True}) is True
+    assert parse_hcl_expression('"n=${var.count}"', {"var.count": 3}) == "n=3"
+    assert parse_hcl_expression('"x_${local.name}"') == "x_${local.name}"
+    assert parse_hcl_expression('var.a ? "b" : "c"') == 'var.a ? "b" : "c"'
+    assert parse_hcl_expression('merge(var.a, { b = 1 })') == "merge(var.a, { b = 1 })"
+    assert parse_hcl_expression('{ for k, v in var.m : k => upper(v) }') == "{ for k, v in var.m : k => upper(v) }"
+    assert parse_hcl_expression('{ a: [1, 2], "b c" = null }') == {"a": [1, 2], "b c": None}
+
+
+@pytest.mark.parametrize("text, message", [
+    ('module "a" {\n  x = \n}\n', "main.tf:2: expected a value"),
+    ('module "a" {\n  x = "unterminated\n}\n', "main.tf:2: unterminated string"),
+    ('module "a" {\n  x = 1 y = 2\n}\n', "main.tf:2: expected a newline"),
+    ('module "a" {\n  x = 1\n', "main.tf:3: expected '}'"),
+])
+def test_parse_hcl_errors(text, message):
+    with pytest.raises(InvalidTerraformFileError, match=message):
+        parse_hcl(text, "main.tf")
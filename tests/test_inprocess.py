@@ -0,0 +1,66 @@
+from typing import Dict
+from typing import List
+from typing import Union
+
+from cloud_functions_test.inprocess import InProcessSession
+from cloud_functions_test.test_classes.http_test import HttpFunctionTest
+
+
+def test_in_process_session(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text(
+        "import logging\n"
+        "\n"
+        "def main(request):\n"
+        "    value = request.get_json()\n"
+        "    print('received', value)\n"
+        "    logging.warning('checking a')\n"
+        "    if 'a' not in value:\n"
+        "        raise ValueError('missing a')\n"
+        "    return ({**value, 'b': 2}, 200)\n"
+    )
+    session = InProcessSession(str(source), "main")
+
+    # successful call
+    response = session.post("http://localhost", json={"a": 1})
+    assert response.status_code == 200
+    assert response.json() == {"a": 1, "b": 2}
+    assert response.exception is None
+    assert response.elapsed.total_seconds() > 0
+    error_logs, standard_logs = response.logs
+    assert error_logs == ""
+    assert "received {'a': 1}" in standard_logs
+    assert "WARNING:root:checking a" in standard_logs
+
+    # the Exception raised by the function is captured
+    response = session.post("http://localhost", json={"c": 1})
+    assert response.status_code == 500
+    assert isinstance(response.exception, ValueError)
+    error_logs, _ = response.logs
+    assert "ValueError: missing a" in error_logs
+
+
+def test_large_json_response_streamed(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text(
+        "def main(request):\n"
+        "    return {'items': [{'id': index, 'name': f'item {index}'} for index in range(40000)]}\n"
+    )
+    session = InProcessSession(str(source), "main")
+
+    class LargeOutput:
+        output = {"items": List[Dict[str, Union[int, str]]]}
+
+    class LargeOutputMismatch:
+        output = {"items": [{"id": 0, ...: ...}, {"id": 2, ...: ...}, ...]}
+
+    test = HttpFunctionTest(LargeOutput)
+    test.make_post_request("http://localhost", session)
+    assert test.output_streamed
+    assert test.check_response_validity("", "")[0] == "passed"
+
+    test = HttpFunctionTest(LargeOutputMismatch)
+    test.make_post_request("http://localhost", session)
+    status, display_message = test.check_response_validity("", "")
+    assert status == "failed"
+    assert display_message[-3:] == ["Unexpected output at $.items[1].id", "- expected: 2", "- received: 1"]
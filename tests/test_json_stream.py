@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from cloud_functions_test.json_stream import JsonStream
+from cloud_functions_test.json_stream import format_json_path
+
+
+def split(document: bytes, size: int) -> list:
+    return [document[start:start + size] for start in range(0, len(document), size)]
+
+
+def test_json_stream():
+    value = {"a": [1, 2.5, -3e2, True, False, None, "q\"\\u00e9 é"], "b c": {"d": []}, "e": {}, "f": -0.25}
+    document = json.dumps(value, ensure_ascii=False).encode('utf-8')
+    # the tokens and the multi-byte characters split between two chunks are read whole
+    for size in (1, 2, 3, 7, len(document)):
+        stream = JsonStream(split(document, size))
+        assert stream.read_event() == ("start_map", None)
+        assert stream.end_of_container() is False
+        assert stream.read_event() == ("key", "a")
+        assert stream.read_event() == ("start_array", None)
+        elements = []
+        while not stream.end_of_container():
+            elements.append(stream.read_event()[1])
+        assert elements == value["a"]
+        assert stream.end_of_container() is False
+        assert stream.read_event() == ("key", "b c")
+        assert stream.read_value() == {"d": []}
+        assert stream.end_of_container() is False
+        assert stream.read_event() == ("key", "e")
+        stream.skip_value()
+        assert stream.end_of_container() is False
+        assert stream.read_event() == ("key", "f")
+        assert stream.read_value() == -0.25
+        assert stream.end_of_container() is True
+        stream.read_end()
+
+    for document in (b'{"a" 1}', b'[1,]', b'[1', b'{"a": tru}', b'[1] 2', b'-', b''):
+        stream = JsonStream(split(document, 1))
+        with pytest.raises(ValueError):
+            if stream.read_event()[0] == "start_array":
+                while not stream.end_of_container():
+                    stream.read_value()
+            elif stream.read_event() == ("key", "a"):
+                stream.read_value()
+            stream.read_end()
+
+
+def test_format_json_path():
+    assert format_json_path("$", "items") == "$.items"
+    assert format_json_path("$.items", 3) == "$.items[3]"
+    assert format_json_path("$", "a b") == '$["a b"]'
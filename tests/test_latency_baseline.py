@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from cloud_functions_test.latency_baseline import apply_baseline
+from cloud_functions_test.latency_baseline import load_baseline
+from cloud_functions_test.latency_baseline import write_baseline
+from cloud_functions_test.exceptions import InvalidBaselineFileError
+from cloud_functions_test.test_classes.http_test import HttpFunctionTest
+
+
+def test_baseline(tmp_path):
+
+    class A:
+        data = {}
+
+    class B:
+        data = {}
+        max_latency = 0.5
+
+    location = tmp_path / "baseline.json"
+    # missing file
+    assert load_baseline(str(location)) == {}
+    # record the latencies measured, keeping those of other tests
+    location.write_text(json.dumps({"C": 0.3}))
+    tests = [HttpFunctionTest(A), HttpFunctionTest(B)]
+    tests[0].latency = 0.1
+    write_baseline(tests, str(location))
+    assert load_baseline(str(location)) == {"A": 0.1, "C": 0.3}
+    # only the tests in the baseline are compared to it
+    tests = [HttpFunctionTest(A), HttpFunctionTest(B)]
+    apply_baseline(tests, load_baseline(str(location)), 20)
+    assert tests[0].measure_latency and tests[0].baseline_latency == 0.1
+    assert tests[1].measure_latency and tests[1].baseline_latency is None
+    # invalid file
+    location.write_text("[1, 2]")
+    with pytest.raises(InvalidBaselineFileError):
+        load_baseline(str(location))
+
+
+def test_check_latency():
+
+    class A:
+        max_latency = 0.5
+
+    test = HttpFunctionTest(A)
+    # not measured
+    assert test.check_latency() == []
+    test.latency = 0.4
+    assert test.check_latency() == []
+    test.latency = 0.6
+    assert test.check_latency()[0] == "Latency above the budget"
+    # baseline with a 20% tolerance
+    test.latency = 0.11
+    test.baseline_latency = 0.1
+    test.baseline_tolerance = 20
+    assert test.check_latency() == []
+    test.latency = 0.13
+    assert test.check_latency()[0] == "Latency regression compared to the baseline"
@@ -0,0 +1,45 @@
+import subprocess
+import sys
+
+from cloud_functions_test.functions import create_shim
+from cloud_functions_test.inprocess import InProcessSession
+from cloud_functions_test.limits import PEAK_RSS_HEADER
+from cloud_functions_test.limits import add_limits_emulation
+from cloud_functions_test.limits import parse_peak_rss_header
+from cloud_functions_test.limits import server_limits_env
+
+
+def test_add_limits_emulation(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text(
+        "def main(request):\n"
+        "    data = bytearray(int(request.args.get('mb', 1)) * 2 ** 20)\n"
+        "    data[::4096] = b'x' * len(data[::4096])\n"
+        "    return ('OK', 200)\n"
+    )
+
+    # without memory limit, the peak RSS of each invocation is reported
+    shim_path = str(tmp_path / "limits.py")
+    create_shim(shim_path, str(source), "main")
+    entrypoint = add_limits_emulation(shim_path, "main", "limits_entrypoint")
+    assert entrypoint == "limits_entrypoint"
+    response = InProcessSession(shim_path, entrypoint).post("http://localhost", json={})
+    assert response.text == "OK"
+    assert parse_peak_rss_header(response.headers[PEAK_RSS_HEADER]) > 2 ** 20
+    assert parse_peak_rss_header(None) is None
+
+    # the memory limit is set when the shim is loaded, in a separate process not to limit the tests
+    limited_shim_path = str(tmp_path / "limited.py")
+    create_shim(limited_shim_path, str(source), "main")
+    add_limits_emulation(limited_shim_path, "main", "limits_entrypoint", 64)
+    completed_process = subprocess.run(
+        [sys.executable, '-c', f"import runpy; runpy.run_path({limited_shim_path!r}); bytearray(128 * 2 ** 20)"],
+        stderr=subprocess.PIPE,
+    )
+    assert completed_process.returncode != 0
+    assert b"MemoryError" in completed_process.stderr
+
+
+def test_server_limits_env():
+    assert server_limits_env(None) == {'THREADS': '1'}
+    assert server_limits_env(80) == {'THREADS': '80'}
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import time
+
+from cloud_functions_test.log_collector import LogCollector
+
+
+def test_log_collector():
+    # the process writes more than a pipe can hold, then waits to be told to write again
+    script = (
+        "import sys\n"
+        "print('x' * 100000, flush=True)\n"
+        "for line in sys.stdin:\n"
+        "    print('out ' + line.strip(), flush=True)\n"
+        "    print('err ' + line.strip(), file=sys.stderr, flush=True)\n"
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-c', script], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    try:
+        log_collector = LogCollector(process, buffer_size=10)
+        time.sleep(0.1)
+        log_collector.sync()
+        assert log_collector.slice(0, time.monotonic()) == [('stdout', 'x' * 100000 + '\n')]
+        for index in range(3):
+            start = time.monotonic()
+            process.stdin.write(f"{index}\n".encode('utf-8'))
+            process.stdin.flush()
+            time.sleep(0.1)
+            log_collector.sync()
+            lines = log_collector.slice(start, time.monotonic())
+            assert sorted(lines) == [('stderr', f'err {index}\n'), ('stdout', f'out {index}\n')]
+    finally:
+        process.stdin.close()
+        process.wait(5)
+    # the buffer is emptied by the slices and the collector stops with the process
+    log_collector.thread.join(5)
+    assert log_collector.closed
+    assert not log_collector.buffer
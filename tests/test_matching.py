@@ -1,3 +1,4 @@
+import json
 import re
 from typing import Any
 from typing import Dict
@@ -9,6 +10,9 @@ from typing import _SpecialForm
 
 import pytest
 
+from cloud_functions_test.json_stream import JsonStream
+from cloud_functions_test.matching import compile_matcher
+from cloud_functions_test.matching import compile_stream_matcher
 from cloud_functions_test.matching import partial_matching
 
 
@@ -82,4 +86,67 @@ def test_partial_matching():
     assert partial_matching({"a": Tuple[dict, List[int]], "b": 1, Ellipsis:Ellipsis}, {"a": [{"a": 1}, [1, "a"]], "b": Any, "c": 1}) == False
     assert partial_matching(Dict[str, str], [1, 2, 3]) == False
     assert partial_matching(Tuple[int, int], [1, 2, 3]) == False
-    assert partial_matching(Tuple[int, int], [1, 2]) == True
\ No newline at end of file
+    assert partial_matching(Tuple[int, int], [1, 2]) == True
+
+def test_compile_matcher():
+    # a compiled matcher can be reused for several actual objects
+    matcher = compile_matcher(List[Dict[str, int]])
+    assert matcher([{"a": 1}, {"b": 2}]) == True
+    assert matcher([{"a": 1}, {"b": "2"}]) == False
+    assert matcher([]) == True
+    assert matcher({"a": 1}) == False
+    matcher = compile_matcher([1, Ellipsis])
+    assert matcher([1, 2, 3]) == True
+    assert matcher([2, 1]) == False
+    # keys of a partial dict missing from the actual dict
+    matcher = compile_matcher({"a": 1, "b": Ellipsis, Ellipsis: Ellipsis})
+    assert matcher({"a": 1, "b": 2, "c": 3}) == True
+    assert matcher({"a": 1, "c": 3}) == False
+    assert compile_matcher({"a": 1, Ellipsis: Ellipsis})({"b": 1}) == False
+    # tuples as expected objects are treated as lists
+    assert compile_matcher((1, str))([1, "a"]) == True
+
+
+def test_compile_stream_matcher():
+
+    def match_stream(expected, actual):
+        stream = JsonStream([json.dumps(actual).encode('utf-8')])
+        mismatch = compile_stream_matcher(expected)(stream, "$")
+        if mismatch is None:
+            stream.read_end()
+        return mismatch, stream
+
+    value = {"items": [{"id": 1, "tags": ["a"]}, {"id": 2, "tags": []}], "total": 2, "next": None}
+    for expected in (
+        {"items": List[Dict[str, Any]], "total": int, "next": None},
+        {"items": [{"id": int, ...: ...}, ...], ...: ...},
+        {"items": [{"id": 1, "tags": Ellipsis}, {"id": 2, "tags": list}], "total": 2, "next": Any},
+        Any,
+    ):
+        assert compile_matcher(expected)(value)
+        assert match_stream(expected, value)[0] is None
+
+    # the first mismatch is reported with its path and the rest of the value is not read
+    mismatch, stream = match_stream({"items": [{"id": str, ...: ...}, ...], ...: ...}, value)
+    assert mismatch == ("$.items[0].id", str, 1)
+    assert stream.end_of_container() is False
+    assert stream.read_event() == ("key", "tags")
+    assert match_stream({"items": List[Dict[str, int]], ...: ...}, value)[0] == ("$.items[0]", Dict[str, int], {"id": 1, "tags": ["a"]})
+    assert match_stream({"items": [dict], ...: ...}, value)[0] == ("$.items", [dict], "an array of more than 1 elements")
+    assert match_stream({"items": list, "total": 2}, value)[0] == ("$", {"items": list, "total": 2}, "an object with the unexpected key 'next'")
+    assert match_stream({"items": list, "count": 2, ...: ...}, value)[0] == ("$", {"items": list, "count": 2, ...: ...}, "an object without the key 'count'")
+    assert match_stream([int], {"a": 1})[0] == ("$", [int], "an object")
+
+
+def test_compile_stream_matcher_split_numbers():
+    value = {"a": 1.5, "b": [10, -2e3, 0.25, 1E+2], "c": 12345}
+    document = json.dumps(value).encode('utf-8')
+    matchers = [compile_stream_matcher(value), compile_stream_matcher({"a": float, "b": [..., ...], "c": Any})]
+    # every chunk size splits some of the numbers, none of them is read cut short
+    for size in range(1, len(document) + 1):
+        for matcher in matchers:
+            stream = JsonStream([document[index:index + size] for index in range(0, len(document), size)])
+            assert matcher(stream, "$") is None, size
+            stream.read_end()
+    assert compile_stream_matcher({"a": 1.5})(JsonStream([b'{"a": 1.', b'5}']), "$") is None
+    assert compile_stream_matcher({"a": 1})(JsonStream([b'{"a": 1', b'e3}']), "$") == ("$.a", 1, 1000.0)
@@ -0,0 +1,62 @@
+from cloud_functions_test.environment import load_terraform_memory
+from cloud_functions_test.functions import create_shim
+from cloud_functions_test.inprocess import InProcessSession
+from cloud_functions_test.memory_profiling import MEMORY_HEADER
+from cloud_functions_test.memory_profiling import add_memory_profiling
+from cloud_functions_test.memory_profiling import parse_memory_header
+from cloud_functions_test.test_classes.http_test import HttpFunctionTest
+
+
+def test_memory_profiling(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text(
+        "def main(request):\n"
+        "    data = bytearray(4 * 2 ** 20)\n"
+        "    return ('OK', 200)\n"
+    )
+
+    shim_path = str(tmp_path / "profiled.py")
+    create_shim(shim_path, str(source), "main")
+    entrypoint = add_memory_profiling(shim_path, "main", "memory_entrypoint")
+    assert entrypoint == "memory_entrypoint"
+    response = InProcessSession(shim_path, entrypoint).post("http://localhost", json={})
+    assert response.text == "OK"
+    memory_usage = parse_memory_header(response.headers[MEMORY_HEADER])
+    assert 4 * 2 ** 20 <= memory_usage["peak_traced"] < 5 * 2 ** 20
+    assert memory_usage["rss"] > 0
+    assert memory_usage["peak_rss"] >= memory_usage["rss"]
+
+    assert parse_memory_header(None) is None
+    assert parse_memory_header("1,2,3") is None
+
+    # comparison to the memory available to the function
+    class A:
+        data = {}
+
+    test = HttpFunctionTest(A)
+
+    class Response:
+        # the RSS went back down after the invocation, its peak is what the function needed
+        headers = {MEMORY_HEADER: f"{2 ** 20},0,{200 * 2 ** 20},{300 * 2 ** 20}"}
+
+    test.response = Response
+    assert test.check_memory() == []
+    assert test.memory_usage == {"peak_traced": 2 ** 20, "rss_delta": 0, "rss": 200 * 2 ** 20, "peak_rss": 300 * 2 ** 20}
+    test.memory_limit_mb = 512
+    assert test.check_memory() == []
+    test.memory_limit_mb = 256
+    assert test.check_memory() == [
+        "Memory above the memory available to the function",
+        "- expected: at most 256 MB",
+        "- received: 300.0 MB",
+    ]
+
+
+def test_load_terraform_memory(tmp_path):
+    location = tmp_path / "main.tf"
+    location.write_text('module "function" {\n  memory_mb   = 512\n  timeout = 60\n}\n')
+    assert load_terraform_memory(str(location)) == 512
+    location.write_text('resource "google_cloudfunctions_function" "function" {\n  available_memory_mb = "1024"\n}\n')
+    assert load_terraform_memory(str(location)) == 1024
+    location.write_text('module "function" {\n  timeout = 60\n}\n')
+    assert load_terraform_memory(str(location)) is None
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from cloud_functions_test.exceptions import InvalidCasesFileError
+from cloud_functions_test.replay import compute_window_statistics
+from cloud_functions_test.replay import parse_timestamp
+from cloud_functions_test.replay import read_capture
+
+
+def test_parse_timestamp():
+    assert parse_timestamp(1714564800) == 1714564800.0
+    assert parse_timestamp("2024-05-01T12:00:00Z") == 1714564800.0
+    assert parse_timestamp("2024-05-01T12:00:00.500+00:00") == 1714564800.5
+
+
+def test_read_capture(tmp_path):
+    capture = tmp_path / "capture.jsonl"
+    capture.write_text(
+        json.dumps({"timestamp": 10, "headers": {"a": "1"}, "body": {"b": 2}}) + "\n"
+        + json.dumps({"timestamp": 11.5}) + "\n"
+    )
+    assert list(read_capture(str(capture))) == [
+        (10.0, {"headers": {"a": "1"}, "data": {"b": 2}}),
+        (11.5, {"headers": None, "data": None}),
+    ]
+    capture.write_text(json.dumps({"body": {}}) + "\n")
+    with pytest.raises(InvalidCasesFileError):
+        list(read_capture(str(capture)))
+
+
+def test_compute_window_statistics():
+    statistics = compute_window_statistics(2.0, 2.0, {
+        "requests": 5, "latencies": [0.4, 0.1, 0.3, 0.2], "errors": {"invalid request": 1}, "lag": 0.5
+    })
+    assert statistics["start"] == 2.0
+    assert statistics["requests"] == 5
+    assert statistics["requests_per_second"] == 2.5
+    assert statistics["p50"] == pytest.approx(0.25)
+    assert statistics["max"] == 0.4
+    assert statistics["errors"] == {"invalid request": 1}
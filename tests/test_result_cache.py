@@ -0,0 +1,92 @@
+import json
+import os
+import time
+
+from cloud_functions_test.result_cache import compute_cache_keys
+from cloud_functions_test.result_cache import load_result_cache
+from cloud_functions_test.result_cache import lookup_cached_results
+from cloud_functions_test.result_cache import result_cache_path
+from cloud_functions_test.result_cache import update_result_cache
+from cloud_functions_test.test_classes.http_test import HttpFunctionTest
+
+
+def test_result_cache(tmp_path):
+
+    class A:
+        data = {"a": 1}
+        display_logs = True
+
+    class B:
+        data = {"a": 2}
+
+    class Slow:
+        data = {}
+        max_latency = 0.5
+
+    source = tmp_path / "main.py"
+    source.write_text("def main(request): pass\n")
+    env = tmp_path / ".env"
+    location = str(tmp_path / "cache.json")
+    tests = [HttpFunctionTest(A), HttpFunctionTest(B), HttpFunctionTest(Slow)]
+    keys = compute_cache_keys(tests, str(source), str(env), "main")
+    assert load_result_cache(location) == {}
+
+    # only the tests that passed and do not check their latency are cached
+    tests[0].result = ("passed", [("test A", "CYAN"), "Output:"])
+    tests[1].result = ("failed", ["Unexpected output"])
+    tests[2].result = ("passed", [])
+    update_result_cache(location, tests, keys, 7, 10)
+    tests_to_run, cached_successes = lookup_cached_results(tests, load_result_cache(location), keys)
+    assert [test.name for test in tests_to_run] == ["B", "Slow"]
+    assert cached_successes == [[("test A", "CYAN"), "Output:"]]
+
+    # the keys change with the attributes of the test, the source and the env file
+    A.data = {"a": 3}
+    assert compute_cache_keys([HttpFunctionTest(A)], str(source), str(env), "main")["A"] != keys["A"]
+    A.data = {"a": 1}
+    assert compute_cache_keys([HttpFunctionTest(A)], str(source), str(env), "main")["A"] == keys["A"]
+    env.write_text("A=1\n")
+    assert compute_cache_keys(tests, str(source), str(env), "main")["A"] != keys["A"]
+    keys = compute_cache_keys(tests, str(source), str(env), "main")
+    # as do the modules next to the source, which it may import
+    (tmp_path / "helpers").mkdir()
+    (tmp_path / "helpers" / "format.py").write_text("PREFIX = 'a'\n")
+    assert compute_cache_keys(tests, str(source), str(env), "main")["A"] != keys["A"]
+    assert compute_cache_keys(tests, str(source), str(env), "other")["B"] != compute_cache_keys(tests, str(source), str(env), "main")["B"]
+
+    # eviction of the old entries, then of the oldest ones beyond the maximum number of entries
+    with open(location, 'w') as file:
+        json.dump({
+            "old": {"test": "X", "time": time.time() - 8 * 86400, "message": []},
+            "older": {"test": "Y", "time": time.time() - 2 * 86400, "message": []},
+            "recent": {"test": "Z", "time": time.time() - 86400, "message": []},
+        }, file)
+    update_result_cache(location, tests, keys, 7, 2)
+    assert set(load_result_cache(location)) == {keys["A"], "recent"}
+
+    # an unreadable cache is ignored
+    with open(location, 'w') as file:
+        file.write("{")
+    assert load_result_cache(location) == {}
+
+
+def test_result_cache_default_path(tmp_path, monkeypatch):
+    monkeypatch.setattr("cloud_functions_test.result_cache.RESULT_CACHE_DIR", str(tmp_path / "results"))
+    monkeypatch.chdir(tmp_path)
+    assert result_cache_path("cache.json") == "cache.json"
+
+    # without a cache file, the results are cached out of the working directory, in a file named after it
+    location = result_cache_path(None)
+    assert location.startswith(str(tmp_path / "results"))
+    (tmp_path / "other").mkdir()
+    monkeypatch.chdir(tmp_path / "other")
+    assert result_cache_path(None) != location
+
+    class A:
+        data = {}
+
+    tests = [HttpFunctionTest(A)]
+    tests[0].result = ("passed", [])
+    update_result_cache(None, tests, {"A": "key"}, 7, 10)
+    assert set(load_result_cache(None)) == {"key"}
+    assert os.listdir(tmp_path / "other") == []
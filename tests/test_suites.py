@@ -0,0 +1,12 @@
+from cloud_functions_test.suites import discover_suites
+
+
+def test_discover_suites(tmp_path):
+    for directory in ["b", "a/nested", "c", ".hidden", "node_modules/package", "a/nested/__pycache__"]:
+        (tmp_path / directory).mkdir(parents=True, exist_ok=True)
+        (tmp_path / directory / "cf_tests.py").write_text("")
+    (tmp_path / "c" / "cf_tests.py").unlink()
+    (tmp_path / "c" / "other_tests.py").write_text("")
+    assert discover_suites(str(tmp_path), "cf_tests") == ["a/nested", "b"]
+    assert discover_suites(str(tmp_path), "other_tests") == ["c"]
+    assert discover_suites(str(tmp_path / "b"), "cf_tests") == ["."]
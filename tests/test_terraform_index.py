@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+from cloud_functions_test import terraform_index
+from cloud_functions_test.exceptions import InvalidTerraformFileError
+from cloud_functions_test.terraform_index import build_terraform_index
+from cloud_functions_test.terraform_index import index_file_path
+from cloud_functions_test.terraform_index import select_terraform_function
+
+
+def write_terraform_directory(tmp_path):
+    (tmp_path / "orders").mkdir()
+    (tmp_path / "payments").mkdir()
+    terraform = tmp_path / "terraform"
+    (terraform / ".terraform").mkdir(parents=True)
+    (terraform / "orders.tf").write_text(
+        'module "orders" {\n'
+        '  source_dir = "../orders"\n'
+        '  environment_variables = {\n'
+        '    URL = "https://example.com/?a=1,b=2"\n'
+        '  }\n'
+        '  available_memory_mb = 256\n'
+        '}\n'
+    )
+    (terraform / "payments.tf").write_text(
+        'resource "google_cloudfunctions2_function" "payments" {\n'
+        '  name = "payments-${var.env}"\n'
+        '  service_config {\n'
+        '    available_memory = "1Gi"\n'
+        '    timeout_seconds = 120\n'
+        '    max_instance_count = 10\n'
+        '    environment_variables = { ENV = var.env }\n'
+        '  }\n'
+        '}\n'
+        'resource "google_storage_bucket" "bucket" {\n'
+        '  name = "bucket"\n'
+        '}\n'
+    )
+    # the modules downloaded by Terraform are not functions of the directory
+    (terraform / ".terraform" / "module.tf").write_text('module "downloaded" {\n  memory_mb = 128\n}\n')
+    return terraform
+
+
+def test_select_terraform_function(tmp_path):
+    terraform = write_terraform_directory(tmp_path)
+    orders = select_terraform_function(str(terraform), source=str(tmp_path / "orders" / "main.py"))
+    assert orders["names"] == ["orders"]
+    assert orders["environment_variables"] == {"URL": "https://example.com/?a=1,b=2"}
+    assert orders["memory_mb"] == 256
+    payments = select_terraform_function(str(terraform), name="payments-dev")
+    assert payments["names"] == ["payments", "payments-dev"]
+    assert payments["environment_variables"] == {"ENV": "dev"}
+    assert (payments["memory_mb"], payments["timeout"], payments["max_instances"]) == (1024, 120, 10)
+    assert select_terraform_function(str(terraform), name="payments") == payments
+    with pytest.raises(InvalidTerraformFileError, match="No function named downloaded"):
+        select_terraform_function(str(terraform), name="downloaded")
+    with pytest.raises(InvalidTerraformFileError, match="Several functions"):
+        select_terraform_function(str(terraform), source=str(tmp_path / "main.py"))
+    # the first function of a single file is selected when none matches
+    assert select_terraform_function(str(terraform / "payments.tf"), source=str(tmp_path / "main.py"))["names"][0] == "payments"
+
+
+def test_build_terraform_index_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(terraform_index, "INDEX_DIR", str(tmp_path / "indexes"))
+    terraform = write_terraform_directory(tmp_path)
+    functions = build_terraform_index(str(terraform))
+    assert [function["names"][0] for function in functions] == ["orders", "payments"]
+    with open(index_file_path(str(terraform))) as file:
+        assert sorted(json.load(file)["files"]) == ["orders.tf", "payments.tf"]
+    # nothing is written in the Terraform directory
+    assert sorted(os.listdir(terraform)) == [".terraform", "orders.tf", "payments.tf"]
+
+    # the files not modified since they were indexed are not parsed again, even by another process
+    parsed = []
+    parse_hcl = terraform_index.parse_hcl
+    monkeypatch.setattr(terraform_index, "_read_files", {})
+    monkeypatch.setattr(terraform_index, "parse_hcl", lambda text, path, variables: parsed.append(path) or parse_hcl(text, path, variables))
+    assert build_terraform_index(str(terraform)) == functions
+    assert parsed == []
+    orders = terraform / "orders.tf"
+    orders.write_text(orders.read_text().replace("256", "512"))
+    os.utime(orders, ns=(0, 0))
+    assert build_terraform_index(str(terraform))[0]["memory_mb"] == 512
+    assert parsed == [str(orders)]
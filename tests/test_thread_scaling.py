@@ -0,0 +1,56 @@
+import pytest
+
+from cloud_functions_test.inprocess import InProcessSession
+from cloud_functions_test.test_classes.http_test import HttpFunctionTest
+from cloud_functions_test.thread_scaling import compute_scaling
+from cloud_functions_test.thread_scaling import run_serial
+from cloud_functions_test.thread_scaling import run_thread_level
+from cloud_functions_test.thread_scaling import thread_levels
+
+
+def test_thread_levels():
+    assert thread_levels(1) == [1]
+    assert thread_levels(8) == [1, 2, 4, 8]
+    assert thread_levels(6) == [1, 2, 4, 6]
+
+
+def test_compute_scaling():
+    results = compute_scaling([
+        {"threads": 1, "requests_per_second": 100.0},
+        {"threads": 4, "requests_per_second": 300.0},
+    ])
+    assert results[0]["speedup"] == 1.0
+    assert results[1]["speedup"] == 3.0
+    assert results[1]["efficiency"] == pytest.approx(0.75)
+
+
+def test_run_thread_level(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text(
+        "calls = []\n"
+        "\n"
+        "def main(request):\n"
+        "    calls.append(1)\n"
+        "    if request.get_json().get('count'):\n"
+        "        return {'calls': len(calls)}\n"
+        "    return {'calls': 1 if len(calls) < 5 else 2}\n"
+    )
+    session = InProcessSession(str(source), "main")
+
+    class Count:
+        data = {"count": True}
+
+    class Stable:
+        data = {"count": False}
+
+    tests = [HttpFunctionTest(Count), HttpFunctionTest(Stable)]
+    serial_results = run_serial(tests, "http://localhost", session)
+    # the result of Count differs between its serial invocations, it is not compared
+    assert serial_results == {"Count": None, "Stable": (200, {"calls": 1})}
+
+    result = run_thread_level(tests, "http://localhost", session, 1, 3, serial_results)
+    assert result["threads"] == 1
+    assert result["requests"] == 6
+    assert result["errors"] == 0
+    assert set(result["tests_requests_per_second"]) == {"Count", "Stable"}
+    assert result["differences"] == {"Stable": {"count": 3, "expected": "200, {'calls': 1}", "received": "200, {'calls': 2}"}}
@@ -0,0 +1,39 @@
+import json
+
+from cloud_functions_test.utils import route_execution_logs
+from cloud_functions_test.utils import split_logs
+
+
+def test_split_logs():
+    lines = [
+        ("stdout", "printed\n"),
+        ("stderr", "WARNING:root:warning\n"),
+        ("stderr", "Traceback (most recent call last):\n"),
+        ("stderr", "ValueError\n"),
+    ]
+    assert split_logs(lines) == ("Traceback (most recent call last):\nValueError", "printed\nWARNING:root:warning")
+    assert split_logs([]) == ("", "")
+
+
+def test_route_execution_logs():
+
+    def labelled(message, execution_id):
+        return json.dumps({"message": message, "logging.googleapis.com/labels": {"execution_id": execution_id}})
+
+    # functions-framework writes each record and its newline apart, concurrent records end up on the same line
+    lines = [
+        ("stdout", labelled("line one\nline two", "a") + "\n"),
+        ("stdout", labelled("hello", "a") + labelled("printed", "b") + "\n"),
+        ("stdout", labelled(" ", "a") + "\n"),
+        ("stdout", "\n"),
+        ("stdout", labelled("world", "a") + "\n"),
+        ("stdout", "not a labelled line\n"),
+        ("stderr", labelled("WARNING:root:warning", "a") + labelled("ERROR:main:Exception on / [POST]\nTraceback (most recent call last):\nValueError", "b") + "\n\n"),
+        ("stderr", '{"message": "no execution id"}\n'),
+    ]
+    # the logs of each execution are those split_logs returns for the same invocation without the labels
+    assert route_execution_logs(lines) == {
+        "a": ("", "line one\nline two\nhello world\nWARNING:root:warning"),
+        "b": ("Traceback (most recent call last):\nValueError", "printed\nERROR:main:Exception on / [POST]"),
+        None: ('{"message": "no execution id"}', "not a labelled line"),
+    }
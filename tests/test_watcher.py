@@ -0,0 +1,61 @@
+import os
+import re
+import sys
+
+from cloud_functions_test.watcher import fingerprint_classes
+from cloud_functions_test.watcher import get_mtimes
+from cloud_functions_test.watcher import reload_module
+from cloud_functions_test.watcher import wait_for_changes
+
+
+def test_wait_for_changes(tmp_path):
+    source = tmp_path / "main.py"
+    source.write_text("def main(request): pass\n")
+    env = tmp_path / ".env"
+    paths = [str(source), str(env)]
+    mtimes = get_mtimes(paths)
+    assert mtimes[str(env)] is None
+
+    os.utime(source, ns=(0, mtimes[str(source)] + 1))
+    env.write_text("A=1\n")
+    changed_paths, new_mtimes = wait_for_changes(paths, mtimes, interval=0.01)
+    assert changed_paths == {str(source), str(env)}
+    assert new_mtimes == get_mtimes(paths)
+
+
+def test_reload_module(tmp_path, monkeypatch):
+    module = tmp_path / "watched_tests.py"
+    module.write_text("class FirstTest:\n    data = {'a': 1}\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import watched_tests
+    first_fingerprints = fingerprint_classes([watched_tests.FirstTest])
+
+    # same size and same mtime in seconds, the cached bytecode would otherwise be reused
+    module.write_text("class FirstTest:\n    data = {'a': 2}\n")
+    reload_module("watched_tests")
+    assert "watched_tests" not in sys.modules
+    import watched_tests
+    assert watched_tests.FirstTest.data == {'a': 2}
+    assert fingerprint_classes([watched_tests.FirstTest]) != first_fingerprints
+    reload_module("watched_tests")
+
+
+def test_fingerprint_classes():
+
+    def define_classes(output):
+        class Unchanged:
+            data = {"a": 1}
+            output = re.compile(r"\d+")
+
+        class Changed:
+            data = {"a": 1}
+
+        Changed.output = output
+        return [Unchanged, Changed]
+
+    first_fingerprints = fingerprint_classes(define_classes({"a": 1}))
+    second_fingerprints = fingerprint_classes(define_classes({"a": 2}))
+    assert set(first_fingerprints) == {"Unchanged", "Changed"}
+    assert first_fingerprints["Unchanged"] == second_fingerprints["Unchanged"]
+    assert first_fingerprints["Changed"] != second_fingerprints["Changed"]
+    assert first_fingerprints == fingerprint_classes(define_classes({"a": 1}))